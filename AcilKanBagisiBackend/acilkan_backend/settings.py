@@ -1,5 +1,6 @@
 ﻿from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,6 +32,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.logs.RequestIdMiddleware",
+    "api.metrics.MetricsMiddleware",
+    "api.db.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -65,14 +69,78 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "acilkan_backend.wsgi.application"
 
-# Database - Şimdilik SQLite kullanacağız
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
-    }
+# Veritabanı: varsayılan SQLite; DB_ENGINE=postgresql (veya mysql) ile sunucu veritabanı.
+# DB_CONN_MAX_AGE > 0 bağlantıları istekler arasında açık tutar, her istek başında
+# sağlık kontrolü yapılır. DB_POOL=1 psycopg bağlantı havuzunu açar (yalnızca PostgreSQL,
+# psycopg[pool] gerekir; diğer motorlarda yok sayılır); havuzla kalıcı bağlantı kullanılmaz.
+# DB_REPLICAS virgülle ayrılmış okuma replikalarıdır: sunucu veritabanında host adları,
+# SQLite'ta dosya yolları (yerelde denemek için birincilin kopyaları). Okuma ağırlıklı
+# görünümler bunlara yönlendirilir (api.db.ReplicaRouter); testlerde birincili yansıtırlar.
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite3")
+DB_POOL = os.environ.get("DB_POOL", "") in ("1", "true", "True")
+
+# SQLite modu: "default" (varsayılan) Django'nun ayarlarıdır. DB_SQLITE_MODE=hardened üretim
+# içindir: WAL günlüğü, synchronous=NORMAL, 64 MB sayfa önbelleği, 256 MB mmap, yazma işlemleri
+# BEGIN IMMEDIATE ile başlar ve süreç içinde tek yazıcı kuyruğundan geçer (api.sqlite).
+# WAL veritabanı dosyasına kalıcı olarak yazılır (geri almak için PRAGMA journal_mode=DELETE)
+# ve yanında -wal/-shm dosyaları oluşur; ağ dosya sistemlerinde çalışmaz.
+# Ölçüm: python manage.py benchmark_sqlite
+DB_SQLITE_MODE = os.environ.get("DB_SQLITE_MODE", "default")
+SQLITE_HARDENED_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA cache_size=-65536;"
+        "PRAGMA mmap_size=268435456;"
+        "PRAGMA temp_store=MEMORY"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": 20,
 }
 
+
+def _database(**overrides):
+    if DB_ENGINE == "sqlite3":
+        config = {"NAME": os.environ.get("DB_NAME", os.path.join(BASE_DIR, "db.sqlite3"))}
+        if DB_SQLITE_MODE == "hardened":
+            config.update(ENGINE="api.sqlite", OPTIONS=dict(SQLITE_HARDENED_OPTIONS))
+    else:
+        config = {
+            "NAME": os.environ.get("DB_NAME", "acilkan"),
+            "USER": os.environ.get("DB_USER", ""),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", ""),
+            "PORT": os.environ.get("DB_PORT", ""),
+        }
+    pooled = DB_POOL and DB_ENGINE == "postgresql"
+    if pooled:
+        # Havuz yalnızca psycopg'de var; diğer OPTIONS korunur
+        config["OPTIONS"] = {**config.get("OPTIONS", {}), "pool": {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }}
+    return {
+        "ENGINE": f"django.db.backends.{DB_ENGINE}",
+        **config,
+        "CONN_MAX_AGE": 0 if pooled else int(os.environ.get("DB_CONN_MAX_AGE", 60 if DB_ENGINE != "sqlite3" else 0)),
+        "CONN_HEALTH_CHECKS": True,
+        **overrides,
+    }
+
+
+DATABASES = {"default": _database()}
+DATABASE_REPLICAS = []
+for _number, _replica in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(",")), start=1):
+    DATABASES[f"replica_{_number}"] = _database(
+        **({"NAME": _replica.strip()} if DB_ENGINE == "sqlite3" else {"HOST": _replica.strip()}),
+        TEST={"MIRROR": "default"},
+    )
+    DATABASE_REPLICAS.append(f"replica_{_number}")
+DATABASE_ROUTERS = ["api.db.ReplicaRouter"]
+# Yazma yapan istemcinin okumaları bu süre boyunca birincilden yapılır (çerezle)
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get("DB_REPLICA_STICKY_SECONDS", 5))
+
 # MongoDB bağlantısı
 import mongoengine
 
@@ -96,6 +164,22 @@ def connect_to_mongodb():
 # MongoDB bağlantısını başlat
 connect_to_mongodb()
 
+# Kullanıcıların MongoDB'ye arka planda yansıtılması; MONGO_MIRROR_ENABLED=1 ile açılır.
+# Testlerde hiçbir zaman açılmaz (benchmark_api de kapatır), böylece deneme kullanıcıları
+# geri kayda ve oradan üretim kümesine düşmez.
+MONGO_MIRROR_ENABLED = (
+    os.environ.get("MONGO_MIRROR_ENABLED", "") in ("1", "true", "True") and sys.argv[1:2] != ["test"]
+)
+MONGO_MIRROR_BATCH_SIZE = 100
+# Kuyruk dolunca yeni belgeler doğrudan geri kayda yazılır
+MONGO_MIRROR_MAX_QUEUE = 10000
+MONGO_MIRROR_FLUSH_INTERVAL = 1.0
+MONGO_MIRROR_MAX_RETRIES = 3
+# Yazılamayan belgeler burada tutulur ve bağlantı geri gelince yeniden denenir
+MONGO_MIRROR_BACKLOG_PATH = os.path.join(BASE_DIR, "mongo_mirror_backlog.jsonl")
+MONGO_MAX_POOL_SIZE = 10
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,6 +196,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Parola özetleme stratejisi: "argon2" (argon2-cffi gerekir), "bcrypt" (bcrypt gerekir),
+# "scrypt" veya "pbkdf2". Listenin geri kalanı eski özetleri doğrulamak içindir; eski
+# özetle giriş yapan kullanıcının parolası girişte yeni stratejiyle yeniden özetlenir.
+PASSWORD_HASHER_STRATEGY = os.environ.get("PASSWORD_HASHER_STRATEGY", "pbkdf2")
+_PASSWORD_HASHERS = {
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER_STRATEGY]] + [
+    hasher for strategy, hasher in _PASSWORD_HASHERS.items() if strategy != PASSWORD_HASHER_STRATEGY
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+
+# Asenkron girişte (/api/users/login/async/) parola doğrulaması bu havuzda çalışır.
+# MAX_PENDING dolunca yeni girişler 503 ile reddedilir. None ise WORKERS çekirdek
+# sayısı, MAX_PENDING ise WORKERS'ın 8 katıdır.
+LOGIN_HASHING = {
+    "WORKERS": None,
+    "MAX_PENDING": None,
+}
+
+
 # Internationalization
 LANGUAGE_CODE = "tr-tr"
 TIME_ZONE = "Europe/Istanbul"
@@ -133,13 +240,21 @@ AUTH_USER_MODEL = "users.CustomUser"
 # Rest Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
-    "PAGE_SIZE": 10
+    "PAGE_SIZE": 10,
+    # İstemci IP'si için güvenilen ters vekil sayısı. 0 ise X-Forwarded-For yok sayılır
+    # ve REMOTE_ADDR kullanılır; aksi halde başlıktaki sağdan NUM_PROXIES'inci adres alınır.
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
+    # Giriş ve kayıt denemeleri parola özetlenmeden önce sınırlanır (users.auth)
+    "DEFAULT_THROTTLE_RATES": {
+        "auth_ip": os.environ.get("AUTH_IP_RATE", "30/min"),
+        "login_account": os.environ.get("LOGIN_ACCOUNT_RATE", "10/min"),
+    },
 }
 
 # JWT settings
@@ -168,5 +283,123 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=7),
 }
 
+# JWT kimlik doğrulamasında kullanıcı sorgusunu atlamak için (users.authentication):
+# girişte verilen token'lardaki imzalı kan grubu ve personel bilgisine CLAIMS_MAX_AGE
+# saniye güvenilir; diğer token'lar için kullanıcı satırı süreç içinde TTL saniye
+# önbellekte tutulur. Kaydedilen/silinen kullanıcılar bu süreçte hemen geçersiz kılınır.
+JWT_USER_CACHE = {
+    "TTL": int(os.environ.get("JWT_USER_CACHE_TTL", 60)),
+    "CLAIMS_MAX_AGE": int(os.environ.get("JWT_CLAIMS_MAX_AGE", 300)),
+    "MAX_SIZE": 10000,
+}
+
+# Döndürülen ve çıkışta iptal edilen refresh token'lar (users.revocation). İptaller
+# veritabanında tutulur, her süreçte bellekte sona erme gününe göre gruplanır ve
+# SYNC_SECONDS saniyede bir eşitlenir; süresi dolanlar kendiliğinden silinir.
+TOKEN_REVOCATION = {
+    "SYNC_SECONDS": int(os.environ.get("TOKEN_REVOCATION_SYNC_SECONDS", 5)),
+    "BUCKET_SECONDS": 86400,
+}
+
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
+
+# Konum indeksi: değişiklik sinyali gelmese bile indeksin yeniden kurulacağı süre (saniye)
+GEO_INDEX_MAX_AGE = 300
+# Başka worker'ların yaptığı değişiklikler için paylaşılan sürüm anahtarının okunma aralığı (saniye)
+GEO_INDEX_VERSION_CHECK_SECONDS = 5
+
+# Bağışçı eşleştirme
+DONATION_MIN_INTERVAL_DAYS = 90
+DONOR_INDEX_MAX_AGE = 600
+
+# Acil durum olay yayını (SSE). Birden fazla süreçte çalışırken Redis kullanın:
+# {"BACKEND": "donations.events.RedisBroker", "OPTIONS": {"url": "redis://localhost:6379/0"}}
+EMERGENCY_EVENT_BROKER = {
+    "BACKEND": "donations.events.InProcessBroker",
+    "OPTIONS": {"max_queue": 100},
+}
+EMERGENCY_STREAM_HEARTBEAT = 15
+
+# Bağış merkezi listesi yanıt önbelleği. Süreç içi önbellekte bir merkez değişikliği
+# diğer worker'lara en geç "timeout" saniye sonra yansır. Birden fazla worker için
+# paylaşılan bir CACHES girdisi kullanın:
+# {"BACKEND": "donations.cache.DjangoCacheBackend", "OPTIONS": {"alias": "default", "timeout": 300}}
+DONATION_CENTER_CACHE = {
+    "BACKEND": "donations.cache.LocMemLRUBackend",
+    "OPTIONS": {"max_entries": 256, "timeout": int(os.environ.get("DONATION_CENTER_CACHE_TIMEOUT", 60))},
+}
+
+# Süresi dolan acil durum taleplerini arka planda "expired" yapma aralığı (saniye).
+# None ise kapalıdır; bunun yerine cron ile expire_emergency_requests komutunu çalıştırın.
+EMERGENCY_EXPIRY_SWEEP_INTERVAL = None
+
+# Bağış merkezi içe aktarımında koordinatı olmayan satırlar için coğrafi kodlayıcı.
+# "paket.modul.fonksiyon" biçiminde; fonksiyon (address, district, city) alır ve
+# (latitude, longitude) ya da None döndürür. None ise bu satırlar atlanır.
+DONATION_CENTER_GEOCODER = None
+
+# Önbellekler. "default" süreç içidir (DRF kısıtlayıcıları, coğrafi indeks sürümleri).
+# "notifications" bildirim tekilleştirmesi içindir ve tüm süreçlerin paylaştığı bir
+# önbellek olmalıdır; NOTIFICATION_CACHE_LOCATION (ör. redis://localhost:6379/1)
+# verilmezse tanımlanmaz ve bildirimler açılamaz (donations.E002).
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+if os.environ.get("NOTIFICATION_CACHE_LOCATION"):
+    CACHES["notifications"] = {
+        "BACKEND": os.environ.get("NOTIFICATION_CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"),
+        "LOCATION": os.environ["NOTIFICATION_CACHE_LOCATION"],
+    }
+
+# Acil durum bildirimleri: uyumlu bağışçılara arka planda toplu gönderim.
+# BACKEND: donations.notifications.LocMemTransport (gönderim yapmaz), EmailTransport
+# veya WebhookTransport ({"url": "https://push-gateway/..."}). RATE saniyedeki en
+# fazla bildirim sayısıdır (None: sınırsız), BURST kova kapasitesidir. Varsayılan
+# olarak kapalıdır; EMERGENCY_NOTIFICATIONS_ENABLED=1 ile açıldığında LocMemTransport
+# dışında bir BACKEND (donations.E001) ve paylaşılan "notifications" önbelleği
+# (donations.E002) gerekir.
+EMERGENCY_NOTIFICATIONS = {
+    "ENABLED": os.environ.get("EMERGENCY_NOTIFICATIONS_ENABLED", "") in ("1", "true", "True"),
+    "BACKEND": os.environ.get("EMERGENCY_NOTIFICATIONS_BACKEND", "donations.notifications.LocMemTransport"),
+    "OPTIONS": {},
+    "BATCH_SIZE": 500,
+    "WORKERS": 4,
+    "RATE": None,
+    "BURST": None,
+    "DEDUP": {"alias": "notifications", "timeout": 24 * 60 * 60},
+}
+
+# İstek metrikleri (/api/metrics/, Prometheus biçimi). METRICS_TOKEN ortam
+# değişkeninden okunur ve "Authorization: Bearer <token>" ister; ayarlanmamışsa uç
+# nokta yalnızca DEBUG açıkken yanıt verir. Bu süreyi aşan istekler en yavaş SQL
+# sorgularıyla "api.metrics.slow" loglayıcısına yazılır; None ise kapalıdır.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+
+# Yapılandırılmış loglama: kayıtlar JSON olarak bir kuyruk üzerinden arka planda
+# yazılır, parola ve token alanları maskelenir, her kayda X-Request-ID eklenir.
+# DEBUG kayıtlarının yalnızca LOG_DEBUG_SAMPLE_RATE oranı yazılır.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "api.logs.RequestIdFilter"},
+        "sampling": {"()": "api.logs.SamplingFilter", "rate": LOG_DEBUG_SAMPLE_RATE},
+    },
+    "handlers": {
+        "json": {
+            "()": "api.logs.QueueLogHandler",
+            "stream": "ext://sys.stdout",
+            "filters": ["request_id", "sampling"],
+        },
+        "null": {"class": "logging.NullHandler"},
+    },
+    "loggers": {
+        # Testlerde kayıtlar çıktıya yazılmaz; assertLogs yine yakalar
+        name: {"handlers": ["null" if sys.argv[1:2] == ["test"] else "json"], "level": LOG_LEVEL, "propagate": False}
+        for name in ("api", "users", "donations", "django.request")
+    },
+}
@@ -4,6 +4,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from api.hospital_views import HospitalViewSet
+from api.metrics import metrics_view
 from api.views import UserViewSet, BloodDonationViewSet
 
 router = DefaultRouter()
@@ -13,5 +14,6 @@ router.register(r'donations', BloodDonationViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics/', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -4,3 +4,10 @@
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+
+        if 'api.metrics.MetricsMiddleware' in settings.MIDDLEWARE:
+            from .metrics import instrument_serializers
+            instrument_serializers()
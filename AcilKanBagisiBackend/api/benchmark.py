@@ -0,0 +1,293 @@
+"""
+REST API yük testi ve karşılaştırmalı ölçüm.
+
+``seed`` yapılandırılabilir boyutta sentetik veri (kullanıcı, merkez, bağış,
+acil durum talebi) üretir. ``run_endpoint`` bir uç noktayı Django test
+istemcisiyle, gerçek URL yönlendirmesi ve ara katmanlar üzerinden, süreç
+içinde ve istenirse eşzamanlı iş parçacıklarıyla çağırır; ``run_endpoint_asgi``
+aynısını tek bir olay döngüsünde eşzamanlı görevlerle yapar. Her uç nokta için
+verim, p50/p95/p99 gecikme ve istek başına sorgu sayısı ölçülür.
+``compare`` sonuçları bir JSON taban çizgisiyle karşılaştırıp eşiği aşan
+gerilemeleri döndürür.
+"""
+import asyncio
+import contextlib
+import itertools
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from users.authentication import ClaimsRefreshToken
+
+from .metrics import QueryRecorder
+
+BLOOD_TYPES = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+CITIES = ('İstanbul', 'Ankara', 'İzmir', 'Bursa', 'Antalya', 'Adana', 'Konya', 'Gaziantep')
+PASSWORD = 'benchmark-password'
+
+
+def seed(users=1000, centers=100, donations=5000, emergencies=500, seed=0):
+    """Sentetik veri üretir; giriş ve yetkili istekler için bir personel kullanıcısı döndürür."""
+    from donations.counters import reconcile
+    from donations.matching import donor_index
+    from donations.models import Donation, DonationCenter, EmergencyRequest
+    from donations.rollups import backfill
+    from users.models import CustomUser, eligible_from, normalize_city
+
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    today = timezone.localdate()
+
+    CustomUser.objects.bulk_create([
+        CustomUser(
+            email=f'donor{number}@benchmark.local', password=password, full_name=f'Bağışçı {number}',
+            blood_type=rng.choice(BLOOD_TYPES), city=rng.choice(CITIES), district='Merkez',
+            latitude=rng.uniform(36.0, 42.0), longitude=rng.uniform(26.0, 45.0), eligible_from=eligible_from(None),
+        )
+        for number in range(users)
+    ], batch_size=1000)
+    # bulk_create save() çağırmaz; normalize şehir anahtarı şehir başına tek UPDATE ile yazılır
+    for city in CITIES:
+        CustomUser.objects.filter(city=city).update(city_key=normalize_city(city))
+    staff = CustomUser.objects.create_user(
+        email='staff@benchmark.local', password=PASSWORD, full_name='Benchmark', blood_type='O-', is_staff=True,
+    )
+    DonationCenter.objects.bulk_create([
+        DonationCenter(
+            name=f'Merkez {number}', address='-', city=rng.choice(CITIES), district='Merkez', phone='0',
+            latitude=rng.uniform(36.0, 42.0), longitude=rng.uniform(26.0, 45.0),
+        )
+        for number in range(centers)
+    ], batch_size=1000)
+
+    user_ids = list(CustomUser.objects.values_list('pk', flat=True))
+    center_ids = list(DonationCenter.objects.values_list('pk', flat=True))
+    if center_ids:
+        Donation.objects.bulk_create([
+            Donation(
+                user_id=rng.choice(user_ids), donation_center_id=rng.choice(center_ids),
+                date=today - timedelta(days=rng.randrange(365)), status='completed',
+            )
+            for _ in range(donations)
+        ], batch_size=1000)
+    now = timezone.now()
+    EmergencyRequest.objects.bulk_create([
+        EmergencyRequest(
+            requester_id=rng.choice(user_ids), patient_name='Hasta', blood_type=rng.choice(BLOOD_TYPES),
+            hospital='Hastane', city=rng.choice(CITIES), units_needed=rng.randint(1, 5),
+            urgency_level=rng.randint(1, 3), phone_number='0', expires_at=now + timedelta(days=rng.randint(1, 7)),
+        )
+        for _ in range(emergencies)
+    ], batch_size=1000)
+
+    reconcile()
+    backfill()
+    donor_index.reset()
+    return staff
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """Ölçülecek bir istek. ``data`` çağrılabilirse her istek için sıra numarasıyla çağrılır."""
+
+    name: str
+    method: str
+    path: str
+    data: object = None
+    auth: bool = True
+    expected_status: int = 200
+
+    def body(self, number):
+        return self.data(number) if callable(self.data) else self.data
+
+
+def default_endpoints(emergency_id=None):
+    def registration(number):
+        return {'email': f'new-{number}-{time.monotonic_ns()}@benchmark.local', 'password': PASSWORD,
+                'full_name': 'Yeni', 'blood_type': 'O+', 'city': CITIES[0]}
+
+    endpoints = [
+        Endpoint('login', 'post', '/api/users/login/',
+                 {'email': 'staff@benchmark.local', 'password': PASSWORD}, auth=False),
+        Endpoint('login-async', 'post', '/api/users/login/async/',
+                 {'email': 'staff@benchmark.local', 'password': PASSWORD}, auth=False),
+        Endpoint('register', 'post', '/api/users/register/', registration, auth=False, expected_status=201),
+        Endpoint('donations', 'get', '/api/donations/'),
+        Endpoint('centers', 'get', '/api/donations/centers/'),
+        Endpoint('emergency-feed', 'get', '/api/donations/emergency/'),
+        Endpoint('donations-async', 'get', '/api/donations/async/'),
+        Endpoint('centers-async', 'get', '/api/donations/async/centers/'),
+        Endpoint('emergency-feed-async', 'get', '/api/donations/async/emergency/'),
+        Endpoint('stats', 'get', f'/api/donations/stats/?period=week&city={CITIES[1]}'),
+    ]
+    if emergency_id is not None:
+        endpoints.append(Endpoint('emergency-matches', 'get', f'/api/donations/emergency/{emergency_id}/matches/'))
+    return endpoints
+
+
+def percentile(sorted_values, percent):
+    """En yakın sıra yöntemiyle yüzdelik."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+
+def summarize(latencies, queries, errors, elapsed, concurrency):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries': None if queries is None else round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+def run_endpoint(endpoint, requests=100, concurrency=1, token=None, warmup=5):
+    """``endpoint`` uç noktasını ``concurrency`` iş parçacığıyla toplam ``requests`` kez çağırır."""
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if endpoint.auth and token else {}
+    numbers = itertools.count()
+    lock = threading.Lock()
+    latencies, queries = [], []
+    errors = 0
+
+    def call(client):
+        nonlocal errors
+        with lock:
+            number = next(numbers)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            # Okuma replikalarına yönlendirilen sorgular da sayılsın
+            for alias_connection in connections.all():
+                stack.enter_context(alias_connection.execute_wrapper(recorder))
+            if endpoint.method == 'get':
+                response = client.get(endpoint.path, **headers)
+            else:
+                response = getattr(client, endpoint.method)(
+                    endpoint.path, endpoint.body(number), content_type='application/json', **headers,
+                )
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            queries.append(recorder.count)
+            errors += response.status_code != endpoint.expected_status
+
+    def worker(count):
+        client = Client()
+        try:
+            for _ in range(count):
+                call(client)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    worker(warmup)
+    latencies.clear()
+    queries.clear()
+    errors = 0
+
+    shares = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark') as pool:
+            for future in [pool.submit(worker, share) for share in shares]:
+                future.result()
+    return summarize(latencies, queries, errors, time.perf_counter() - started, concurrency)
+
+
+def run_endpoint_asgi(endpoint, requests=100, concurrency=1, token=None, warmup=5):
+    """
+    ``endpoint`` uç noktasını tek bir olay döngüsünde (bir ASGI worker'ı gibi)
+    ``concurrency`` eşzamanlı görevle çağırır.
+
+    Senkron görünümler gerçek ASGI sunucusunda olduğu gibi thread-sensitive
+    bağdaştırıcıdan geçer. Sorgular başka iş parçacıklarında çalıştığı için
+    sorgu sayısı ölçülmez (``None``).
+    """
+    headers = {'Authorization': f'Bearer {token}'} if endpoint.auth and token else {}
+    numbers = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def call(client):
+        nonlocal errors
+        started = time.perf_counter()
+        if endpoint.method == 'get':
+            response = await client.get(endpoint.path, headers=headers)
+        else:
+            response = await getattr(client, endpoint.method)(
+                endpoint.path, endpoint.body(next(numbers)), content_type='application/json', headers=headers,
+            )
+        latencies.append(time.perf_counter() - started)
+        errors += response.status_code != endpoint.expected_status
+
+    async def worker(count):
+        client = AsyncClient()
+        for _ in range(count):
+            await call(client)
+
+    async def main():
+        nonlocal errors
+        await worker(warmup)
+        latencies.clear()
+        errors = 0
+        shares = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(share) for share in shares))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    return summarize(latencies, None, errors, elapsed, concurrency)
+
+
+def run(endpoints, requests=100, concurrencies=(1,), user=None, warmup=5, asgi=False):
+    """Tüm uç noktaları ölçer; sonuçlar ``"<ad>@c<n>"`` (ASGI modunda ``"<ad>@asgi<n>"``) anahtarlarıyla döner."""
+    token = str(ClaimsRefreshToken.for_user(user).access_token) if user is not None else None
+    runner = run_endpoint_asgi if asgi else run_endpoint
+    results = {}
+    for endpoint in endpoints:
+        for concurrency in concurrencies:
+            key = f"{endpoint.name}@{'asgi' if asgi else 'c'}{concurrency}"
+            results[key] = runner(endpoint, requests=requests, concurrency=concurrency, token=token, warmup=warmup)
+    return results
+
+
+def compare(baseline, results, threshold=0.2):
+    """
+    Sonuçları taban çizgisiyle karşılaştırır ve gerilemeleri açıklayan metinleri döndürür.
+
+    p95/p99 gecikmenin ``1 + threshold`` katını aşması, verimin ``1 - threshold``
+    katının altına düşmesi, sorgu sayısının ya da hata sayısının artması gerilemedir.
+    Taban çizgisinde olmayan ölçümler karşılaştırılmaz.
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if current[metric] > base[metric] * (1 + threshold):
+                regressions.append(f'{key}: {metric} {base[metric]} -> {current[metric]}')
+        if current['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{key}: throughput_rps {base['throughput_rps']} -> {current['throughput_rps']}")
+        for metric in ('queries', 'errors'):
+            if current[metric] is not None and base[metric] is not None and current[metric] > base[metric]:
+                regressions.append(f'{key}: {metric} {base[metric]} -> {current[metric]}')
+    return regressions
@@ -0,0 +1,10 @@
+"""``benchmark_api`` için URL yapılandırması: uygulama rotaları asıl önekleriyle."""
+from django.urls import include, path
+
+from .metrics import metrics_view
+
+urlpatterns = [
+    path('api/metrics/', metrics_view, name='metrics'),
+    path('api/users/', include('users.urls')),
+    path('api/donations/', include('donations.urls')),
+]
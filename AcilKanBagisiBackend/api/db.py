@@ -0,0 +1,157 @@
+"""
+Okuma replikası yönlendirmesi.
+
+``ReplicaRoutingMiddleware`` her istek için bir yönlendirme durumu açar.
+``ReplicaReadMixin`` taşıyan görünümler (bağış merkezi listesi, acil durum
+akışı, bağış geçmişi) GET/HEAD/OPTIONS isteklerinde okumalarını
+``DATABASE_REPLICAS`` içinden istek başına seçilen tek bir replikaya
+gönderir. Yazmalar her zaman birincil veritabanına gider.
+
+Okuduğunu-yazdığını-görme: istek içinde bir yazma yapıldıktan sonra aynı
+isteğin okumaları da birincil veritabanına gider. Yanıta eklenen kısa ömürlü
+bir çerez (``DATABASE_REPLICA_STICKY_SECONDS``), istemcinin sonraki
+isteklerini replikasyon gecikmesi boyunca birincile sabitler. İsteğin
+okuduğu veriyi değiştirmeyen bakım yazmaları (ör. süresi dolmuş iptal
+kayıtlarının temizliği) ``untracked_writes`` içinde yapılır ve bu
+sabitlemeyi tetiklemez. İstek dışında (yönetim komutları, arka plan iş
+parçacıkları) her şey birincildedir.
+"""
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Bir isteğin yönlendirme durumu; ORM çağrıları başka iş parçacığında olsa da paylaşılır."""
+
+    __slots__ = ('replica', 'wrote', 'pinned', 'alias')
+
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.wrote = False
+        self.pinned = pinned
+        self.alias = None
+
+
+routing_state = contextvars.ContextVar('db_routing_state', default=None)
+_tracking_writes = contextvars.ContextVar('db_tracking_writes', default=True)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def prefer_replica():
+    """Geçerli isteğin okumalarını replikaya yönlendirmeye izin verir."""
+    state = routing_state.get()
+    if state is not None:
+        state.replica = True
+
+
+def use_primary():
+    """Geçerli isteğin bundan sonraki okumalarını birincil veritabanına sabitler."""
+    state = routing_state.get()
+    if state is not None:
+        state.pinned = True
+
+
+@contextlib.contextmanager
+def untracked_writes():
+    """Bu bloktaki yazmalar isteğin okumalarını birincile sabitlemez."""
+    token = _tracking_writes.set(False)
+    try:
+        yield
+    finally:
+        _tracking_writes.reset(token)
+
+
+def replica_lag():
+    """Replikaların birincilin gerisinde kalabileceği varsayılan süre (saniye)."""
+    return getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 0)
+
+
+class ReplicaReadMixin:
+    """Görünümün güvenli yöntemli isteklerini okuma replikasından karşılar."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            prefer_replica()
+        return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """``DATABASE_ROUTERS`` için: izin verilen okumalar replikaya, geri kalan her şey birincile."""
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.replica or state.wrote or state.pinned:
+            return None
+        if state.alias is None:
+            replicas = replica_aliases()
+            if not replicas:
+                return None
+            # Sayfa ve COUNT(*) aynı anlık görüntüyü görsün diye istek başına tek replika
+            state.alias = random.choice(replicas)
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None and _tracking_writes.get():
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replikalar birincilden çoğaltılır
+        return False if db in replica_aliases() else None
+
+
+class ReplicaRoutingMiddleware:
+    """İstek boyunca ``routing_state`` tutar ve yazma sonrası yapışkanlık çerezini yönetir."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=STICKY_COOKIE in request.COOKIES)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.stick(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=STICKY_COOKIE in request.COOKIES)
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.stick(response, state)
+
+    @staticmethod
+    def stick(response, state):
+        seconds = replica_lag()
+        if state.wrote and seconds and replica_aliases():
+            response.set_cookie(STICKY_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        return response
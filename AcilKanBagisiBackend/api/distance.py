@@ -0,0 +1,126 @@
+"""
+Mesafe hesaplama yardımcıları.
+
+``calculate_distance`` tek bir nokta çifti için, diğer fonksiyonlar ise bir
+veya birden fazla başlangıç noktası ile koordinat dizileri için NumPy üzerinde
+tek geçişte çalışır. Hastane araması, bağışçı eşleştirme ve merkez araması
+aynı fonksiyonları kullanır.
+"""
+import math
+
+import numpy as np
+
+# Dünya yarıçapı (km)
+EARTH_RADIUS_KM = 6371.0
+# Bir enlem derecesinin kilometre karşılığı
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+# Eşdikdörtgen yaklaşımı bu yarıçapa kadar ön eleme için kullanılır
+PREFILTER_MAX_RADIUS_KM = 500.0
+# Yaklaşımın hatasına karşı ön elemede bırakılan pay
+PREFILTER_MARGIN = 1.1
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """
+    İki konum arasındaki mesafeyi kilometre cinsinden hesaplar (Haversine formülü)
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    d_lat = lat2_rad - lat1_rad
+    d_lon = math.radians(lon2) - math.radians(lon1)
+
+    a = math.sin(d_lat / 2) ** 2 + \
+        math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(d_lon / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _prepare(origin_lat, origin_lon, lats, lons, dtype):
+    """
+    Girdileri radyana çevirir. Birden fazla başlangıç noktası verilirse
+    sonuç matrisinin (başlangıç, nokta) boyutlarında yayılması için sütun
+    vektörüne dönüştürülür.
+    """
+    origin_lat = np.radians(np.asarray(origin_lat, dtype=dtype))
+    origin_lon = np.radians(np.asarray(origin_lon, dtype=dtype))
+    lats = np.radians(np.asarray(lats, dtype=dtype))
+    lons = np.radians(np.asarray(lons, dtype=dtype))
+    if origin_lat.ndim:
+        origin_lat = origin_lat[:, np.newaxis]
+        origin_lon = origin_lon[:, np.newaxis]
+    return origin_lat, origin_lon, lats, lons
+
+
+def haversine(origin_lat, origin_lon, lats, lons, dtype=np.float64):
+    """
+    Başlangıç noktasından her koordinata olan mesafeleri (km) döndürür.
+
+    Tek başlangıç noktası için ``(n,)``, ``m`` başlangıç noktası için ``(m, n)``
+    boyutlu dizi döner. ``dtype=np.float32`` daha az bellek ve daha yüksek hız
+    karşılığında metre mertebesinde hassasiyet kaybı verir.
+    """
+    origin_lat, origin_lon, lats, lons = _prepare(origin_lat, origin_lon, lats, lons, dtype)
+    a = np.sin((lats - origin_lat) / 2) ** 2 + \
+        np.cos(origin_lat) * np.cos(lats) * np.sin((lons - origin_lon) / 2) ** 2
+    return (2 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def equirectangular(origin_lat, origin_lon, lats, lons, dtype=np.float64):
+    """
+    Eşdikdörtgen izdüşümle yaklaşık mesafe (km). Kısa mesafelerde Haversine'e
+    çok yakındır ve trigonometrik maliyeti daha düşüktür.
+    """
+    origin_lat, origin_lon, lats, lons = _prepare(origin_lat, origin_lon, lats, lons, dtype)
+    d_lon = (lons - origin_lon + np.pi) % (2 * np.pi) - np.pi
+    x = d_lon * np.cos((lats + origin_lat) / 2)
+    y = lats - origin_lat
+    return EARTH_RADIUS_KM * np.sqrt(x * x + y * y)
+
+
+def within_radius(origin_lat, origin_lon, lats, lons, radius_km, dtype=np.float64, prefilter=True):
+    """
+    Tek başlangıç noktası için yarıçap içindeki noktaların indekslerini ve
+    mesafelerini döndürür.
+
+    ``prefilter`` açıkken önce eşdikdörtgen yaklaşımla payı aşan noktalar elenir,
+    kesin Haversine hesabı yalnızca kalan adaylar için yapılır.
+    """
+    lats = np.asarray(lats, dtype=dtype)
+    lons = np.asarray(lons, dtype=dtype)
+    candidates = np.arange(lats.shape[0])
+    if prefilter and radius_km <= PREFILTER_MAX_RADIUS_KM:
+        # Derece cinsinden eşdikdörtgen mesafe; kosinüs arama kutusunun kutba en
+        # yakın enleminden alındığı için yaklaşım mesafeyi hiçbir zaman büyütmez.
+        span = radius_km * PREFILTER_MARGIN / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(origin_lat) + span, 90.0)))
+        x = ((lons - origin_lon + 180) % 360 - 180) * cos_lat
+        y = lats - origin_lat
+        candidates = np.flatnonzero(x * x + y * y <= span * span)
+        lats = lats[candidates]
+        lons = lons[candidates]
+
+    distances = haversine(origin_lat, origin_lon, lats, lons, dtype=dtype)
+    inside = distances <= radius_km
+    return candidates[inside], distances[inside]
+
+
+def nearest(origin_lat, origin_lon, lats, lons, radius_km=None, limit=None, dtype=np.float64, prefilter=True):
+    """
+    Tek başlangıç noktası için (yarıçap içindeki) en yakın noktaları mesafeye
+    göre sıralı ``(indeksler, mesafeler)`` olarak döndürür.
+    """
+    if limit is not None and limit < 0:
+        raise ValueError('limit negatif olamaz.')
+    if radius_km is None:
+        indices = np.arange(np.shape(lats)[0])
+        distances = haversine(origin_lat, origin_lon, lats, lons, dtype=dtype)
+    else:
+        indices, distances = within_radius(
+            origin_lat, origin_lon, lats, lons, radius_km, dtype=dtype, prefilter=prefilter
+        )
+
+    if limit is not None and limit < distances.shape[0]:
+        top = np.argpartition(distances, limit)[:limit]
+        indices, distances = indices[top], distances[top]
+    order = np.argsort(distances, kind='stable')
+    return indices[order], distances[order]
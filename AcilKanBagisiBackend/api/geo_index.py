@@ -0,0 +1,181 @@
+"""
+Konum tabanlı sorgular için bellek içi grid indeksi.
+
+Noktalar enlem/boylam hücrelerine yerleştirilir; yarıçap sorgusu yalnızca
+arama kutusuyla kesişen hücrelere bakar ve sonuçları mesafeye göre döndürür.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .distance import KM_PER_DEGREE, nearest
+
+
+class GeoGridIndex:
+    """
+    Sabit boyutlu enlem/boylam hücrelerinden oluşan grid indeksi.
+
+    ``cell_size`` derece cinsindendir; 0.1 derece yaklaşık 11 km'lik hücreler verir.
+    Her hücrenin koordinatları NumPy dizisi olarak tutulur, böylece aday
+    hücrelerdeki tüm mesafeler tek geçişte hesaplanır.
+    """
+
+    def __init__(self, points=(), cell_size=0.1):
+        self.cell_size = cell_size
+        self.columns = int(math.ceil(360.0 / cell_size))
+        self.cells = {}
+        self._arrays = {}
+        self.size = 0
+        for key, lat, lon in points:
+            self.add(key, lat, lon)
+
+    def _cell(self, lat, lon):
+        row = int(math.floor(lat / self.cell_size))
+        column = int(math.floor((lon + 180.0) / self.cell_size)) % self.columns
+        return row, column
+
+    def add(self, key, lat, lon):
+        lat, lon = float(lat), float(lon)
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, []).append((key, lat, lon))
+        self._arrays.pop(cell, None)
+        self.size += 1
+
+    def _cell_arrays(self, cell):
+        arrays = self._arrays.get(cell)
+        if arrays is None:
+            keys, lats, lons = zip(*self.cells[cell])
+            arrays = self._arrays[cell] = (list(keys), np.array(lats), np.array(lons))
+        return arrays
+
+    def _candidate_cells(self, lat, lon, radius_km):
+        """Arama kutusuyla kesişen hücreleri üretir."""
+        lat_span = radius_km / KM_PER_DEGREE
+        min_row = int(math.floor(max(lat - lat_span, -90.0) / self.cell_size))
+        max_row = int(math.floor(min(lat + lat_span, 90.0) / self.cell_size))
+
+        # Kutuptaki en uç enlemde boylam açıklığı en geniştir
+        widest_lat = min(abs(lat) + lat_span, 90.0)
+        cos_lat = math.cos(math.radians(widest_lat))
+        if cos_lat < 1e-6 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180.0:
+            columns = range(self.columns)
+        else:
+            lon_span = radius_km / (KM_PER_DEGREE * cos_lat)
+            first = int(math.floor((lon - lon_span + 180.0) / self.cell_size))
+            last = int(math.floor((lon + lon_span + 180.0) / self.cell_size))
+            columns = {column % self.columns for column in range(first, last + 1)}
+
+        # Geniş bir kutu dolu hücrelerden fazlasını kapsıyorsa dolu hücreleri tara;
+        # böylece maliyet yarıçapla değil indeksteki hücre sayısıyla sınırlı kalır
+        if (max_row - min_row + 1) * len(columns) > len(self.cells):
+            for row, column in self.cells:
+                if min_row <= row <= max_row and column in columns:
+                    yield self._cell_arrays((row, column))
+            return
+        for row in range(min_row, max_row + 1):
+            for column in columns:
+                if (row, column) in self.cells:
+                    yield self._cell_arrays((row, column))
+
+    def query(self, lat, lon, radius_km, limit=None):
+        """
+        Yarıçap içindeki noktaları ``(mesafe, anahtar)`` çiftleri olarak
+        en yakından uzağa sıralı döndürür. ``limit`` verilirse ilk k sonuç döner.
+        """
+        lat, lon = float(lat), float(lon)
+        keys, lats, lons = [], [], []
+        for cell_keys, cell_lats, cell_lons in self._candidate_cells(lat, lon, radius_km):
+            keys.extend(cell_keys)
+            lats.append(cell_lats)
+            lons.append(cell_lons)
+        if not keys:
+            return []
+
+        indices, distances = nearest(
+            lat, lon, np.concatenate(lats), np.concatenate(lons),
+            radius_km=radius_km, limit=limit,
+        )
+        return [(float(distance), keys[index]) for index, distance in zip(indices, distances)]
+
+    def __len__(self):
+        return self.size
+
+
+class ModelGeoIndex:
+    """
+    Bir modelin koordinatlarından tembel olarak kurulan ve model değiştiğinde
+    yeniden kurulan grid indeksi.
+
+    Kayıt/silme sinyalleri paylaşılan cache'teki sürüm anahtarını artırır; ortak
+    bir cache kullanan diğer worker'lar sürümü en fazla
+    ``GEO_INDEX_VERSION_CHECK_SECONDS`` saniyede bir okur ve değiştiyse indeksi
+    yeniler. ``GEO_INDEX_MAX_AGE`` saniyesinden eski indeksler her durumda
+    yeniden kurulur.
+    """
+
+    def __init__(self, model, lat_field='latitude', lon_field='longitude', queryset=None, cell_size=0.1):
+        self.model = model
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self.queryset = queryset
+        self.cell_size = cell_size
+        self.version_key = f'geo-index:{model._meta.label_lower}:version'
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def get_queryset(self):
+        queryset = self.queryset if self.queryset is not None else self.model._default_manager.all()
+        return queryset.filter(**{
+            f'{self.lat_field}__isnull': False,
+            f'{self.lon_field}__isnull': False,
+        })
+
+    def build(self):
+        points = self.get_queryset().values_list('pk', self.lat_field, self.lon_field).iterator(chunk_size=2000)
+        return GeoGridIndex(points, cell_size=self.cell_size)
+
+    def _current_version(self):
+        return cache.get_or_set(self.version_key, 0, timeout=None)
+
+    def get(self):
+        now = time.monotonic()
+        version = self._version
+        if self._index is None or now - self._checked_at >= getattr(settings, 'GEO_INDEX_VERSION_CHECK_SECONDS', 5):
+            version = self._current_version()
+            self._checked_at = now
+        max_age = getattr(settings, 'GEO_INDEX_MAX_AGE', 300)
+        with self._lock:
+            if self._index is None or self._version != version or time.monotonic() - self._built_at > max_age:
+                self._index = self.build()
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._index
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        return self.get().query(lat, lon, radius_km, limit=limit)
+
+    def invalidate(self, **kwargs):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, timeout=None)
+        with self._lock:
+            self._index = None
+
+    def connect_signals(self):
+        uid = f'{self.version_key}:invalidate'
+        post_save.connect(self.invalidate, sender=self.model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self.invalidate, sender=self.model, weak=False, dispatch_uid=uid)
+
+    def disconnect_signals(self):
+        uid = f'{self.version_key}:invalidate'
+        post_save.disconnect(sender=self.model, dispatch_uid=uid)
+        post_delete.disconnect(sender=self.model, dispatch_uid=uid)
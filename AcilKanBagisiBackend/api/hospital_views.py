@@ -5,7 +5,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .serializers import HospitalSerializer
 from .models import Hospital
-import math
+from .geo_index import ModelGeoIndex
+
+# Yarıçap parametresinin üst sınırı (km)
+MAX_RADIUS_KM = 500.0
+
+hospital_index = ModelGeoIndex(Hospital)
+hospital_index.connect_signals()
 
 class HospitalViewSet(viewsets.ModelViewSet):
     """
@@ -23,12 +29,11 @@ class HospitalViewSet(viewsets.ModelViewSet):
         Parametreler:
         - latitude: Kullanıcının enlem değeri
         - longitude: Kullanıcının boylam değeri
-        - radius: Kilometre cinsinden yarıçap (varsayılan: 10)
+        - radius: Kilometre cinsinden yarıçap (varsayılan: 10, en fazla MAX_RADIUS_KM)
+        - limit: Döndürülecek en yakın hastane sayısı (isteğe bağlı)
         """
         latitude = request.query_params.get('latitude')
         longitude = request.query_params.get('longitude')
-        radius = float(request.query_params.get('radius', 10.0))
-        
         if not latitude or not longitude:
             return Response(
                 {"error": "Konum bilgileri (latitude ve longitude) gereklidir."},
@@ -38,32 +43,37 @@ class HospitalViewSet(viewsets.ModelViewSet):
         try:
             latitude = float(latitude)
             longitude = float(longitude)
+            radius = float(request.query_params.get('radius', 10.0))
+            if not 0 <= radius <= MAX_RADIUS_KM:
+                raise ValueError(radius)
         except ValueError:
             return Response(
                 {"error": "Geçersiz konum değerleri."},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Tüm hastaneleri al
-        hospitals = Hospital.objects.all()
-        
-        # Her hastane için mesafeyi hesapla
-        hospitals_with_distance = []
-        
-        for hospital in hospitals:
-            distance = calculate_distance(
-                latitude, longitude,
-                float(hospital.latitude), float(hospital.longitude)
+        try:
+            limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+            if limit is not None and limit < 1:
+                raise ValueError(limit)
+        except ValueError:
+            return Response(
+                {"error": "Geçersiz limit değeri."},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Sadece belirtilen yarıçap içindeki hastaneleri ekle
-            if distance <= radius:
-                hospital_data = HospitalSerializer(hospital).data
-                hospital_data['distance'] = round(distance, 1)  # Mesafeyi 1 ondalık basamağa yuvarla
-                hospitals_with_distance.append(hospital_data)
         
-        # Mesafeye göre sırala
-        hospitals_with_distance.sort(key=lambda x: x['distance'])
+        # Yalnızca arama yarıçapıyla kesişen grid hücrelerindeki hastanelere bak
+        matches = hospital_index.nearby(latitude, longitude, radius, limit=limit)
+        hospitals = Hospital.objects.in_bulk([pk for _, pk in matches])
+        
+        hospitals_with_distance = []
+        for distance, pk in matches:
+            hospital = hospitals.get(pk)
+            if hospital is None:
+                continue
+            hospital_data = HospitalSerializer(hospital).data
+            hospital_data['distance'] = round(distance, 1)  # Mesafeyi 1 ondalık basamağa yuvarla
+            hospitals_with_distance.append(hospital_data)
         
         return Response(hospitals_with_distance)
         
@@ -96,30 +106,3 @@ class HospitalViewSet(viewsets.ModelViewSet):
         serializer = EmergencyRequestSerializer(requests, many=True)
         
         return Response(serializer.data)
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    İki konum arasındaki mesafeyi kilometre cinsinden hesaplar (Haversine formülü)
-    """
-    # Dünya yarıçapı (km)
-    R = 6371
-    
-    # Radyana dönüştür
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Enlem ve boylam farkları
-    d_lat = lat2_rad - lat1_rad
-    d_lon = lon2_rad - lon1_rad
-    
-    # Haversine formülü
-    a = math.sin(d_lat/2) * math.sin(d_lat/2) + \
-        math.cos(lat1_rad) * math.cos(lat2_rad) * \
-        math.sin(d_lon/2) * math.sin(d_lon/2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance 
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Yapılandırılmış, tamponlu loglama.
+
+``QueueLogHandler`` kayıtları bir kuyruğa bırakır; JSON'a çevirme ve yazma
+işi arka plandaki ``QueueListener`` iş parçacığında yapılır, böylece istek
+iş parçacığı G/Ç için beklemez. Kuyruğa girmeden önce hassas alanlar
+(``REDACTED_FIELDS``) maskelenir, kişisel veriler (``HASHED_FIELDS``) ise
+``fingerprint`` ile özetlenir: aynı kişinin kayıtları eşleştirilebilir ama
+adres loglarda görünmez. ``RequestIdMiddleware`` her isteğe bir
+kimlik atar; ``RequestIdFilter`` bu kimliği aynı istekten (ve
+``contextvars`` ile taşınan arka plan işlerinden) gelen tüm kayıtlara ekler.
+``SamplingFilter`` yüksek hacimli DEBUG kayıtlarının yalnızca bir kısmını
+geçirir.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.crypto import salted_hmac
+
+REDACTED = '[REDACTED]'
+REDACTED_FIELDS = frozenset({
+    'password', 'password1', 'password2', 'new_password', 'old_password',
+    'token', 'access', 'refresh', 'authorization', 'secret', 'api_key',
+})
+HASHED_FIELDS = frozenset({'email'})
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord'un kendi öznitelikleri; geri kalanlar ``extra`` ile gelmiştir
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def fingerprint(value):
+    """Bir e-posta gibi kişisel veriden SECRET_KEY ile anahtarlanmış kısa bir özet üretir."""
+    if not isinstance(value, str):
+        return value
+    return salted_hmac('api.logs.fingerprint', value.strip().lower()).hexdigest()[:16]
+
+
+def _mask(key, value, fields):
+    key = str(key).lower()
+    if key in fields:
+        return REDACTED
+    if key in HASHED_FIELDS:
+        return fingerprint(value)
+    return redact(value, fields)
+
+
+def redact(value, fields=REDACTED_FIELDS):
+    """
+    Sözlük ve listelerde adı ``fields`` içinde olan alanları maskeler,
+    ``HASHED_FIELDS`` içindekileri özetler; kopya döndürür.
+    """
+    if isinstance(value, dict):
+        return {key: _mask(key, item, fields) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields) for item in value]
+    if hasattr(value, 'lists'):
+        # QueryDict: çok değerli alanları koruyarak düz sözlüğe çevir
+        return redact({key: items if len(items) > 1 else items[0] for key, items in value.lists()}, fields)
+    return value
+
+
+def extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """Her kaydı tek satırlık bir JSON nesnesine çevirir."""
+
+    def format(self, record):
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            payload['request_id'] = request_id
+        payload.update((key, value) for key, value in extra_fields(record).items() if key != 'request_id')
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Kayda etkin isteğin kimliğini ``request_id`` olarak ekler."""
+
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """``level`` ve altındaki kayıtların yalnızca ``rate`` oranını geçirir; üstündekiler hep geçer."""
+
+    def __init__(self, rate=1.0, level=logging.DEBUG, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+        self.level = level if isinstance(level, int) else logging.getLevelName(level)
+        self.random = random.random
+
+    def filter(self, record):
+        if record.levelno > self.level or self.rate >= 1:
+            return True
+        return self.random() < self.rate
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Kayıtları kuyruğa bırakan ve arka planda ``stream`` akışına JSON olarak yazan handler.
+
+    ``prepare`` istek iş parçacığında çalışır: mesajı biçimlendirir, istisnayı
+    metne çevirir ve ``extra`` alanlarını maskeler. Böylece kuyruktaki kayıt
+    sonradan değişebilecek nesnelere başvurmaz. Kuyruk dolarsa kayıt atılır.
+    """
+
+    def __init__(self, stream=None, max_queue=10000):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JsonFormatter())
+        self.target = target
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        self._running = True
+        atexit.register(self.stop)
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in extra_fields(record).items():
+            setattr(record, key, _mask(key, value, REDACTED_FIELDS))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Kuyrukta bekleyen kayıtları yazar ve dinleyiciyi durdurur."""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+        self.target.flush()
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class RequestIdMiddleware:
+    """
+    İstek kimliğini ``X-Request-ID`` başlığından alır (geçersizse yenisini üretir),
+    istek boyunca ``request_id_var`` içinde tutar ve yanıt başlığına ekler.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def request_id(request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        return incoming if _REQUEST_ID_PATTERN.match(incoming) else new_request_id()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.request_id = self.request_id(request)
+        token = request_id_var.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        request.request_id = self.request_id(request)
+        token = request_id_var.set(request.request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
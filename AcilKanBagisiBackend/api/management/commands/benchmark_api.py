@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Geçici bir test veritabanına sentetik veri yükler, users ve donations rotalarını süreç içinde '
+        've eşzamanlı olarak ölçer; sonuçları bir taban çizgisiyle karşılaştırır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--centers', type=int, default=100)
+        parser.add_argument('--donations', type=int, default=5000)
+        parser.add_argument('--emergencies', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200, help='Uç nokta ve eşzamanlılık başına istek sayısı.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--asgi', action='store_true',
+                            help='İstekleri tek bir olay döngüsünden (bir ASGI worker) eşzamanlı görevlerle gönder.')
+        parser.add_argument('--endpoints', nargs='+', help='Yalnızca bu uç noktaları ölç.')
+        parser.add_argument('--urlconf', default='api.benchmark_urls')
+        parser.add_argument('--save', help='Sonuçların yazılacağı JSON dosyası.')
+        parser.add_argument('--baseline', help='Karşılaştırılacak JSON taban çizgisi.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='İzin verilen gerileme oranı (0.2 = %%20).')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # Eşzamanlı iş parçacıkları için bellek içi yerine dosya veritabanı
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'acilkan_benchmark.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        for alias in settings.DATABASE_REPLICAS:
+            # Replikalar test veritabanını yansıtsın; yönlendirme yine ölçülür
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            # Aynı istemciden gelen yüzlerce giriş kısıtlayıcılara takılmasın
+            rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+            # Deneme kullanıcıları MongoDB'ye yansıtılmaz
+            with override_settings(ROOT_URLCONF=options['urlconf'], REST_FRAMEWORK=rest_framework,
+                                   MONGO_MIRROR_ENABLED=False):
+                results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Sonuçlar {options['save']} dosyasına yazıldı.")
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = benchmark.compare(baseline, results, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f'{len(regressions)} gerileme bulundu (eşik %{options["threshold"] * 100:g}).')
+            self.stdout.write(self.style.SUCCESS('Taban çizgisine göre gerileme yok.'))
+
+    def benchmark(self, options):
+        from donations.models import EmergencyRequest
+
+        user = benchmark.seed(
+            users=options['users'], centers=options['centers'], donations=options['donations'],
+            emergencies=options['emergencies'], seed=options['seed'],
+        )
+        emergency_id = EmergencyRequest.objects.order_by('pk').values_list('pk', flat=True).first()
+        endpoints = benchmark.default_endpoints(emergency_id)
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - {endpoint.name for endpoint in endpoints}
+            if unknown:
+                raise CommandError(f"Bilinmeyen uç nokta: {', '.join(sorted(unknown))}")
+            endpoints = [endpoint for endpoint in endpoints if endpoint.name in options['endpoints']]
+        return benchmark.run(
+            endpoints, requests=options['requests'], concurrencies=options['concurrency'],
+            user=user, warmup=options['warmup'], asgi=options['asgi'],
+        )
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'ölçüm':<28} {'istek/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'sorgu':>6} {'hata':>5}"
+        )
+        for key, result in results.items():
+            self.stdout.write(
+                f"{key:<28} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['p99_ms']:>9.2f} {'-' if result['queries'] is None else result['queries']:>6} "
+                f"{result['errors']:>5}"
+            )
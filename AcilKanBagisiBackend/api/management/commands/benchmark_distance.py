@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.distance import calculate_distance, within_radius
+
+
+class Command(BaseCommand):
+    help = 'Tekil Haversine döngüsü ile toplu NumPy mesafe hesabını karşılaştırır.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--radius', type=float, default=25.0)
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        origin = (39.93, 32.85)
+        repeat = options['repeat']
+        radius = options['radius']
+
+        self.stdout.write(f"{'nokta':>8} {'döngü (ms)':>12} {'float64 (ms)':>13} {'float32 (ms)':>13} {'ön eleme (ms)':>14} {'hızlanma':>9}")
+        for size in options['sizes']:
+            lats = rng.uniform(36.0, 42.0, size)
+            lons = rng.uniform(26.0, 45.0, size)
+            points = list(zip(lats.tolist(), lons.tolist()))
+
+            loop = self.best_of(repeat, lambda: [
+                d for d in (calculate_distance(origin[0], origin[1], lat, lon) for lat, lon in points) if d <= radius
+            ])
+            batch64 = self.best_of(repeat, lambda: within_radius(*origin, lats, lons, radius, prefilter=False))
+            batch32 = self.best_of(
+                repeat, lambda: within_radius(*origin, lats, lons, radius, dtype=np.float32, prefilter=False)
+            )
+            prefiltered = self.best_of(repeat, lambda: within_radius(*origin, lats, lons, radius))
+
+            self.stdout.write(
+                f'{size:>8} {loop * 1000:>12.2f} {batch64 * 1000:>13.2f} {batch32 * 1000:>13.2f} '
+                f'{prefiltered * 1000:>14.2f} {loop / batch64:>8.1f}x'
+            )
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from api.benchmark import percentile
+
+MODES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    # PRAGMA'lar ve BEGIN IMMEDIATE, yazıcı kuyruğu olmadan
+    'wal': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': settings.SQLITE_HARDENED_OPTIONS},
+    'hardened': {'ENGINE': 'api.sqlite', 'OPTIONS': settings.SQLITE_HARDENED_OPTIONS},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Geçici bir SQLite dosyasında eşzamanlı yazıcılar (kayıt + bağış işlemi) ve okuyucularla '
+        'varsayılan, yalnızca WAL ve sertleştirilmiş SQLite modlarını karşılaştırır: sürekli yazma/s, okuma/s, '
+        '"database is locked" hataları ve yazma gecikmesi.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['default', 'wal', 'hardened'])
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Mod başına ölçüm süresi.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Bu ölçüm yalnızca SQLite içindir.')
+        self.password = make_password('benchmark-password')
+        original = {key: connection.settings_dict[key] for key in ('ENGINE', 'OPTIONS')}
+        setup_test_environment()
+        self.stdout.write(
+            f"{'mod':<10} {'yazma/s':>9} {'okuma/s':>9} {'kilit hatası':>13} {'p50 (ms)':>9} {'p95 (ms)':>9}"
+        )
+        try:
+            for mode in options['modes']:
+                result = self.measure(mode, options)
+                self.stdout.write(
+                    f"{mode:<10} {result['writes_per_second']:>9.1f} {result['reads_per_second']:>9.1f} "
+                    f"{result['locked']:>13} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}"
+                )
+        finally:
+            connection.settings_dict.update(original)
+            teardown_test_environment()
+
+    def measure(self, mode, options):
+        # İş parçacıkları bağlantılarını bu ortak ayar sözlüğünden açar
+        connection.settings_dict.update(MODES[mode])
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'acilkan_sqlite_{mode}.sqlite3')
+        connection.close()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return self.run_workload(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(test_settings['NAME'] + suffix):
+                    os.remove(test_settings['NAME'] + suffix)
+
+    def run_workload(self, options):
+        from donations.counters import record_donation
+        from donations.models import Donation, DonationCenter
+        from users.models import CustomUser
+
+        center = DonationCenter.objects.create(name='Merkez', address='-', city='Ankara', district='-', phone='0')
+        connection.close()
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        latencies = []
+        totals = {'reads': 0, 'locked': 0}
+
+        def writer(number):
+            sequence = 0
+            try:
+                while time.monotonic() < deadline:
+                    sequence += 1
+                    started = time.perf_counter()
+                    try:
+                        # register_user ve DonationSerializer.create'in yazdıkları
+                        with transaction.atomic():
+                            user = CustomUser.objects.create(
+                                email=f'writer{number}-{sequence}@benchmark.local', password=self.password,
+                                full_name='Yazıcı', blood_type='A+', city='Ankara',
+                            )
+                            donation = Donation.objects.create(
+                                user=user, donation_center=center, date=timezone.localdate(), status='completed',
+                            )
+                            record_donation(donation)
+                    except OperationalError:
+                        with lock:
+                            totals['locked'] += 1
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        def reader():
+            reads = 0
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        list(Donation.objects.order_by('-pk').values_list('pk', 'user_id')[:20])
+                        reads += 1
+                    except OperationalError:
+                        with lock:
+                            totals['locked'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    totals['reads'] += reads
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'writes_per_second': len(latencies) / elapsed,
+            'reads_per_second': totals['reads'] / elapsed,
+            'locked': totals['locked'],
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+        }
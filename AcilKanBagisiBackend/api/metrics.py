@@ -0,0 +1,279 @@
+"""
+İstek düzeyinde performans metrikleri.
+
+``MetricsMiddleware`` her istek için süreyi, veritabanı sorgu sayısını ve
+süresini, serializer süresini ve yanıt boyutunu rota bazında kaydeder.
+Değerler süreç içi ``registry`` nesnesinde tutulur ve ``metrics_view``
+tarafından Prometheus metin biçiminde sunulur. ``METRICS_SLOW_REQUEST_SECONDS``
+aşan istekler en yavaş SQL sorgularıyla birlikte loglanır.
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+slow_logger = logging.getLogger('api.metrics.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Prometheus uyumlu, kümülatif kovalı histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            position = len(self.buckets)
+        self.counts[position] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            yield ('+Inf' if bound == math.inf else repr(bound)), cumulative
+
+
+def _labels(**labels):
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """Rota ve metod bazında istek metrikleri; iş parçacığı güvenlidir."""
+
+    def __init__(self, prefix='acilkan'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._collectors = []
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def register_collector(self, collector):
+        """``collector()`` Prometheus metin satırları döndüren bir fonksiyondur."""
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def observe_request(self, route, method, status, duration, queries=0, query_time=0.0,
+                        serializer_time=0.0, response_size=None):
+        with self._lock:
+            entry = self._routes.get((route, method))
+            if entry is None:
+                entry = self._routes[(route, method)] = {
+                    'latency': Histogram(LATENCY_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                    'size': Histogram(SIZE_BUCKETS),
+                    'statuses': {},
+                    'query_time': 0.0,
+                    'serializer_time': 0.0,
+                }
+            entry['latency'].observe(duration)
+            entry['queries'].observe(queries)
+            if response_size is not None:
+                entry['size'].observe(response_size)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['query_time'] += query_time
+            entry['serializer_time'] += serializer_time
+
+    def render(self):
+        """Tüm metrikleri Prometheus metin biçiminde döndürür."""
+        prefix = self.prefix
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            def histogram(name, help_text, key):
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} histogram')
+                for (route, method), entry in routes:
+                    values = entry[key]
+                    for bound, count in values.samples():
+                        lines.append(f'{prefix}_{name}_bucket{_labels(route=route, method=method, le=bound)} {count}')
+                    lines.append(f'{prefix}_{name}_sum{_labels(route=route, method=method)} {values.sum}')
+                    lines.append(f'{prefix}_{name}_count{_labels(route=route, method=method)} {values.count}')
+
+            def counter(name, help_text, key):
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+                for (route, method), entry in routes:
+                    lines.append(f'{prefix}_{name}{_labels(route=route, method=method)} {entry[key]}')
+
+            histogram('http_request_duration_seconds', 'Request latency.', 'latency')
+            lines.append(f'# HELP {prefix}_http_requests_total Requests by status code.')
+            lines.append(f'# TYPE {prefix}_http_requests_total counter')
+            for (route, method), entry in routes:
+                for status, count in sorted(entry['statuses'].items()):
+                    lines.append(f'{prefix}_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+            histogram('http_response_size_bytes', 'Response body size.', 'size')
+            histogram('db_queries_per_request', 'Database queries per request.', 'queries')
+            counter('db_query_seconds_total', 'Time spent in database queries.', 'query_time')
+            counter('serializer_seconds_total', 'Time spent building serializer data.', 'serializer_time')
+
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# İstek boyunca serializer süresini biriktirir; None ise ölçüm yapılmaz
+_serializer_time = contextvars.ContextVar('serializer_time', default=None)
+_serializer_depth = contextvars.ContextVar('serializer_depth', default=0)
+
+
+def instrument_serializers():
+    """
+    ``BaseSerializer.data`` özelliğini süre ölçen bir sürümle değiştirir.
+
+    İç içe ``data`` çağrıları yalnızca bir kez sayılır. Ölçüm yalnızca
+    ``MetricsMiddleware`` içinden gelen isteklerde yapılır.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        if _serializer_time.get() is None or _serializer_depth.get():
+            return original.fget(self)
+        token = _serializer_depth.set(1)
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            _serializer_depth.reset(token)
+            _serializer_time.set(_serializer_time.get() + time.perf_counter() - started)
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` ile sorgu sayısını ve süresini toplar."""
+
+    def __init__(self, capture_sql=False):
+        self.count = 0
+        self.time = 0.0
+        self.capture_sql = capture_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            if self.capture_sql:
+                self.statements.append((elapsed, sql))
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None and match.route else 'unmatched'
+
+
+def _response_size(response):
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Her isteği ``registry`` içine kaydeder; yavaş istekleri SQL ile loglar."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @property
+    def slow_threshold(self):
+        return getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder(capture_sql=self.slow_threshold is not None)
+        token = _serializer_time.set(0.0)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+            duration = time.perf_counter() - started
+            serializer_time = _serializer_time.get()
+        finally:
+            _serializer_time.reset(token)
+        self.record(request, response, duration, recorder, serializer_time)
+        return response
+
+    async def __acall__(self, request):
+        # Asenkron görünümlerde sorgular başka iş parçacıklarında çalışır; yalnızca süre ve boyut ölçülür
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, QueryRecorder(), 0.0)
+        return response
+
+    def record(self, request, response, duration, recorder, serializer_time):
+        route = _route(request)
+        registry.observe_request(
+            route, request.method, response.status_code, duration,
+            queries=recorder.count, query_time=recorder.time,
+            serializer_time=serializer_time, response_size=_response_size(response),
+        )
+        threshold = self.slow_threshold
+        if threshold is not None and duration >= threshold:
+            slowest = sorted(recorder.statements, reverse=True)[:5]
+            slow_logger.warning(
+                'Yavaş istek: %s %s (%s) %.3fs, %d sorgu %.3fs',
+                request.method, request.path, route, duration, recorder.count, recorder.time,
+                extra={'route': route, 'duration': duration, 'queries': recorder.count,
+                       'slow_sql': [{'seconds': round(elapsed, 6), 'sql': sql} for elapsed, sql in slowest]},
+            )
+
+
+def metrics_view(request):
+    """
+    Prometheus metin biçiminde metrikler. ``METRICS_TOKEN`` ayarlıysa Bearer
+    token ister; ayarlı değilse yalnızca DEBUG açıkken yanıt verir.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
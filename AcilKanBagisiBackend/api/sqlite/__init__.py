@@ -0,0 +1 @@
+# This file is intentionally left empty to make Python treat the directory as a package.
@@ -0,0 +1,94 @@
+"""
+Tek düğümlü kurulumlar için SQLite arka ucu (``ENGINE: "api.sqlite"``).
+
+PRAGMA'lar (WAL, ``synchronous``, ``cache_size``, ``mmap_size``) ve
+``BEGIN IMMEDIATE`` Django'nun ``init_command`` ve ``transaction_mode``
+seçenekleriyle uygulanır (bkz. ``SQLITE_HARDENED_OPTIONS``). Bu arka uç
+bunlara süreç içi bir yazıcı kuyruğu ekler. ``transaction.atomic`` ile
+başlayan işlemler aynı veritabanı dosyasında sırayla, geliş sırasına göre
+çalışır. Böylece SQLite'ın meşgul bekleyicisi yoklama yapmaz ve yazmalar
+"database is locked" hatasına düşmez. WAL sayesinde okuyucular kuyruğa
+girmez. Birden fazla süreç arasında sıralamayı yine SQLite'ın kilidi ve
+``timeout`` sağlar. Bellek içi veritabanlarında kuyruk kullanılmaz.
+"""
+import threading
+from collections import deque
+
+from django.db.backends.sqlite3 import base
+from django.db.utils import OperationalError
+
+
+class WriterQueue:
+    """FIFO kilit: yazma işlemleri teker teker ve geliş sırasıyla çalışır."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._busy = False
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            if not self._busy:
+                self._busy = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                # Tam zaman aşımında sıra bize devredildi
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Sıradakine devret; kuyruk meşgul kalır
+                self._waiters.popleft().set()
+            else:
+                self._busy = False
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def writer_queue(name):
+    """Veritabanı dosyası başına tek kuyruk."""
+    with _queues_lock:
+        return _queues.setdefault(str(name), WriterQueue())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _writer_queue = None
+
+    def _start_transaction_under_autocommit(self):
+        if not self.is_in_memory_db():
+            queue = writer_queue(self.settings_dict['NAME'])
+            if not queue.acquire(timeout=self.settings_dict['OPTIONS'].get('timeout', 5)):
+                raise OperationalError('database is locked')
+            self._writer_queue = queue
+        try:
+            super()._start_transaction_under_autocommit()
+        except BaseException:
+            self._release_writer()
+            raise
+
+    def _set_autocommit(self, autocommit):
+        super()._set_autocommit(autocommit)
+        if autocommit:
+            self._release_writer()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_writer()
+
+    def _release_writer(self):
+        queue, self._writer_queue = self._writer_queue, None
+        if queue is not None:
+            queue.release()
@@ -1,3 +1,464 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, router
+from django.db.utils import load_backend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+from django.views import View
+from rest_framework import serializers
+
+from donations.cache import donation_center_cache, fill_from_primary_if_recent
+from donations.models import DonationCenter, EmergencyRequest
+from users.models import CustomUser
+from .distance import calculate_distance, haversine, nearest, within_radius
+from .geo_index import GeoGridIndex, ModelGeoIndex
+from . import benchmark
+from .db import STICKY_COOKIE, ReplicaReadMixin, ReplicaRoutingMiddleware, prefer_replica, untracked_writes
+from .logs import REDACTED, QueueLogHandler, RequestIdFilter, RequestIdMiddleware, SamplingFilter, fingerprint
+from .metrics import Histogram, MetricsMiddleware, MetricsRegistry, metrics_view, registry
+from .sqlite.base import WriterQueue
+
+
+class BatchDistanceTests(SimpleTestCase):
+    """Toplu mesafe hesabının tekil Haversine ile tutarlılığını doğrular."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.lats = rng.uniform(36.0, 42.0, 5000)
+        self.lons = rng.uniform(26.0, 45.0, 5000)
+
+    def scalar(self, lat, lon):
+        return np.array([calculate_distance(lat, lon, a, b) for a, b in zip(self.lats, self.lons)])
+
+    def test_single_origin_matches_scalar(self):
+        np.testing.assert_allclose(haversine(41.0, 29.0, self.lats, self.lons), self.scalar(41.0, 29.0), atol=1e-6)
+
+    def test_many_origins_return_matrix(self):
+        distances = haversine([41.0, 39.9], [29.0, 32.8], self.lats, self.lons)
+        self.assertEqual(distances.shape, (2, 5000))
+        np.testing.assert_allclose(distances[1], self.scalar(39.9, 32.8), atol=1e-6)
+
+    def test_float32_precision(self):
+        distances = haversine(41.0, 29.0, self.lats, self.lons, dtype=np.float32)
+        self.assertEqual(distances.dtype, np.float32)
+        np.testing.assert_allclose(distances, self.scalar(41.0, 29.0), rtol=1e-3, atol=0.05)
+
+    def test_prefilter_does_not_drop_matches(self):
+        for radius in (5, 50, 300):
+            expected = np.flatnonzero(self.scalar(39.9, 32.8) <= radius)
+            indices, _ = within_radius(39.9, 32.8, self.lats, self.lons, radius)
+            self.assertEqual(sorted(indices.tolist()), expected.tolist())
+
+    def test_nearest_is_sorted_and_limited(self):
+        indices, distances = nearest(41.0, 29.0, self.lats, self.lons, radius_km=400, limit=10)
+        self.assertEqual(len(indices), 10)
+        self.assertTrue(np.all(np.diff(distances) >= 0))
+        self.assertEqual(indices.tolist(), np.argsort(self.scalar(41.0, 29.0))[:10].tolist())
+
+    def test_nearest_rejects_negative_limit(self):
+        with self.assertRaises(ValueError):
+            nearest(41.0, 29.0, self.lats, self.lons, limit=-3)
+        self.assertEqual(len(nearest(41.0, 29.0, self.lats, self.lons, limit=0)[0]), 0)
+
+
+class GeoGridIndexTests(TestCase):
+    """Grid indeksinin tam taramayla aynı sonuçları verdiğini doğrular."""
+
+    def setUp(self):
+        rng = random.Random(42)
+        self.points = [
+            (i, rng.uniform(36.0, 42.0), rng.uniform(26.0, 45.0))
+            for i in range(2000)
+        ]
+        self.index = GeoGridIndex(self.points)
+
+    def brute_force(self, lat, lon, radius):
+        matches = []
+        for key, point_lat, point_lon in self.points:
+            distance = calculate_distance(lat, lon, point_lat, point_lon)
+            if distance <= radius:
+                matches.append((distance, key))
+        return sorted(matches)
+
+    def test_radius_query_matches_full_scan(self):
+        for lat, lon, radius in [(41.01, 28.97, 25), (39.93, 32.85, 80), (38.42, 27.14, 5)]:
+            self.assertEqual(
+                [key for _, key in self.index.query(lat, lon, radius)],
+                [key for _, key in self.brute_force(lat, lon, radius)],
+            )
+
+    def test_limit_returns_nearest(self):
+        expected = self.brute_force(39.93, 32.85, 200)[:5]
+        matches = self.index.query(39.93, 32.85, 200, limit=5)
+        self.assertEqual([key for _, key in matches], [key for _, key in expected])
+        np.testing.assert_allclose([distance for distance, _ in matches], [distance for distance, _ in expected])
+
+    def test_query_across_antimeridian(self):
+        index = GeoGridIndex([('east', 0.0, 179.95), ('west', 0.0, -179.95), ('far', 0.0, 170.0)])
+        keys = [key for _, key in index.query(0.0, 179.99, 20)]
+        self.assertEqual(keys, ['east', 'west'])
+
+    def test_huge_radius_scans_only_occupied_cells(self):
+        lookups = []
+
+        class CountingCells(dict):
+            def __contains__(self, cell):
+                lookups.append(cell)
+                return super().__contains__(cell)
+
+        index = GeoGridIndex(self.points[:10])
+        index.cells = CountingCells(index.cells)
+        self.assertEqual(len(index.query(39.0, 35.0, 20000)), 10)
+        # Not one lookup per cell of the ~6.5M-cell bounding box
+        self.assertLessEqual(len(lookups), len(index.cells))
+
+
+class ModelGeoIndexTests(TestCase):
+    """Model indeksinin kayıt değişikliklerinde yenilendiğini doğrular."""
+
+    def create_center(self, name, latitude, longitude):
+        return DonationCenter.objects.create(
+            name=name, address='-', city='İstanbul', district='Kadıköy',
+            phone='0', latitude=latitude, longitude=longitude,
+        )
+
+    def test_index_rebuilds_after_save_and_delete(self):
+        index = ModelGeoIndex(DonationCenter)
+        index.connect_signals()
+        self.addCleanup(index.disconnect_signals)
+        first = self.create_center('Kadıköy', 40.99, 29.03)
+        self.create_center('Ankara', 39.93, 32.85)
+        self.assertEqual([pk for _, pk in index.nearby(41.0, 29.0, 10)], [first.pk])
+
+        second = self.create_center('Üsküdar', 41.02, 29.01)
+        self.assertEqual(len(index.nearby(41.0, 29.0, 10)), 2)
+
+        second.delete()
+        self.assertEqual([pk for _, pk in index.nearby(41.0, 29.0, 10)], [first.pk])
+
+    def test_version_is_read_on_an_interval(self):
+        index = ModelGeoIndex(DonationCenter)
+        self.create_center('Kadıköy', 40.99, 29.03)
+        with mock.patch.object(index, '_current_version', return_value=0) as current_version:
+            for _ in range(3):
+                index.nearby(41.0, 29.0, 10)
+            self.assertEqual(current_version.call_count, 1)
+            with override_settings(GEO_INDEX_VERSION_CHECK_SECONDS=0):
+                index.nearby(41.0, 29.0, 10)
+            self.assertEqual(current_version.call_count, 2)
+
+
+class CenterNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DonationCenter
+        fields = ('name',)
+
+
+def center_names(request):
+    data = CenterNameSerializer(DonationCenter.objects.all(), many=True).data
+    return HttpResponse(','.join(row['name'] for row in data))
+
+
+class MetricsTests(TestCase):
+    """Tests for the request metrics middleware and endpoint."""
+
+    def setUp(self):
+        registry.reset()
+        DonationCenter.objects.create(name='Merkez', address='-', city='Ankara', district='-', phone='0')
+
+    def call(self, view, path='/api/donations/stats/'):
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+        return MetricsMiddleware(view)(request)
+
+    def test_records_route_queries_and_size(self):
+        self.call(center_names)
+        output = registry.render()
+        labels = 'route="api/donations/stats/",method="GET"'
+        self.assertIn(f'acilkan_http_requests_total{{{labels},status="200"}} 1', output)
+        self.assertIn(f'acilkan_db_queries_per_request_bucket{{{labels},le="1"}} 1', output)
+        self.assertIn(f'acilkan_http_response_size_bytes_sum{{{labels}}} 6.0', output)
+        serializer_time = next(line for line in output.splitlines()
+                               if line.startswith(f'acilkan_serializer_seconds_total{{{labels}}}'))
+        self.assertGreater(float(serializer_time.split()[-1]), 0)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('api.metrics.slow', 'WARNING') as logs:
+            self.call(center_names)
+        self.assertIn('donations_donationcenter', logs.records[0].slow_sql[0]['sql'])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_token_when_configured(self):
+        self.assertEqual(metrics_view(RequestFactory().get('/')).status_code, 403)
+        response = metrics_view(RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer secret'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_endpoint_without_token_is_closed_unless_debug(self):
+        self.assertEqual(metrics_view(RequestFactory().get('/')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(metrics_view(RequestFactory().get('/')).status_code, 200)
+
+    def test_endpoint_is_routed(self):
+        self.assertIs(resolve('/api/metrics/', urlconf='api.benchmark_urls').func, metrics_view)
+
+    def test_histogram_is_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 3, 7):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.samples()), [('1', 1), ('5', 2), ('+Inf', 3)])
+        self.assertIn('# TYPE x_db_query_seconds_total counter', MetricsRegistry(prefix='x').render())
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    """Tests for the queued JSON log handler, redaction, sampling and request ids."""
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = QueueLogHandler(stream=self.stream)
+        self.handler.addFilter(RequestIdFilter())
+        self.logger = logging.getLogger('api.tests.structured')
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+        self.addCleanup(self.handler.close)
+
+    def records(self):
+        self.handler.stop()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_json_with_redacted_fields(self):
+        data = {'email': 'a@example.com', 'password': 'hunter2', 'nested': [{'refresh': 'x'}]}
+        self.logger.info('Giriş %s', 'isteği', extra={'data': data, 'token': 'abc'})
+        data['password'] = 'changed-after-logging'
+        [record] = self.records()
+        self.assertEqual(record['message'], 'Giriş isteği')
+        self.assertEqual(record['data'], {'email': fingerprint('a@example.com'), 'password': REDACTED,
+                                          'nested': [{'refresh': REDACTED}]})
+        self.assertEqual(record['token'], REDACTED)
+        self.assertNotIn('hunter2', self.stream.getvalue())
+        self.assertNotIn('a@example.com', self.stream.getvalue())
+        self.assertEqual(fingerprint(' A@example.com'), fingerprint('a@example.com'))
+
+    def test_exceptions_are_formatted_before_queueing(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            self.logger.exception('failed')
+        [record] = self.records()
+        self.assertIn('ValueError: boom', record['exception'])
+
+    def test_request_id_is_attached_and_echoed(self):
+        def view(request):
+            self.logger.warning('inside')
+            return HttpResponse()
+
+        request = RequestFactory().get('/', HTTP_X_REQUEST_ID='abc-123')
+        response = RequestIdMiddleware(view)(request)
+        generated = RequestIdMiddleware(view)(RequestFactory().get('/', HTTP_X_REQUEST_ID='bad id!'))
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        self.assertRegex(generated['X-Request-ID'], '^[0-9a-f]{32}$')
+        self.assertEqual([record['request_id'] for record in self.records()],
+                         ['abc-123', generated['X-Request-ID']])
+
+    def test_sampling_only_thins_debug_records(self):
+        sampler = SamplingFilter(rate=0.25)
+        sampler.random = iter([0.1, 0.5, 0.9, 0.2]).__next__
+        self.handler.addFilter(sampler)
+        for number in range(4):
+            self.logger.debug('debug %d', number)
+        self.logger.error('error')
+        self.assertEqual([record['message'] for record in self.records()], ['debug 0', 'debug 3', 'error'])
+
+
+# Replica mirrors use their own connection and cannot see this test's transaction
+@override_settings(ROOT_URLCONF='api.benchmark_urls', DATABASE_REPLICAS=[])
+class ApiBenchmarkTests(TestCase):
+    """Tests for the API benchmark seeding, runner and regression check."""
+
+    def test_seeded_routes_run_without_errors(self):
+        user = benchmark.seed(users=20, centers=5, donations=40, emergencies=5)
+        choices = {value for value, _ in CustomUser.BLOOD_TYPE_CHOICES}
+        self.assertLessEqual(set(CustomUser.objects.values_list('blood_type', flat=True)), choices)
+        self.assertLessEqual(set(EmergencyRequest.objects.values_list('blood_type', flat=True)), choices)
+        # The async login authenticates on another thread, outside this test's transaction
+        endpoints = [endpoint for endpoint in benchmark.default_endpoints() if not endpoint.name.startswith('login')]
+        results = benchmark.run(endpoints, requests=3, user=user, warmup=1)
+        self.assertEqual(set(results), {f'{endpoint.name}@c1' for endpoint in endpoints})
+        for key, result in results.items():
+            self.assertEqual((result['requests'], result['errors']), (3, 0), key)
+            # Centers come from the response cache and the user from the token's claims
+            self.assertGreaterEqual(result['queries'], 0 if key.startswith('centers') else 1, key)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        base = {'p95_ms': 10.0, 'p99_ms': 20.0, 'throughput_rps': 100.0, 'queries': 2.0, 'errors': 0}
+        within = dict(base, p95_ms=11.5, throughput_rps=85.0)
+        worse = dict(base, p99_ms=30.0, throughput_rps=70.0, queries=3.0)
+        self.assertEqual(benchmark.compare({'a@c1': base}, {'a@c1': within, 'new@c1': worse}), [])
+        self.assertEqual(len(benchmark.compare({'a@c1': base}, {'a@c1': worse})), 3)
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 50), 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Reads of marked views go to a replica until the request writes; writes always go to the primary."""
+
+    def route(self, method='get', replica_view=True, write=False, cookies=None):
+        seen = []
+
+        def handler(view, request):
+            seen.append(router.db_for_read(DonationCenter))
+            if write == 'untracked':
+                with untracked_writes():
+                    router.db_for_write(DonationCenter)
+                seen.append(router.db_for_read(DonationCenter))
+            elif write:
+                router.db_for_write(DonationCenter)
+                seen.append(router.db_for_read(DonationCenter))
+            return HttpResponse()
+
+        bases = (ReplicaReadMixin, View) if replica_view else (View,)
+        view = type('ReadView', bases, {'get': handler, 'post': handler}).as_view()
+        request = RequestFactory().generic(method.upper(), '/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_of_marked_views_use_the_replica(self):
+        self.assertEqual(self.route()[0], ['replica'])
+        self.assertEqual(self.route(replica_view=False)[0], ['default'])
+        self.assertEqual(self.route(method='post')[0], ['default'])
+        self.assertEqual(router.db_for_read(DonationCenter), 'default')
+        self.assertIs(router.allow_migrate('replica', 'donations'), False)
+
+    def test_writes_stick_to_the_primary(self):
+        seen, response = self.route(write=True)
+        self.assertEqual(seen, ['replica', 'default'])
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 5)
+        seen, response = self.route(cookies={STICKY_COOKIE: '1'})
+        self.assertEqual(seen, ['default'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_untracked_writes_keep_reads_on_the_replica(self):
+        seen, response = self.route(write='untracked')
+        self.assertEqual(seen, ['replica', 'replica'])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_async_requests_share_state_with_orm_threads(self):
+        async def view(request):
+            prefer_replica()
+            read = await sync_to_async(router.db_for_read)(DonationCenter)
+            await sync_to_async(router.db_for_write)(DonationCenter)
+            return HttpResponse(f'{read} {router.db_for_read(DonationCenter)}')
+
+        request = RequestFactory().get('/')
+        response = asyncio.run(ReplicaRoutingMiddleware(view)(request))
+        self.assertEqual(response.content, b'replica default')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_cache_fill_after_a_change_reads_the_primary(self):
+        def view(request):
+            prefer_replica()
+            donation_center_cache.invalidate()
+            fill_from_primary_if_recent(donation_center_cache)
+            return HttpResponse(router.db_for_read(DonationCenter))
+
+        self.assertEqual(ReplicaRoutingMiddleware(view)(RequestFactory().get('/')).content, b'default')
+
+
+class HardenedSQLiteTests(SimpleTestCase):
+    """The api.sqlite backend applies the pragmas and runs write transactions one at a time."""
+
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = {
+            **settings.DATABASES['default'],
+            'ENGINE': 'api.sqlite',
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+            'OPTIONS': {**settings.SQLITE_HARDENED_OPTIONS, 'timeout': 0.2},
+        }
+
+    def wrapper(self):
+        wrapper = load_backend('api.sqlite').DatabaseWrapper(self.settings_dict)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def begin_in_thread(self):
+        """Start a write transaction on a fresh connection in another thread; returns the error, if any."""
+        errors = []
+
+        def begin():
+            wrapper = load_backend('api.sqlite').DatabaseWrapper(self.settings_dict)
+            try:
+                wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                wrapper.close()
+
+        thread = threading.Thread(target=begin)
+        thread.start()
+        thread.join()
+        return errors[0] if errors else None
+
+    def test_pragmas_and_immediate_transactions(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('journal_mode', 'synchronous')]
+        self.assertEqual(pragmas, ['wal', 1])
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+    def test_writers_queue_and_readers_do_not(self):
+        writer, reader = self.wrapper(), self.wrapper()
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        with writer.cursor() as cursor:
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+        with reader.cursor() as cursor:
+            self.assertEqual(cursor.execute('SELECT COUNT(*) FROM item').fetchone(), (0,))
+
+        self.assertEqual(str(self.begin_in_thread()), 'database is locked')
+        writer.commit()
+        writer.set_autocommit(True)
+        self.assertIsNone(self.begin_in_thread())
+
+    def test_queue_hands_over_in_arrival_order(self):
+        queue, order, threads = WriterQueue(), [], []
+        self.assertTrue(queue.acquire())
+
+        def write(number):
+            queue.acquire()
+            order.append(number)
+            queue.release()
+
+        for number in range(3):
+            threads.append(threading.Thread(target=write, args=(number,)))
+            threads[-1].start()
+            while len(queue._waiters) <= number:
+                threading.Event().wait(0.001)
+        self.assertFalse(queue.acquire(timeout=0.01))
+        self.assertEqual(len(queue._waiters), 3)
+
+        queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2])
+        self.assertFalse(queue._busy)
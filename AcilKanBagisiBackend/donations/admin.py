@@ -1,5 +1,8 @@
 ﻿from django.contrib import admin
-from .models import DonationCenter, Donation, EmergencyRequest, EmergencyResponse
+from .exports import export_action
+from .models import DonationCenter, Donation, EmergencyRequest, EmergencyResponse, SupplyRollup
+
+export_actions = [export_action('csv'), export_action('ndjson')]
 
 @admin.register(DonationCenter)
 class DonationCenterAdmin(admin.ModelAdmin):
@@ -17,6 +20,7 @@ class DonationAdmin(admin.ModelAdmin):
     list_filter = ('status', 'date', 'donation_center')
     search_fields = ('user__email', 'user__full_name', 'donation_center__name')
     raw_id_fields = ('user', 'donation_center')
+    actions = export_actions
 
 @admin.register(EmergencyRequest)
 class EmergencyRequestAdmin(admin.ModelAdmin):
@@ -26,6 +30,7 @@ class EmergencyRequestAdmin(admin.ModelAdmin):
     list_filter = ('status', 'blood_type', 'urgency_level', 'city')
     search_fields = ('patient_name', 'hospital', 'city', 'requester__email', 'requester__full_name')
     raw_id_fields = ('requester',)
+    actions = export_actions
 
 @admin.register(EmergencyResponse)
 class EmergencyResponseAdmin(admin.ModelAdmin):
@@ -35,3 +40,11 @@ class EmergencyResponseAdmin(admin.ModelAdmin):
     list_filter = ('status', 'response_time')
     search_fields = ('donor__email', 'donor__full_name', 'emergency_request__patient_name')
     raw_id_fields = ('donor', 'emergency_request')
+    actions = export_actions
+
+@admin.register(SupplyRollup)
+class SupplyRollupAdmin(admin.ModelAdmin):
+    """Admin panel for SupplyRollup model."""
+    
+    list_display = ('period', 'period_start', 'blood_type', 'city', 'donations', 'requests_opened', 'requests_fulfilled')
+    list_filter = ('period', 'blood_type', 'city')
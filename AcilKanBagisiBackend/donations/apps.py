@@ -4,3 +4,12 @@
 class DonationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'donations'
+
+    def ready(self):
+        from api.metrics import registry
+        from . import checks, signals  # noqa: F401
+        from .expiry import start_sweeper
+        from .notifications import prometheus_lines
+
+        registry.register_collector(prometheus_lines)
+        start_sweeper()
@@ -0,0 +1,217 @@
+"""Native async read endpoints for the donations API.
+
+Under ASGI every sync DRF view runs through a thread-sensitive adapter, so
+all of them share one thread. These views are coroutines instead.
+Authentication, pagination and row loading use the async ORM (``aget``,
+``acount``, ``async for``). Querysets are planned from the serializer
+beforehand, so serialization touches no lazy relations. Responses are
+rendered with DRF's ``JSONRenderer`` and match their sync counterparts
+byte for byte.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from api.db import ReplicaReadMixin
+from users.authentication import ClaimsJWTAuthentication, user_cache
+from users.revocation import revoked_tokens
+
+from .cache import donation_center_cache, fill_from_primary_if_recent, not_modified, set_validators
+from .models import Donation, DonationCenter, EmergencyRequest
+from .pagination import AsyncPageNumberPagination, EmergencyFeedPagination
+from .query_planning import plan_queryset
+from .serializers import (
+    DonationCenterSerializer,
+    DonationSerializer,
+    EmergencyRequestListSerializer,
+    EmergencyRequestSerializer,
+)
+
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    ``ClaimsJWTAuthentication`` that falls back to the async ORM.
+
+    A claims-built user defers most fields, and loading one from async code
+    raises ``SynchronousOnlyOperation``. Views here only use ``pk`` and the
+    claimed fields.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        if revoked_tokens.sync_due():
+            # The revocation check reads the table when a sync is due
+            await sync_to_async(revoked_tokens.sync)()
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is not None:
+            return user
+        loaded_at = time.time()
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken('Token contained no recognizable user identification') from e
+
+        try:
+            user = await self.user_model.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed('User not found', code='user_not_found') from e
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        user_cache.put(user, loaded_at)
+        return user
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's ``GenericAPIView`` for authenticated reads.
+
+    Subclasses set ``serializer_class`` and ``pagination_class`` and implement
+    ``get_queryset``; ``get`` handlers call ``alist`` or ``aretrieve``.
+    """
+
+    serializer_class = None
+    pagination_class = None
+    authentication_class = AsyncJWTAuthentication
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        authentication = self.authentication_class()
+        self.request = Request(request)
+        try:
+            result = await authentication.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated
+            self.request.user, self.request.auth = result
+            return await super().dispatch(self.request, *args, **kwargs)
+        except APIException as exc:
+            return self.exception_response(exc, authentication)
+
+    def exception_response(self, exc, authentication):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            response['WWW-Authenticate'] = authentication.authenticate_header(self.request)
+        return response
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status_code, content_type='application/json')
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_planned_queryset(self):
+        return plan_queryset(self.get_queryset(), self.serializer_class)
+
+    def serialize(self, data, many=False):
+        context = {'request': self.request, 'view': self, 'format': None}
+        return self.serializer_class(data, many=many, context=context).data
+
+    async def alist_data(self, request):
+        queryset = self.get_planned_queryset()
+        paginator = self.pagination_class() if self.pagination_class else None
+        page = await paginator.apaginate_queryset(queryset, request, view=self) if paginator else None
+        if page is None:
+            return self.serialize([row async for row in queryset], many=True)
+        return paginator.get_paginated_response(self.serialize(page, many=True)).data
+
+    async def alist(self, request):
+        return self.render(await self.alist_data(request))
+
+    async def aretrieve(self, request, pk):
+        queryset = self.get_planned_queryset()
+        try:
+            instance = await queryset.aget(pk=pk)
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise NotFound(f'No {queryset.model._meta.object_name} matches the given query.')
+        return self.render(self.serialize(instance))
+
+
+class AsyncDonationListView(ReplicaReadMixin, AsyncAPIView):
+    """Async version of ``DonationListCreateView`` (GET only)."""
+
+    serializer_class = DonationSerializer
+    pagination_class = AsyncPageNumberPagination
+
+    def get_queryset(self):
+        return Donation.objects.filter(user=self.request.user)
+
+    async def get(self, request):
+        return await self.alist(request)
+
+
+class AsyncDonationDetailView(AsyncDonationListView):
+    """Async version of ``DonationDetailView`` (GET only)."""
+
+    async def get(self, request, pk):
+        return await self.aretrieve(request, pk)
+
+
+class AsyncDonationCenterListView(ReplicaReadMixin, AsyncAPIView):
+    """Async version of ``DonationCenterListView``, sharing its response cache."""
+
+    serializer_class = DonationCenterSerializer
+    pagination_class = AsyncPageNumberPagination
+    response_cache = donation_center_cache
+
+    def get_queryset(self):
+        return DonationCenter.objects.filter(is_active=True)
+
+    async def get(self, request):
+        page = self.response_cache.get(request)
+        if page is None:
+            fill_from_primary_if_recent(self.response_cache)
+            page = self.response_cache.set(request, await self.alist_data(request))
+        if not_modified(request, page):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self.render(page.data)
+        return set_validators(response, page)
+
+
+class AsyncEmergencyFeedView(ReplicaReadMixin, AsyncAPIView):
+    """Async version of the ``EmergencyRequestListCreateView`` feed (GET only)."""
+
+    serializer_class = EmergencyRequestListSerializer
+    pagination_class = EmergencyFeedPagination
+
+    def get_queryset(self):
+        return EmergencyRequest.objects.filter(status='active', expires_at__gt=timezone.now())
+
+    async def get(self, request):
+        return await self.alist(request)
+
+
+class AsyncEmergencyRequestDetailView(AsyncAPIView):
+    """Async version of ``EmergencyRequestDetailView`` (GET only)."""
+
+    serializer_class = EmergencyRequestSerializer
+
+    def get_queryset(self):
+        return EmergencyRequest.objects.filter(requester=self.request.user)
+
+    async def get(self, request, pk):
+        return await self.aretrieve(request, pk)
@@ -0,0 +1,195 @@
+"""Cached list responses with conditional GET support.
+
+Serialized page payloads are stored per URL (page and filters included)
+together with an ETag and a Last-Modified time. ``invalidate`` starts a
+new generation, which makes every stored page stale at once. Model
+signals call it, so cached data changes only when the underlying rows do.
+
+Signals only reach the process that saved the row. Entries therefore also
+expire after a ``timeout``, which bounds how long other workers can serve
+a stale page. A ``CACHES`` alias shared by every worker
+(``DjangoCacheBackend``) makes invalidation take effect everywhere at once.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.db import replica_lag, use_primary
+
+
+class LocMemLRUBackend:
+    """
+    Per-process store that evicts the least recently used entry past
+    ``max_entries`` and drops entries older than ``timeout`` seconds.
+    """
+
+    def __init__(self, max_entries=256, timeout=60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= self.clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None if self.timeout is None else self.clock() + self.timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Store in one of the ``CACHES`` aliases, e.g. a file-based or Redis cache
+    shared by all workers. Entries, including pages of stale generations,
+    expire after ``timeout`` seconds (``None`` keeps them until evicted).
+    """
+
+    def __init__(self, alias='default', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=self.timeout)
+
+    def clear(self):
+        pass
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    data: object
+    etag: str
+    last_modified: float
+
+
+class ResponseCache:
+    """Versioned cache of serialized responses for one resource."""
+
+    def __init__(self, namespace, backend):
+        self.namespace = namespace
+        self.backend = backend
+        self._generation_key = f'{namespace}:generation'
+
+    def generation(self):
+        """Return ``(token, timestamp)`` of the current generation, starting one if needed."""
+        generation = self.backend.get(self._generation_key)
+        if generation is None:
+            generation = (time.time_ns(), int(time.time()))
+            self.backend.set(self._generation_key, generation)
+        return generation
+
+    def generation_age(self):
+        """Seconds since the current generation started, i.e. since the last invalidation."""
+        return (time.time_ns() - self.generation()[0]) / 1e9
+
+    def invalidate(self, **kwargs):
+        previous = self.backend.get(self._generation_key)
+        # Last-Modified has one-second resolution; never reuse the previous second.
+        timestamp = max(int(time.time()), previous[1] + 1 if previous else 0)
+        self.backend.clear()
+        self.backend.set(self._generation_key, (time.time_ns(), timestamp))
+
+    def _key(self, request, generation):
+        path = request.build_absolute_uri(request.path)
+        query = '&'.join(sorted(f'{key}={value}' for key, value in request.query_params.lists()))
+        return f'{self.namespace}:{generation[0]}:{path}?{query}'
+
+    def get(self, request):
+        generation = self.generation()
+        return self.backend.get(self._key(request, generation))
+
+    def set(self, request, data):
+        generation = self.generation()
+        payload = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode('utf-8')
+        page = CachedPage(data=data, etag=quote_etag(hashlib.md5(payload, usedforsecurity=False).hexdigest()),
+                          last_modified=generation[1])
+        self.backend.set(self._key(request, generation), page)
+        return page
+
+
+def build_cache(namespace, setting_name):
+    config = getattr(settings, setting_name, {})
+    backend_class = import_string(config.get('BACKEND', 'donations.cache.LocMemLRUBackend'))
+    return ResponseCache(namespace, backend_class(**config.get('OPTIONS', {})))
+
+
+donation_center_cache = build_cache('donation-centers', 'DONATION_CENTER_CACHE')
+
+
+def fill_from_primary_if_recent(response_cache):
+    """Pages are cached until the next change, so a fill right after one must not read a lagging replica."""
+    if response_cache.generation_age() < replica_lag():
+        use_primary()
+
+
+def not_modified(request, page):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return page.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and page.last_modified <= if_modified_since
+
+
+class CachedListMixin:
+    """List view mixin serving pages from ``response_cache`` with ETag/Last-Modified."""
+
+    response_cache = None
+
+    def list(self, request, *args, **kwargs):
+        page = self.response_cache.get(request)
+        if page is None:
+            fill_from_primary_if_recent(self.response_cache)
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            page = self.response_cache.set(request, response.data)
+
+        if not_modified(request, page):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(page.data)
+        return set_validators(response, page)
+
+
+def set_validators(response, page):
+    """Add the cached page's ETag and Last-Modified to ``response``."""
+    response['ETag'] = page.etag
+    response['Last-Modified'] = http_date(page.last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM_TRANSPORT = 'donations.notifications.LocMemTransport'
+# Backends whose entries live in one process, or nowhere
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.compatibility)
+def check_notification_transport(app_configs, **kwargs):
+    """Enabled alerts need a transport that delivers and a deduplication cache every process shares."""
+    config = getattr(settings, 'EMERGENCY_NOTIFICATIONS', {})
+    if not config.get('ENABLED'):
+        return []
+    errors = []
+    if config.get('BACKEND', LOCMEM_TRANSPORT) == LOCMEM_TRANSPORT:
+        errors.append(Error(
+            'EMERGENCY_NOTIFICATIONS is enabled with LocMemTransport, which sends nothing '
+            'and keeps every alert in memory.',
+            hint='Set EMERGENCY_NOTIFICATIONS["BACKEND"] to EmailTransport or WebhookTransport.',
+            id='donations.E001',
+        ))
+    alias = config.get('DEDUP', {}).get('alias', 'default')
+    cache = settings.CACHES.get(alias)
+    if cache is None or cache.get('BACKEND') in PROCESS_LOCAL_CACHES:
+        errors.append(Error(
+            f'EMERGENCY_NOTIFICATIONS deduplicates through the cache alias {alias!r}, which '
+            f'{"is not configured" if cache is None else "is local to each process"}.',
+            hint='Set NOTIFICATION_CACHE_LOCATION, or point DEDUP["alias"] at a shared cache.',
+            id='donations.E002',
+        ))
+    return errors
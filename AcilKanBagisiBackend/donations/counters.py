@@ -0,0 +1,119 @@
+"""Denormalized counters kept with atomic, in-database updates.
+
+Each change is a single ``UPDATE ... SET x = x + 1`` rather than a
+read-modify-write in Python, so concurrent requests cannot lose increments.
+``reconcile`` recomputes every counter in bulk from the source rows.
+"""
+from django.db import transaction
+from django.db.models import Count, DateField, F, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from users.models import CustomUser, donation_interval, eligible_from
+from . import rollups
+from .models import Donation, EmergencyRequest, EmergencyResponse
+
+USER_COUNTER_FIELDS = ('donation_count', 'last_donation_date', 'eligible_from')
+# Keeps ``pk__in`` lists under SQLite's bound-parameter limit
+RECONCILE_BATCH_SIZE = 500
+
+
+def record_donation(donation):
+    """Count a new donation for its donor."""
+    CustomUser.objects.filter(pk=donation.user_id).update(donation_count=F('donation_count') + 1)
+
+
+def record_completed_donation(donation):
+    """Move the donor's last donation and eligibility dates forward to a completed donation."""
+    newer = Q(last_donation_date__isnull=True) | Q(last_donation_date__lt=donation.date)
+    CustomUser.objects.filter(newer, pk=donation.user_id).update(
+        last_donation_date=donation.date, eligible_from=eligible_from(donation.date)
+    )
+
+
+def release_completed_donation(donation):
+    """
+    Recompute the donor's last donation date from their remaining completed
+    donations, as ``reconcile`` does, when the one it came from is cancelled or deleted.
+    """
+    last = Donation.objects.filter(user=donation.user_id, status='completed').aggregate(last=Max('date'))['last']
+    CustomUser.objects.filter(pk=donation.user_id, last_donation_date=donation.date).update(
+        last_donation_date=last, eligible_from=eligible_from(last)
+    )
+
+
+def record_emergency_unit(emergency_request_id):
+    """
+    Add a received unit to an emergency request and mark it fulfilled once
+    ``units_needed`` is met. Returns True if this call fulfilled the request.
+    """
+    now = timezone.now()
+    requests = EmergencyRequest.objects.filter(pk=emergency_request_id)
+    with transaction.atomic():
+        requests.update(units_received=F('units_received') + 1, updated_at=now)
+        fulfilled = requests.filter(
+            status='active', units_received__gte=F('units_needed')
+        ).update(status='fulfilled', fulfilled_at=now, updated_at=now)
+    return bool(fulfilled)
+
+
+def release_emergency_unit(emergency_request_id):
+    """
+    Take back a unit when a completed response is cancelled or deleted. A
+    request that was already fulfilled stays fulfilled.
+    """
+    EmergencyRequest.objects.filter(pk=emergency_request_id, units_received__gt=0).update(
+        units_received=F('units_received') - 1, updated_at=timezone.now()
+    )
+
+
+def refresh_eligibility():
+    """
+    Bring ``eligible_from`` in line with ``last_donation_date`` and the current
+    donation interval. A single UPDATE computes the date in the database and
+    writes only the rows whose value changes; returns the number of users updated.
+    """
+    target = Coalesce(
+        Cast(F('last_donation_date') + donation_interval(), output_field=DateField()),
+        Value(eligible_from(None)),
+    )
+    return CustomUser.objects.order_by().alias(target=target).exclude(
+        eligible_from=F('target')
+    ).update(eligible_from=F('target'))
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(queryset.values(field).annotate(total=Count('pk')).values('total'), output_field=IntegerField()),
+        0,
+    )
+
+
+def reconcile():
+    """Recompute all counters from the source tables; returns the number of rows written."""
+    donations = Donation.objects.filter(user=OuterRef('pk')).order_by()
+    completed_donations = donations.filter(status='completed')
+    completed = EmergencyResponse.objects.filter(
+        emergency_request=OuterRef('pk'), status='completed'
+    ).order_by()
+
+    with transaction.atomic():
+        users = CustomUser.objects.update(
+            donation_count=_count(donations, 'user'),
+            last_donation_date=Subquery(completed_donations.values('user').annotate(last=Max('date')).values('last')),
+        )
+        refresh_eligibility()
+        requests = EmergencyRequest.objects.update(units_received=_count(completed, 'emergency_request'))
+        now = timezone.now()
+        fulfilled = list(EmergencyRequest.objects.select_for_update().filter(
+            status='active', units_received__gte=F('units_needed')
+        ).only('pk', 'blood_type', 'city', 'created_at'))
+        for start in range(0, len(fulfilled), RECONCILE_BATCH_SIZE):
+            batch = fulfilled[start:start + RECONCILE_BATCH_SIZE]
+            EmergencyRequest.objects.filter(pk__in=[request.pk for request in batch]).update(
+                status='fulfilled', fulfilled_at=now, updated_at=now
+            )
+        for emergency_request in fulfilled:
+            emergency_request.fulfilled_at = now
+            rollups.add_request_fulfilled(emergency_request)
+    return {'users': users, 'emergency_requests': requests, 'fulfilled': len(fulfilled)}
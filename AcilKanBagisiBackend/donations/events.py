@@ -0,0 +1,148 @@
+"""Publish/subscribe fan-out for emergency request events.
+
+Saving an EmergencyRequest publishes an event once the transaction
+commits. Connected donors receive the events that match their city and
+blood type over a Server-Sent Events stream. The default broker fans
+events out inside the process. ``RedisBroker`` fans out across processes
+through any Redis-compatible server.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .matching import can_donate, normalize_city
+from .serializers import EmergencyRequestListSerializer
+
+
+class Subscription:
+    """One connected client: an event filter plus a bounded queue on its event loop."""
+
+    def __init__(self, broker, city=None, blood_type=None, max_queue=100):
+        self.broker = broker
+        self.city = normalize_city(city) if city else None
+        self.blood_type = blood_type
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def matches(self, event):
+        if self.city and normalize_city(event.get('city')) != self.city:
+            return False
+        if self.blood_type and event.get('blood_type'):
+            return can_donate(self.blood_type, event['blood_type'])
+        return True
+
+    def put(self, event):
+        """Queue an event, dropping the oldest one if the client has fallen behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def deliver(self, event):
+        """Thread-safe entry point used by brokers."""
+        if self.matches(event):
+            try:
+                self.loop.call_soon_threadsafe(self.put, event)
+            except RuntimeError:
+                # The client's event loop has already shut down.
+                self.close()
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Delivers events to subscribers connected to this process."""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, city=None, blood_type=None):
+        subscription = Subscription(self, city=city, blood_type=blood_type, max_queue=self.max_queue)
+        with self._lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes through a Redis channel and relays it to local subscribers.
+
+    Works with Redis or any server speaking its pub/sub protocol (e.g. a
+    local KeyDB/fakeredis stand-in). ``client`` may be passed in directly.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', channel='emergency-events', client=None, max_queue=100):
+        super().__init__(max_queue=max_queue)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self._listener = None
+
+    def subscribe(self, city=None, blood_type=None):
+        self._start_listener()
+        return super().subscribe(city=city, blood_type=blood_type)
+
+    def publish(self, event):
+        self.client.publish(self.channel, json.dumps(event, default=str))
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='emergency-events', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            if message.get('type') == 'message':
+                super().publish(json.loads(message['data']))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the broker configured by ``EMERGENCY_EVENT_BROKER``."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'EMERGENCY_EVENT_BROKER', {})
+                broker_class = import_string(config.get('BACKEND', 'donations.events.InProcessBroker'))
+                _broker = broker_class(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def emergency_event(emergency_request, created):
+    data = EmergencyRequestListSerializer(emergency_request).data
+    return {'event': 'created' if created else 'updated', 'request': data,
+            'city': emergency_request.city, 'blood_type': emergency_request.blood_type}
+
+
+def format_sse(event):
+    """Encode an event as a Server-Sent Events message."""
+    payload = json.dumps(event['request'], default=str, ensure_ascii=False)
+    return f"event: {event['event']}\nid: {event['request']['id']}\ndata: {payload}\n\n"
@@ -0,0 +1,75 @@
+"""Expire emergency requests whose ``expires_at`` has passed.
+
+``expire_requests`` moves every overdue active request to ``expired`` with
+a single UPDATE. The UPDATE is served by the ``(status, expires_at)``
+index. Run it from cron through the ``expire_emergency_requests``
+command, or set ``EMERGENCY_EXPIRY_SWEEP_INTERVAL`` to have each process
+sweep on a background thread.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import EmergencyRequest
+
+logger = logging.getLogger(__name__)
+
+
+def expire_requests(now=None):
+    """Mark overdue active requests as expired; returns the number of rows changed."""
+    now = now or timezone.now()
+    return EmergencyRequest.objects.filter(status='active', expires_at__lte=now).update(
+        status='expired', updated_at=now
+    )
+
+
+class ExpirySweeper:
+    """Daemon thread that calls ``expire_requests`` every ``interval`` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='emergency-expiry', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def sweep(self):
+        try:
+            expired = expire_requests()
+        except Exception:
+            logger.exception('Emergency request expiry sweep failed')
+            return 0
+        if expired:
+            logger.info('Expired %d emergency requests', expired)
+        return expired
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            close_old_connections()
+            self.sweep()
+            close_old_connections()
+
+
+sweeper = None
+
+
+def start_sweeper():
+    """Start the in-process sweeper if ``EMERGENCY_EXPIRY_SWEEP_INTERVAL`` is set."""
+    global sweeper
+    interval = getattr(settings, 'EMERGENCY_EXPIRY_SWEEP_INTERVAL', None)
+    if interval and sweeper is None:
+        sweeper = ExpirySweeper(interval)
+        sweeper.start()
+    return sweeper
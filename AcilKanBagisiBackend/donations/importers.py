@@ -0,0 +1,213 @@
+"""Streaming bulk import of donation center registries.
+
+Rows flow through a chain of generators: read, normalize and validate,
+geocode, and group into batches. Only one batch is held in memory at a
+time, whatever the file size. Each batch is upserted on ``registry_code``
+with a single ``INSERT ... ON CONFLICT DO UPDATE``.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .cache import donation_center_cache
+from .models import DonationCenter
+
+IMPORT_FIELDS = (
+    'registry_code', 'name', 'address', 'city', 'district', 'phone', 'email', 'website',
+    'working_hours', 'latitude', 'longitude', 'is_active',
+)
+UPDATE_FIELDS = [name for name in IMPORT_FIELDS if name != 'registry_code']
+
+# Common registry column names mapped to model fields
+ALIASES = {
+    'code': 'registry_code', 'id': 'registry_code',
+    'lat': 'latitude', 'lng': 'longitude', 'lon': 'longitude',
+    'telephone': 'phone', 'hours': 'working_hours', 'active': 'is_active',
+}
+
+
+@dataclass
+class ImportReport:
+    read: int = 0
+    imported: int = 0
+    geocoded: int = 0
+    invalid: int = 0
+    missing_coordinates: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def _iter_json_array(fp, chunk_size=65536):
+    """Yield the objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = fp.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Expected a JSON array of objects')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+        if not chunk:
+            return
+
+
+def read_rows(path, format=None):
+    """Yield raw row dicts from a CSV, JSON array or JSON Lines file."""
+    path = Path(path)
+    format = format or path.suffix.lstrip('.').lower()
+    with path.open(encoding='utf-8-sig', newline='') as fp:
+        if format == 'csv':
+            yield from csv.DictReader(fp)
+        elif format in ('jsonl', 'ndjson'):
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+        elif format == 'json':
+            yield from _iter_json_array(fp)
+        else:
+            raise ValueError(f'Unsupported import format: {format}')
+
+
+_model_fields = {name: DonationCenter._meta.get_field(name) for name in IMPORT_FIELDS}
+
+
+def normalize(row):
+    """Map registry columns onto model fields and validate them; raises ValidationError."""
+    if not isinstance(row, dict):
+        # A JSON item that is a list, string or number rather than an object
+        raise ValidationError({NON_FIELD_ERRORS: ['Expected an object.']})
+    values = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        name = key.strip().lower().replace(' ', '_')
+        name = ALIASES.get(name, name)
+        if name in _model_fields:
+            values[name] = value.strip() if isinstance(value, str) else value
+
+    cleaned = {}
+    for name, model_field in _model_fields.items():
+        value = values.get(name)
+        if value in (None, ''):
+            if name == 'is_active':
+                cleaned[name] = True
+                continue
+            value = None
+        if name == 'is_active' and isinstance(value, str):
+            value = value.lower() not in ('0', 'false', 'no', 'hayir', 'hayır', 'pasif')
+        try:
+            cleaned[name] = model_field.clean(value, None)
+        except ValidationError as exc:
+            raise ValidationError({name: exc.messages})
+
+    if not cleaned['registry_code']:
+        raise ValidationError({'registry_code': ['This field is required.']})
+    if cleaned['latitude'] is not None and not -90 <= cleaned['latitude'] <= 90:
+        raise ValidationError({'latitude': ['Out of range.']})
+    if cleaned['longitude'] is not None and not -180 <= cleaned['longitude'] <= 180:
+        raise ValidationError({'longitude': ['Out of range.']})
+    return cleaned
+
+
+def get_geocoder():
+    """
+    Return the callable named by ``DONATION_CENTER_GEOCODER``, or None.
+
+    It is called as ``geocoder(address, district, city)`` and returns
+    ``(latitude, longitude)`` or None. Results are memoized per address.
+    """
+    path = getattr(settings, 'DONATION_CENTER_GEOCODER', None)
+    if not path:
+        return None
+    return lru_cache(maxsize=10000)(import_string(path))
+
+
+def validated(rows, report, geocoder=None):
+    """Yield cleaned rows, counting and skipping the invalid ones."""
+    for number, row in enumerate(rows, start=1):
+        report.read += 1
+        try:
+            values = normalize(row)
+        except ValidationError as exc:
+            report.invalid += 1
+            if len(report.errors) < 100:
+                report.errors.append((number, exc.message_dict))
+            continue
+
+        if values['latitude'] is None or values['longitude'] is None:
+            location = geocoder(values['address'], values['district'], values['city']) if geocoder else None
+            if location is None:
+                report.missing_coordinates += 1
+                continue
+            values['latitude'], values['longitude'] = location
+            report.geocoded += 1
+        yield values
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert(batch):
+    """Insert or update one batch of cleaned rows keyed on ``registry_code``."""
+    # A registry may list a center twice; the last occurrence wins within a batch.
+    unique = {values['registry_code']: values for values in batch}
+    DonationCenter.objects.bulk_create(
+        [DonationCenter(**values) for values in unique.values()],
+        update_conflicts=True,
+        unique_fields=['registry_code'],
+        update_fields=UPDATE_FIELDS,
+    )
+    return len(unique)
+
+
+def import_centers(path, format=None, batch_size=1000, geocode=True, dry_run=False):
+    """Run the import pipeline over ``path`` and return an ImportReport."""
+    report = ImportReport()
+    started = time.perf_counter()
+    rows = validated(read_rows(path, format), report, get_geocoder() if geocode else None)
+    for batch in batched(rows, batch_size):
+        if dry_run:
+            report.imported += len(batch)
+            continue
+        with transaction.atomic():
+            report.imported += upsert(batch)
+    report.elapsed = time.perf_counter() - started
+
+    if report.imported and not dry_run:
+        # bulk_create sends no post_save signals
+        donation_center_cache.invalidate()
+    return report
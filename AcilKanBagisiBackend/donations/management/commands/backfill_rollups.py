@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from donations.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and weekly supply rollups from donations and emergency requests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild weeks from this YYYY-MM-DD date on.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError('--since must be a YYYY-MM-DD date.')
+        written = backfill(since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup rows.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from donations.expiry import expire_requests
+
+
+class Command(BaseCommand):
+    help = 'Mark active emergency requests whose expiry time has passed as expired.'
+
+    def handle(self, *args, **options):
+        expired = expire_requests()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} emergency requests.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from donations.importers import import_centers
+
+
+class Command(BaseCommand):
+    help = 'Import or update donation centers from a CSV, JSON or JSON Lines registry file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Registry file to import.')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl', 'ndjson'],
+                            help='File format; defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per upsert statement.')
+        parser.add_argument('--no-geocode', action='store_true',
+                            help='Skip rows without coordinates instead of geocoding them.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        try:
+            report = import_centers(
+                options['path'],
+                format=options['format'],
+                batch_size=options['batch_size'],
+                geocode=not options['no_geocode'],
+                dry_run=options['dry_run'],
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for number, errors in report.errors:
+            self.stderr.write(f'Row {number}: {errors}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {report.read} rows in {report.elapsed:.2f}s ({report.rate:.0f} rows/s): '
+            f'{report.imported} imported, {report.geocoded} geocoded, '
+            f'{report.invalid} invalid, {report.missing_coordinates} skipped without coordinates.'
+        ))
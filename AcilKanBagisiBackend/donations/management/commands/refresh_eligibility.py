@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from donations.counters import refresh_eligibility
+
+
+class Command(BaseCommand):
+    help = 'Recompute donor eligible_from dates, e.g. nightly or after DONATION_MIN_INTERVAL_DAYS changes.'
+
+    def handle(self, *args, **options):
+        # Running workers match from their own in-memory donor index, which
+        # derives eligibility from last_donation_date and their settings;
+        # this only updates the indexed column the database queries use.
+        updated = refresh_eligibility()
+        self.stdout.write(self.style.SUCCESS(f'Updated eligibility for {updated} users.'))
@@ -0,0 +1,399 @@
+"""Donor matching for emergency requests.
+
+Donors are kept in an in-memory index bucketed by ``(blood_type, city)``.
+A match only reads the buckets whose blood type is compatible with the
+request, so the cost depends on the compatible donors in one city rather
+than on the size of the user table.
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils import timezone
+
+from api.distance import EARTH_RADIUS_KM, KM_PER_DEGREE, haversine
+from users.models import donation_interval, eligible_from, normalize_city  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+BLOOD_TYPES = ('O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+')
+
+# Antigen bits carried by each blood type.
+ANTIGEN_A, ANTIGEN_B, ANTIGEN_RH = 1, 2, 4
+ANTIGENS = {
+    'O-': 0,
+    'O+': ANTIGEN_RH,
+    'A-': ANTIGEN_A,
+    'A+': ANTIGEN_A | ANTIGEN_RH,
+    'B-': ANTIGEN_B,
+    'B+': ANTIGEN_B | ANTIGEN_RH,
+    'AB-': ANTIGEN_A | ANTIGEN_B,
+    'AB+': ANTIGEN_A | ANTIGEN_B | ANTIGEN_RH,
+}
+BLOOD_TYPE_BITS = {blood_type: 1 << position for position, blood_type in enumerate(BLOOD_TYPES)}
+
+
+def can_donate(donor_type, recipient_type):
+    """A donor is compatible when it carries no antigen the recipient lacks."""
+    return ANTIGENS[donor_type] & ~ANTIGENS[recipient_type] == 0
+
+
+# Bitmask of donor blood types each recipient type can receive from.
+COMPATIBLE_DONORS = {
+    recipient: sum(BLOOD_TYPE_BITS[donor] for donor in BLOOD_TYPES if can_donate(donor, recipient))
+    for recipient in BLOOD_TYPES
+}
+# Bitmask of recipient blood types each donor type can give to.
+COMPATIBLE_RECIPIENTS = {
+    donor: sum(BLOOD_TYPE_BITS[recipient] for recipient in BLOOD_TYPES if can_donate(donor, recipient))
+    for donor in BLOOD_TYPES
+}
+
+
+def compatible_donor_types(recipient_type):
+    mask = COMPATIBLE_DONORS[recipient_type]
+    return [blood_type for blood_type in BLOOD_TYPES if mask & BLOOD_TYPE_BITS[blood_type]]
+
+
+def compatibility_rank(donor_type, recipient_type):
+    """0 for an identical antigen profile; higher values use scarcer universal blood."""
+    return bin(ANTIGENS[recipient_type] & ~ANTIGENS[donor_type]).count('1')
+
+
+@dataclass(frozen=True)
+class DonorMatch:
+    donor_id: int
+    blood_type: str
+    compatibility_rank: int
+    distance: float = None
+
+
+class _Bucket:
+    """Donors sharing a blood type and city, with lazily built column arrays."""
+
+    def __init__(self):
+        self.members = {}
+        self._arrays = None
+
+    def put(self, donor_id, latitude, longitude, eligible_ordinal):
+        self.members[donor_id] = (
+            np.nan if latitude is None else float(latitude),
+            np.nan if longitude is None else float(longitude),
+            eligible_ordinal,
+        )
+        self._arrays = None
+
+    def discard(self, donor_id):
+        if self.members.pop(donor_id, None) is not None:
+            self._arrays = None
+
+    def arrays(self):
+        arrays = self._arrays
+        if arrays is None:
+            ids = np.fromiter(self.members.keys(), dtype=np.int64, count=len(self.members))
+            values = np.array(list(self.members.values()), dtype=np.float64).reshape(-1, 3)
+            arrays = self._arrays = (ids, values[:, 0], values[:, 1], values[:, 2].astype(np.int64))
+        return arrays
+
+
+class DonorIndex:
+    """In-memory donor index keyed by blood type and normalized city."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.locations = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.locations)
+
+    def clear(self):
+        with self._lock:
+            self.buckets = {}
+            self.locations = {}
+
+    def add(self, donor_id, blood_type, city, latitude, longitude, last_donation_date):
+        with self._lock:
+            self.remove(donor_id)
+            if blood_type not in ANTIGENS:
+                return
+            key = (blood_type, normalize_city(city))
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = _Bucket()
+            bucket.put(donor_id, latitude, longitude, eligible_from(last_donation_date).toordinal())
+            self.locations[donor_id] = key
+
+    def remove(self, donor_id):
+        with self._lock:
+            key = self.locations.pop(donor_id, None)
+            if key is not None:
+                self.buckets[key].discard(donor_id)
+
+    def update_user(self, user):
+        """Add, move or drop a user depending on whether they can currently donate."""
+        if user.is_donor and user.is_active:
+            self.add(user.pk, user.blood_type, user.city, user.latitude, user.longitude, user.last_donation_date)
+        else:
+            self.remove(user.pk)
+
+    def match(self, blood_type, city, origin=None, radius_km=None, on=None, limit=50):
+        """
+        Rank eligible donors for a recipient blood type in a city.
+
+        Donors are ordered by compatibility rank first and distance from
+        ``origin`` (a ``(latitude, longitude)`` pair) second. When ``radius_km``
+        is given, donors without coordinates or outside the radius are skipped.
+        """
+        today = (on or timezone.localdate()).toordinal()
+        city_key = normalize_city(city)
+        ids, types, ranks, distances = [], [], [], []
+
+        with self._lock:
+            buckets = [
+                (donor_type, self.buckets.get((donor_type, city_key)))
+                for donor_type in compatible_donor_types(blood_type)
+            ]
+            arrays = [(donor_type, bucket.arrays()) for donor_type, bucket in buckets if bucket]
+
+        for donor_type, (bucket_ids, lats, lons, eligible) in arrays:
+            mask = eligible <= today
+            if origin is not None:
+                bucket_distances = haversine(origin[0], origin[1], lats, lons)
+                if radius_km is not None:
+                    mask &= bucket_distances <= radius_km
+                bucket_distances = bucket_distances[mask]
+            else:
+                bucket_distances = np.full(int(mask.sum()), np.nan)
+            ids.append(bucket_ids[mask])
+            distances.append(bucket_distances)
+            ranks.append(np.full(bucket_distances.shape[0], compatibility_rank(donor_type, blood_type)))
+            types.append(np.full(bucket_distances.shape[0], BLOOD_TYPES.index(donor_type)))
+
+        if not ids:
+            return []
+        ids, types = np.concatenate(ids), np.concatenate(types)
+        ranks, distances = np.concatenate(ranks), np.concatenate(distances)
+
+        # Rank dominates; unknown distances sort last within their rank.
+        keys = ranks * 1e6 + np.nan_to_num(distances, nan=1e6 - 1)
+        if limit is not None and limit < keys.shape[0]:
+            top = np.argpartition(keys, limit)[:limit]
+            ids, types, ranks, distances, keys = ids[top], types[top], ranks[top], distances[top], keys[top]
+        order = np.argsort(keys, kind='stable')
+
+        return [
+            DonorMatch(
+                donor_id=int(ids[i]),
+                blood_type=BLOOD_TYPES[types[i]],
+                compatibility_rank=int(ranks[i]),
+                distance=None if np.isnan(distances[i]) else float(distances[i]),
+            )
+            for i in order
+        ]
+
+
+class DonorIndexLoader:
+    """
+    Process-wide donor index, loaded from the database in the background.
+
+    Signal handlers keep it current for saves made in this process; a full
+    reload every ``DONOR_INDEX_MAX_AGE`` seconds picks up changes made by
+    other workers. Reloads run on a daemon thread and the finished index is
+    swapped in whole, so requests keep reading the previous index meanwhile.
+    """
+
+    def __init__(self):
+        self.index = DonorIndex()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._building = 0
+        # Donors changed while a load is running; re-read after the swap.
+        self._pending = set()
+        self._generation = 0
+
+    @property
+    def ready(self):
+        return self._loaded_at is not None
+
+    def load(self):
+        """Build a fresh index and swap it in; runs on the calling thread."""
+        from users.models import CustomUser
+
+        with self._lock:
+            generation = self._generation
+            self._building += 1
+        try:
+            index = DonorIndex()
+            rows = CustomUser.objects.filter(is_donor=True, is_active=True).values_list(
+                'pk', 'blood_type', 'city', 'latitude', 'longitude', 'last_donation_date'
+            )
+            for row in rows.iterator(chunk_size=5000):
+                index.add(*row)
+        finally:
+            with self._lock:
+                self._building -= 1
+        with self._lock:
+            if generation != self._generation:
+                return self.index
+            self.index = index
+            self._loaded_at = time.monotonic()
+            pending = self._pending
+            if not self._building:
+                self._pending = set()
+        for user_id in pending:
+            self.reload_user(user_id)
+        return index
+
+    def refresh(self):
+        """Start a background load unless one is already running."""
+        with self._lock:
+            if self._loading is None:
+                self._loading = threading.Thread(target=self._load_in_background, name='donor-index', daemon=True)
+                self._loading.start()
+            return self._loading
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception('Loading the donor index failed')
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._loading = None
+
+    def get(self, wait=False):
+        """
+        The current index, or ``None`` while the first load is still running.
+
+        A stale index is returned as is and refreshed in the background.
+        ``wait=True`` blocks until a load has finished instead, for callers
+        that are already off the request path.
+        """
+        max_age = getattr(settings, 'DONOR_INDEX_MAX_AGE', 600)
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > max_age:
+            loading = self.refresh()
+            if loaded_at is None:
+                if not wait:
+                    return None
+                loading.join()
+                if not self.ready:
+                    return self.load()
+        return self.index
+
+    def reset(self):
+        with self._lock:
+            self.index = DonorIndex()
+            self._loaded_at = None
+            self._pending = set()
+            self._generation += 1
+
+    def _track(self, user_id):
+        """Remember a change made during a load; returns whether the live index should apply it."""
+        with self._lock:
+            if self._building:
+                self._pending.add(user_id)
+            return self._loaded_at is not None
+
+    def update_user(self, user):
+        if self._track(user.pk):
+            self.index.update_user(user)
+
+    def remove_user(self, user_id):
+        if self._track(user_id):
+            self.index.remove(user_id)
+
+    def reload_user(self, user_id):
+        """Re-read one donor after an in-database update bypassed ``save()``."""
+        from users.models import CustomUser
+
+        if self._track(user_id):
+            user = CustomUser.objects.filter(pk=user_id).first()
+            if user is None:
+                self.index.remove(user_id)
+            else:
+                self.index.update_user(user)
+
+
+donor_index = DonorIndexLoader()
+
+
+def match_donors(emergency_request, origin=None, radius_km=None, limit=50):
+    """
+    Rank donors for an emergency request; defaults the origin to the requester's location.
+
+    Until the in-memory index has finished loading, the compatible donors of
+    the request's city are read with ``eligible_donors`` and ranked the same way.
+    """
+    if origin is None:
+        requester = emergency_request.requester
+        if requester.latitude is not None and requester.longitude is not None:
+            origin = (requester.latitude, requester.longitude)
+    radius_km = radius_km if origin is not None else None
+    index = donor_index.get()
+    if index is None:
+        index = DonorIndex()
+        rows = eligible_donors(
+            emergency_request.blood_type, emergency_request.city, origin=origin, radius_km=radius_km
+        ).values_list('pk', 'blood_type', 'city', 'latitude', 'longitude', 'last_donation_date')
+        for row in rows:
+            index.add(*row)
+    matches = index.match(
+        emergency_request.blood_type,
+        emergency_request.city,
+        origin=origin,
+        radius_km=radius_km,
+        limit=None if limit is None else limit + 1,
+    )
+    matches = [match for match in matches if match.donor_id != emergency_request.requester_id]
+    return matches if limit is None else matches[:limit]
+
+
+def haversine_expression(origin, latitude='latitude', longitude='longitude'):
+    """Great-circle distance in km from ``origin`` to a row's coordinates, as a database expression."""
+    origin_lat, origin_lon = (math.radians(value) for value in origin)
+    lat = Radians(F(latitude))
+    half_dlat = Sin((lat - Value(origin_lat)) / 2)
+    half_dlon = Sin((Radians(F(longitude)) - Value(origin_lon)) / 2)
+    a = Power(half_dlat, 2) + Value(math.cos(origin_lat)) * Cos(lat) * Power(half_dlon, 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def eligible_donors(blood_type, city=None, origin=None, radius_km=None, on=None):
+    """
+    Donors who may give to ``blood_type`` today (or ``on``), as a queryset.
+
+    The filter is a range scan of the partial ``(blood_type, city_key,
+    eligible_from)`` index, so 'İstanbul' and 'istanbul' find the same donors.
+    With ``origin`` and ``radius_km`` a bounding box on the coordinates and
+    the exact haversine distance are added to the same query.
+    """
+    from users.models import CustomUser
+
+    queryset = CustomUser.objects.filter(
+        is_donor=True,
+        is_active=True,
+        blood_type__in=compatible_donor_types(blood_type),
+        eligible_from__lte=on or timezone.localdate(),
+    )
+    if city:
+        queryset = queryset.filter(city_key=normalize_city(city))
+    if origin is not None and radius_km is not None:
+        lat_span = radius_km / KM_PER_DEGREE
+        queryset = queryset.filter(latitude__range=(origin[0] - lat_span, origin[0] + lat_span))
+        cos_lat = math.cos(math.radians(min(abs(origin[0]) + lat_span, 90.0)))
+        lon_span = radius_km / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-9 else 180.0
+        if lon_span < 180.0 and abs(origin[1]) + lon_span <= 180.0:
+            queryset = queryset.filter(longitude__range=(origin[1] - lon_span, origin[1] + lon_span))
+        queryset = queryset.alias(distance_km=haversine_expression(origin)).filter(distance_km__lte=radius_km)
+    return queryset
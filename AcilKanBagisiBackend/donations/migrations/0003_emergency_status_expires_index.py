@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emergencyrequest',
+            index=models.Index(fields=['status', 'expires_at'], name='emergency_status_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0003_emergency_status_expires_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['user', '-date'], name='donation_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donationcenter',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name', 'city'], name='center_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergencyrequest',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-urgency_level', '-created_at', 'id'], name='emergency_active_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergencyresponse',
+            index=models.Index(fields=['donor', 'emergency_request'], name='response_donor_request_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergencyresponse',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['emergency_request'], name='response_completed_idx'),
+        ),
+    ]
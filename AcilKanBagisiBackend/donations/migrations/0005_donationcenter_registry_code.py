@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_index_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donationcenter',
+            name='registry_code',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='registry code'),
+        ),
+    ]
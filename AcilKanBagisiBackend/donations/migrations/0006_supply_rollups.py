@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0005_donationcenter_registry_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencyrequest',
+            name='fulfilled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='fulfilled at'),
+        ),
+        migrations.CreateModel(
+            name='SupplyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4, verbose_name='period')),
+                ('period_start', models.DateField(verbose_name='period start')),
+                ('blood_type', models.CharField(choices=[('A+', 'A Positive'), ('A-', 'A Negative'), ('B+', 'B Positive'), ('B-', 'B Negative'), ('AB+', 'AB Positive'), ('AB-', 'AB Negative'), ('O+', 'O Positive'), ('O-', 'O Negative')], max_length=3, verbose_name='blood type')),
+                ('city', models.CharField(max_length=100, verbose_name='city')),
+                ('donations', models.IntegerField(default=0, verbose_name='donations')),
+                ('units_donated_ml', models.IntegerField(default=0, verbose_name='units donated in ml')),
+                ('requests_opened', models.IntegerField(default=0, verbose_name='requests opened')),
+                ('requests_fulfilled', models.IntegerField(default=0, verbose_name='requests fulfilled')),
+                ('fulfillment_minutes', models.JSONField(default=list, verbose_name='fulfillment minutes')),
+            ],
+            options={
+                'verbose_name': 'supply rollup',
+                'verbose_name_plural': 'supply rollups',
+                'ordering': ['period', 'period_start', 'blood_type', 'city'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'blood_type', 'city'), name='supply_rollup_key')],
+            },
+        ),
+    ]
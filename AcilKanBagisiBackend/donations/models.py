@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 from users.models import CustomUser
 
 class DonationCenter(models.Model):
+    registry_code = models.CharField(_('registry code'), max_length=50, unique=True, blank=True, null=True)
     name = models.CharField(_('name'), max_length=100)
     address = models.CharField(_('address'), max_length=255)
     city = models.CharField(_('city'), max_length=100)
@@ -19,6 +20,9 @@ class DonationCenter(models.Model):
         verbose_name = _('donation center')
         verbose_name_plural = _('donation centers')
         ordering = ['name', 'city']
+        indexes = [
+            models.Index(fields=['name', 'city'], condition=models.Q(is_active=True), name='center_active_name_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}"
@@ -44,6 +48,9 @@ class Donation(models.Model):
         verbose_name = _('donation')
         verbose_name_plural = _('donations')
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', '-date'], name='donation_user_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.full_name} - {self.date}"
@@ -84,6 +91,7 @@ class EmergencyRequest(models.Model):
     additional_info = models.TextField(_('additional information'), blank=True, null=True)
     expires_at = models.DateTimeField(_('expires at'))
     status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='active')
+    fulfilled_at = models.DateTimeField(_('fulfilled at'), blank=True, null=True)
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
@@ -91,6 +99,13 @@ class EmergencyRequest(models.Model):
         verbose_name = _('emergency request')
         verbose_name_plural = _('emergency requests')
         ordering = ['-urgency_level', '-created_at']
+        indexes = [
+            # Active feed and the expiry sweep both filter on status and expires_at
+            models.Index(fields=['status', 'expires_at'], name='emergency_status_expires_idx'),
+            # Feed ordering, limited to the active rows the feed can return
+            models.Index(fields=['-urgency_level', '-created_at', 'id'], condition=models.Q(status='active'),
+                         name='emergency_active_feed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient_name} - {self.blood_type} - {self.hospital}"
@@ -115,6 +130,41 @@ class EmergencyResponse(models.Model):
         verbose_name = _('emergency response')
         verbose_name_plural = _('emergency responses')
         ordering = ['-response_time']
+        indexes = [
+            models.Index(fields=['donor', 'emergency_request'], name='response_donor_request_idx'),
+            models.Index(fields=['emergency_request'], condition=models.Q(status='completed'),
+                         name='response_completed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.donor.full_name} - {self.emergency_request.patient_name}"
+
+class SupplyRollup(models.Model):
+    """Daily or weekly donation and emergency request totals per blood type and city."""
+    
+    PERIOD_CHOICES = [
+        ('day', _('Day')),
+        ('week', _('Week')),
+    ]
+    
+    period = models.CharField(_('period'), max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateField(_('period start'))
+    blood_type = models.CharField(_('blood type'), max_length=3, choices=EmergencyRequest.BLOOD_TYPE_CHOICES)
+    city = models.CharField(_('city'), max_length=100)
+    donations = models.IntegerField(_('donations'), default=0)
+    units_donated_ml = models.IntegerField(_('units donated in ml'), default=0)
+    requests_opened = models.IntegerField(_('requests opened'), default=0)
+    requests_fulfilled = models.IntegerField(_('requests fulfilled'), default=0)
+    # Sorted minutes from creation to fulfilment of each request fulfilled in the period
+    fulfillment_minutes = models.JSONField(_('fulfillment minutes'), default=list)
+    
+    class Meta:
+        verbose_name = _('supply rollup')
+        verbose_name_plural = _('supply rollups')
+        ordering = ['period', 'period_start', 'blood_type', 'city']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'blood_type', 'city'], name='supply_rollup_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.period} {self.period_start} - {self.blood_type} - {self.city}"
@@ -0,0 +1,316 @@
+"""Emergency alert fan-out to compatible donors.
+
+When a new EmergencyRequest commits, ``notify`` hands it to a background
+coordinator, so the request that created it never waits. The coordinator
+resolves recipients from the in-memory donor index and drops donors who
+were already alerted for the request; a failed batch is released again. The rest are split into batches for
+a worker pool. Each worker loads contact details for its batch, waits on a
+shared token bucket, and hands the batch to the configured transport.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .matching import donor_index
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Notification:
+    donor_id: int
+    email: str
+    phone_number: str
+    title: str
+    body: str
+    data: dict = field(default_factory=dict)
+
+
+class LocMemTransport:
+    """Keeps sent notifications in ``outbox``; for development and tests."""
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, notifications):
+        with self._lock:
+            self.outbox.extend(notifications)
+        return len(notifications)
+
+
+class EmailTransport:
+    """Sends each batch over one connection of the configured Django email backend."""
+
+    def __init__(self, from_email=None):
+        self.from_email = from_email
+
+    def send(self, notifications):
+        messages = [
+            EmailMessage(notification.title, notification.body, self.from_email, [notification.email])
+            for notification in notifications if notification.email
+        ]
+        return get_connection().send_messages(messages) or 0
+
+
+class WebhookTransport:
+    """POSTs each batch as a JSON array to a push or SMS gateway."""
+
+    def __init__(self, url, timeout=10, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def send(self, notifications):
+        payload = json.dumps([asdict(notification) for notification in notifications], default=str)
+        request = urllib.request.Request(self.url, data=payload.encode('utf-8'), headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+        return len(notifications)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    ``acquire`` takes its tokens at once and sleeps off any deficit, so a
+    batch larger than the bucket is still paced at ``rate``.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take ``tokens``; returns the seconds spent waiting."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay:
+            self.sleep(delay)
+        return delay
+
+
+class Deduplicator:
+    """
+    Remembers which donors were alerted for a request, in a Django cache.
+
+    Each request gets one entry holding the set of claimed donor ids, so a
+    batch is claimed in a few round trips however many donors it has. A
+    short ``cache.add`` lock around the read-modify-write keeps two
+    processes fanning out the same request from claiming the same donors;
+    the cache must be shared by all of them (see ``donations.E002``).
+    Donors whose batch fails are released so a later fan-out retries them.
+    """
+
+    def __init__(self, alias='default', timeout=24 * 3600, prefix='emergency-alerted',
+                 lock_timeout=30, sleep=time.sleep):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.sleep = sleep
+
+    def _update(self, request_id, change):
+        """Apply ``change`` to the request's claimed set under its cache lock; returns its result."""
+        cache = caches[self.alias]
+        key = f'{self.prefix}:{request_id}'
+        lock = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not cache.add(lock, True, timeout=self.lock_timeout):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Could not lock {key}')
+            self.sleep(0.01)
+        try:
+            claimed = cache.get(key) or set()
+            result, claimed = change(claimed)
+            cache.set(key, claimed, timeout=self.timeout)
+            return result
+        finally:
+            cache.delete(lock)
+
+    def claim(self, request_id, donor_ids):
+        """Return the donors not yet alerted for ``request_id``, reserving them for this caller."""
+        def change(claimed):
+            fresh = [donor_id for donor_id in dict.fromkeys(donor_ids) if donor_id not in claimed]
+            return fresh, claimed.union(fresh)
+
+        return self._update(request_id, change)
+
+    def release(self, request_id, donor_ids):
+        """Forget donors whose alert was not sent, so they can be claimed again."""
+        self._update(request_id, lambda claimed: (None, claimed.difference(donor_ids)))
+
+
+class DispatchMetrics:
+    """Delivery counters for the dispatcher."""
+
+    FIELDS = ('fanouts', 'batches', 'sent', 'failed', 'deduplicated', 'throttled_seconds', 'last_fanout_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self._values[name] += value
+
+    def set(self, **values):
+        with self._lock:
+            self._values.update(values)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+def emergency_payload(emergency_request):
+    return {
+        'id': emergency_request.pk,
+        'requester_id': emergency_request.requester_id,
+        'blood_type': emergency_request.blood_type,
+        'city': emergency_request.city,
+        'hospital': emergency_request.hospital,
+        'urgency_level': emergency_request.urgency_level,
+    }
+
+
+def build_notification(emergency, donor_id, email, phone_number):
+    return Notification(
+        donor_id=donor_id,
+        email=email,
+        phone_number=phone_number,
+        title=f"Acil {emergency['blood_type']} kan ihtiyacı",
+        body=f"{emergency['hospital']} ({emergency['city']}) için {emergency['blood_type']} kan bağışçısı aranıyor.",
+        data={'emergency_request': emergency['id']},
+    )
+
+
+def _batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class NotificationDispatcher:
+    """Resolves, deduplicates, throttles and sends emergency alerts in the background."""
+
+    def __init__(self, transport, batch_size=500, workers=4, rate=None, burst=None, dedup=None):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.dedup = dedup or Deduplicator()
+        self.metrics = DispatchMetrics()
+        # Fan-out jobs wait on their batches, so they get their own thread.
+        self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notify-fanout')
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='notify')
+
+    def notify(self, emergency_request):
+        """Queue alerts for a new emergency request; returns a Future of the fan-out."""
+        # Run in a copy of the caller's context so logs keep the request id
+        return self._coordinator.submit(contextvars.copy_context().run, self.fan_out, emergency_payload(emergency_request))
+
+    def recipients(self, emergency):
+        matches = donor_index.get(wait=True).match(emergency['blood_type'], emergency['city'], limit=None)
+        return [match.donor_id for match in matches if match.donor_id != emergency['requester_id']]
+
+    def fan_out(self, emergency):
+        started = time.perf_counter()
+        try:
+            recipients = self.recipients(emergency)
+            fresh = self.dedup.claim(emergency['id'], recipients)
+            self.metrics.add(deduplicated=len(recipients) - len(fresh))
+            futures = [
+                self._workers.submit(contextvars.copy_context().run, self.send_batch, emergency, batch)
+                for batch in _batched(fresh, self.batch_size)
+            ]
+            wait(futures)
+            return sum(future.result() for future in futures)
+        except Exception:
+            logger.exception('Emergency alert fan-out failed for request %s', emergency['id'])
+            return 0
+        finally:
+            close_old_connections()
+            self.metrics.add(fanouts=1)
+            self.metrics.set(last_fanout_seconds=time.perf_counter() - started)
+
+    def send_batch(self, emergency, donor_ids):
+        from users.models import CustomUser
+
+        try:
+            rows = CustomUser.objects.filter(pk__in=donor_ids, is_active=True).values_list(
+                'pk', 'email', 'phone_number'
+            )
+            notifications = [build_notification(emergency, *row) for row in rows]
+            throttled = self.bucket.acquire(len(notifications)) if self.bucket else 0.0
+            sent = self.transport.send(notifications)
+        except Exception:
+            logger.exception('Sending %d emergency alerts failed', len(donor_ids))
+            self.dedup.release(emergency['id'], donor_ids)
+            self.metrics.add(batches=1, failed=len(donor_ids))
+            return 0
+        finally:
+            close_old_connections()
+        self.metrics.add(batches=1, sent=sent, failed=len(notifications) - sent, throttled_seconds=throttled)
+        return sent
+
+    def shutdown(self, wait=True):
+        self._coordinator.shutdown(wait=wait)
+        self._workers.shutdown(wait=wait)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the dispatcher configured by ``EMERGENCY_NOTIFICATIONS``."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                config = getattr(settings, 'EMERGENCY_NOTIFICATIONS', {})
+                transport_class = import_string(config.get('BACKEND', 'donations.notifications.LocMemTransport'))
+                _dispatcher = NotificationDispatcher(
+                    transport_class(**config.get('OPTIONS', {})),
+                    batch_size=config.get('BATCH_SIZE', 500),
+                    workers=config.get('WORKERS', 4),
+                    rate=config.get('RATE'),
+                    burst=config.get('BURST'),
+                    dedup=Deduplicator(**config.get('DEDUP', {})),
+                )
+    return _dispatcher
+
+
+def notifications_enabled():
+    return getattr(settings, 'EMERGENCY_NOTIFICATIONS', {}).get('ENABLED', False)
+
+
+def prometheus_lines():
+    """Dispatcher counters for the metrics endpoint."""
+    if _dispatcher is None:
+        return []
+    lines = []
+    for name, value in _dispatcher.metrics.snapshot().items():
+        kind = 'gauge' if name == 'last_fanout_seconds' else 'counter'
+        lines += [f'# TYPE acilkan_notifications_{name} {kind}', f'acilkan_notifications_{name} {value}']
+    return lines
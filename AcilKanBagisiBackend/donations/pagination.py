@@ -0,0 +1,162 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def positive_int(value, cutoff=None):
+    """Parse a strictly positive integer, capped at ``cutoff``; raises ValueError otherwise."""
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    return min(value, cutoff) if cutoff else value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on every ordering field.
+
+    The cursor holds the ordering values of the last row on the page, and the
+    next page is selected with a ``WHERE`` on those values instead of an
+    ``OFFSET``. No ``COUNT(*)`` is issued, so each page costs the same however
+    deep the client scrolls. The last ordering field must be unique.
+    """
+
+    ordering = ('-id',)
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return positive_int(request.query_params[self.page_size_query_param], cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, on the async ORM."""
+        return self.get_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """The page's rows plus one, to tell whether another page follows."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+        model = queryset.model
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        self.next_position = (
+            [getattr(page[-1], name) for name, _ in self.fields] if self.has_next else None
+        )
+        return page
+
+    def after(self, position):
+        """Rows strictly after ``position`` in the ordering."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, position):
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        encoded = base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+
+class EmergencyFeedPagination(KeysetPagination):
+    """Most urgent, newest emergency requests first."""
+
+    ordering = ('-urgency_level', '-created_at', 'id')
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """``PageNumberPagination`` whose count and page are read with the async ORM."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property; fill it without a sync query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        bottom = (number - 1) * page_size
+        rows = [row async for row in queryset[bottom:bottom + page_size]]
+        self.page = Page(rows, number, paginator)
+        return rows
@@ -0,0 +1,76 @@
+"""Derive select_related/prefetch_related calls from serializer nesting.
+
+Every relation a serializer reads, whether directly through a nested
+serializer or a dotted ``source``, becomes a join (single-valued
+relations) or a prefetch (multi-valued relations). Views then issue a
+fixed number of queries regardless of page size.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    """Return the model field for ``name`` if it is a relation, else None."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation and field.related_model is not None else None
+
+
+def _walk(serializer, model, prefix, many, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        current_model, path, path_many, relations = model, prefix, many, []
+        for attr in field.source_attrs:
+            relation = _relation(current_model, attr)
+            if relation is None:
+                break
+            relations.append(relation)
+            path = f'{path}__{attr}' if path else attr
+            path_many = path_many or relation.many_to_many or relation.one_to_many
+            current_model = relation.related_model
+        if not relations:
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        # The primary key of a local foreign key is read from its own column.
+        if (isinstance(nested, serializers.PrimaryKeyRelatedField) and len(relations) == 1
+                and relations[0].concrete and not relations[0].many_to_many):
+            continue
+
+        (prefetch if path_many else select).add(path)
+        if isinstance(nested, serializers.BaseSerializer):
+            _walk(nested, current_model, path, path_many, select, prefetch)
+
+
+@lru_cache(maxsize=None)
+def related_paths(serializer_class):
+    """Return ``(select_related, prefetch_related)`` paths for a model serializer class."""
+    serializer = serializer_class()
+    select, prefetch = set(), set()
+    _walk(serializer, serializer.Meta.model, '', False, select, prefetch)
+    # Only the deepest join of each chain needs to be named.
+    select = {path for path in select if not any(other.startswith(path + '__') for other in select)}
+    return tuple(sorted(select)), tuple(sorted(prefetch))
+
+
+def plan_queryset(queryset, serializer_class):
+    """Apply the joins and prefetches ``serializer_class`` needs to ``queryset``."""
+    select, prefetch = related_paths(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class PlannedQuerysetMixin:
+    """Generic view mixin that plans the queryset for the view's serializer."""
+
+    def filter_queryset(self, queryset):
+        return plan_queryset(super().filter_queryset(queryset), self.get_serializer_class())
@@ -0,0 +1,179 @@
+"""Daily and weekly supply rollups.
+
+Every completed donation, new emergency request and fulfilment updates one daily
+and one weekly ``SupplyRollup`` row for its blood type and city. Both rows
+are created or incremented by a single ``INSERT ... ON CONFLICT DO UPDATE``
+statement. The fulfilment times are kept as a sorted list so the median
+stays exact. Dashboards then read one row per period instead of
+aggregating the source tables. ``backfill`` rebuilds the rows from the
+source tables.
+"""
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import CustomUser
+from .matching import normalize_city
+from .models import Donation, DonationCenter, EmergencyRequest, SupplyRollup
+
+KEY = ('period', 'period_start', 'blood_type', 'city')
+COUNTERS = ('donations', 'units_donated_ml', 'requests_opened', 'requests_fulfilled')
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def periods(day):
+    return (('day', day), ('week', week_start(day)))
+
+
+def _local_date(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _upsert(day, blood_type, city, increments):
+    """Add ``increments`` to the day and week rows, creating them as needed, in one statement."""
+    connection = connections[router.db_for_write(SupplyRollup)]
+    quote = connection.ops.quote_name
+    opts = SupplyRollup._meta
+    minutes_field = opts.get_field('fulfillment_minutes')
+    key_columns = [quote(opts.get_field(name).column) for name in KEY]
+    counter_columns = [quote(opts.get_field(name).column) for name in COUNTERS]
+    columns = [*key_columns, *counter_columns, quote(minutes_field.column)]
+
+    params = []
+    for period, start in periods(day):
+        params += [period, opts.get_field('period_start').get_db_prep_save(start, connection), blood_type, city]
+        params += [increments.get(name, 0) for name in COUNTERS]
+        params.append(minutes_field.get_db_prep_save([], connection))
+    row = f"({', '.join(['%s'] * len(columns))})"
+    table = quote(opts.db_table)
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            f'{column} = {column} + VALUES({column})' for column in counter_columns
+        )
+    else:
+        conflict = f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET " + ', '.join(
+            f'{column} = {table}.{column} + EXCLUDED.{column}' for column in counter_columns
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {row}, {row} {conflict}", params)
+
+
+def _bump(day, blood_type, city, fulfillment_minutes=None, **increments):
+    city = normalize_city(city)
+    if fulfillment_minutes is None:
+        _upsert(day, blood_type, city, increments)
+        return
+    with transaction.atomic():
+        _upsert(day, blood_type, city, increments)
+        for period, start in periods(day):
+            rollup = SupplyRollup.objects.select_for_update().get(
+                period=period, period_start=start, blood_type=blood_type, city=city
+            )
+            bisect.insort(rollup.fulfillment_minutes, fulfillment_minutes)
+            rollup.save(update_fields=['fulfillment_minutes'])
+
+
+def _donation_key(donation):
+    """Blood type and center city of a donation; also works once its row is deleted."""
+    blood_type = CustomUser.objects.filter(pk=donation.user_id).values_list('blood_type', flat=True).first()
+    city = DonationCenter.objects.filter(pk=donation.donation_center_id).values_list('city', flat=True).first()
+    return blood_type, city
+
+
+def add_donation(donation):
+    """Add a completed donation to its day and week rollups."""
+    _bump(donation.date, *_donation_key(donation), donations=1, units_donated_ml=donation.quantity)
+
+
+def remove_donation(donation):
+    """Take a donation back out of its rollups when it is no longer completed or is deleted."""
+    blood_type, city = _donation_key(donation)
+    _bump(donation.date, blood_type, city, donations=-1, units_donated_ml=-donation.quantity)
+    # Rows left empty would not exist after a backfill
+    rows = Q()
+    for period, start in periods(donation.date):
+        rows |= Q(period=period, period_start=start)
+    SupplyRollup.objects.filter(
+        rows, blood_type=blood_type, city=normalize_city(city), **dict.fromkeys(COUNTERS, 0)
+    ).delete()
+
+
+def add_request_opened(emergency_request):
+    _bump(_local_date(emergency_request.created_at), emergency_request.blood_type, emergency_request.city,
+          requests_opened=1)
+
+
+def fulfillment_minutes(created_at, fulfilled_at):
+    return round((fulfilled_at - created_at).total_seconds() / 60, 1)
+
+
+def add_request_fulfilled(emergency_request):
+    fulfilled_at = emergency_request.fulfilled_at or timezone.now()
+    _bump(_local_date(fulfilled_at), emergency_request.blood_type, emergency_request.city,
+          fulfillment_minutes=fulfillment_minutes(emergency_request.created_at, fulfilled_at),
+          requests_fulfilled=1)
+
+
+def median_minutes(rollup):
+    return median(rollup.fulfillment_minutes) if rollup.fulfillment_minutes else None
+
+
+def backfill(since=None):
+    """Rebuild rollups from ``since`` (a date, default everything); returns the number of rows written."""
+    rows = defaultdict(lambda: dict.fromkeys(COUNTERS, 0) | {'fulfillment_minutes': []})
+
+    def add(day, blood_type, city, **values):
+        for period, start in periods(day):
+            row = rows[(period, start, blood_type, normalize_city(city))]
+            for name, value in values.items():
+                if name == 'fulfillment_minutes':
+                    row[name].append(value)
+                else:
+                    row[name] += value
+
+    # Rebuild whole weeks so the weekly rows stay complete
+    since = week_start(since) if since else None
+    donations = Donation.objects.filter(status='completed').order_by()
+    requests = EmergencyRequest.objects.order_by()
+    fulfilled = EmergencyRequest.objects.filter(status='fulfilled').annotate(
+        fulfilled=Coalesce('fulfilled_at', 'updated_at')
+    )
+    if since:
+        donations = donations.filter(date__gte=since)
+        requests = requests.filter(created_at__date__gte=since)
+        fulfilled = fulfilled.filter(fulfilled__date__gte=since)
+
+    for row in donations.values('date', 'user__blood_type', 'donation_center__city').annotate(
+        count=Count('pk'), quantity=Sum('quantity')
+    ):
+        add(row['date'], row['user__blood_type'], row['donation_center__city'],
+            donations=row['count'], units_donated_ml=row['quantity'])
+    for created_at, blood_type, city in requests.values_list('created_at', 'blood_type', 'city').iterator():
+        add(_local_date(created_at), blood_type, city, requests_opened=1)
+    for created_at, fulfilled_at, blood_type, city in fulfilled.values_list(
+        'created_at', 'fulfilled', 'blood_type', 'city'
+    ).iterator():
+        add(_local_date(fulfilled_at), blood_type, city, requests_fulfilled=1,
+            fulfillment_minutes=fulfillment_minutes(created_at, fulfilled_at))
+
+    objects = []
+    for (period, start, blood_type, city), values in rows.items():
+        values['fulfillment_minutes'].sort()
+        objects.append(SupplyRollup(period=period, period_start=start, blood_type=blood_type, city=city, **values))
+
+    with transaction.atomic():
+        stale = SupplyRollup.objects.all()
+        if since:
+            stale = stale.filter(period_start__gte=since)
+        stale.delete()
+        SupplyRollup.objects.bulk_create(objects, batch_size=1000)
+    return len(objects)
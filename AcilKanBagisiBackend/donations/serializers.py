@@ -1,5 +1,9 @@
-﻿from rest_framework import serializers
-from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse
+﻿from django.db import transaction
+from rest_framework import serializers
+from .counters import USER_COUNTER_FIELDS, record_donation
+from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse, SupplyRollup
+from .rollups import median_minutes
+from users.authentication import load_deferred
 from users.serializers import UserSerializer
 
 class DonationCenterSerializer(serializers.ModelSerializer):
@@ -21,19 +25,17 @@ class DonationSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'status', 'created_at', 'updated_at')
 
     def create(self, validated_data):
-        """Create a donation and update user's donation count and last donation date."""
+        """Create a donation and update user's donation count; eligibility moves once it is completed."""
         request = self.context.get("request")
         user = request.user
         
-        # Create donation
-        donation = Donation.objects.create(user=user, **validated_data)
-        
-        # Update user's donation count and last donation date
-        user.donation_count += 1
-        if not user.last_donation_date or donation.date > user.last_donation_date:
-            user.last_donation_date = donation.date
-        user.save()
+        with transaction.atomic():
+            donation = Donation.objects.create(user=user, **validated_data)
+            # Atomic in-database increment; concurrent donations cannot overwrite each other
+            record_donation(donation)
         
+        # One query, also for fields a claims-built request.user left deferred
+        user.refresh_from_db(fields={*USER_COUNTER_FIELDS, *user.get_deferred_fields()})
         return donation
 
 class EmergencyRequestSerializer(serializers.ModelSerializer):
@@ -44,14 +46,25 @@ class EmergencyRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = EmergencyRequest
         fields = '__all__'
-        read_only_fields = ('requester', 'status', 'units_received', 'created_at', 'updated_at')
+        read_only_fields = ('requester', 'status', 'units_received', 'fulfilled_at', 'created_at', 'updated_at')
 
     def create(self, validated_data):
         """Create an emergency request with the requester as the current user."""
         request = self.context.get("request")
-        validated_data['requester'] = request.user
+        # requester_detail serializes the whole user; read it in one query, not one per deferred field
+        validated_data['requester'] = load_deferred(request.user)
         return super().create(validated_data)
 
+class EmergencyRequestListSerializer(serializers.ModelSerializer):
+    """Compact EmergencyRequest representation for the feed, without nested users."""
+
+    class Meta:
+        model = EmergencyRequest
+        fields = ('id', 'requester', 'patient_name', 'blood_type', 'hospital', 'city', 'district',
+                  'units_needed', 'units_received', 'urgency_level', 'phone_number', 'expires_at',
+                  'status', 'created_at')
+        read_only_fields = fields
+
 class EmergencyResponseSerializer(serializers.ModelSerializer):
     """Serializer for EmergencyResponse model."""
 
@@ -66,7 +79,7 @@ class EmergencyResponseSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create an emergency response with the donor as the current user."""
         request = self.context.get("request")
-        validated_data['donor'] = request.user
+        validated_data['donor'] = load_deferred(request.user)
         
         # Check if user already responded to this emergency request
         emergency_request = validated_data.get('emergency_request')
@@ -74,3 +87,17 @@ class EmergencyResponseSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You have already responded to this emergency request.")
             
         return super().create(validated_data)
+
+class SupplyRollupSerializer(serializers.ModelSerializer):
+    """Serializer for daily and weekly SupplyRollup rows."""
+
+    median_minutes_to_fulfill = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SupplyRollup
+        fields = ('period', 'period_start', 'blood_type', 'city', 'donations', 'units_donated_ml',
+                  'requests_opened', 'requests_fulfilled', 'median_minutes_to_fulfill')
+        read_only_fields = fields
+
+    def get_median_minutes_to_fulfill(self, obj):
+        return median_minutes(obj)
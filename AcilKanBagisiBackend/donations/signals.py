@@ -0,0 +1,108 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from users.models import CustomUser
+from .cache import donation_center_cache
+from . import rollups
+from .counters import (
+    record_completed_donation,
+    record_emergency_unit,
+    release_completed_donation,
+    release_emergency_unit,
+)
+from .events import emergency_event, get_broker
+from .matching import donor_index
+from .notifications import get_dispatcher, notifications_enabled
+from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse
+
+logger = logging.getLogger(__name__)
+
+
+def publish_on_commit(emergency_request, created):
+    """Publish the request to streams after commit; a broker outage must not fail the saved request."""
+    def publish():
+        try:
+            get_broker().publish(emergency_event(emergency_request, created))
+        except Exception:
+            logger.exception('Publishing emergency request %s failed', emergency_request.pk)
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_donor_index(sender, instance, **kwargs):
+    """Keep the in-process donor index in step with profile changes."""
+    donor_index.update_user(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_from_donor_index(sender, instance, **kwargs):
+    donor_index.remove_user(instance.pk)
+
+
+@receiver(post_save, sender=EmergencyRequest)
+def publish_emergency_request(sender, instance, created, **kwargs):
+    """Push new and updated emergency requests to subscribed donors after commit."""
+    if created:
+        rollups.add_request_opened(instance)
+        if notifications_enabled():
+            transaction.on_commit(lambda: get_dispatcher().notify(instance))
+    publish_on_commit(instance, created)
+
+
+@receiver(post_save, sender=DonationCenter)
+@receiver(post_delete, sender=DonationCenter)
+def invalidate_donation_centers(sender, **kwargs):
+    donation_center_cache.invalidate()
+
+
+@receiver(post_init, sender=Donation)
+@receiver(post_init, sender=EmergencyResponse)
+def remember_saved_status(sender, instance, **kwargs):
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=EmergencyResponse)
+def count_completed_response(sender, instance, created, **kwargs):
+    """Roll the request's units forward when a response becomes completed, and back when it stops being so."""
+    was_completed = not created and instance._saved_status == 'completed'
+    if instance.status == 'completed' and not was_completed:
+        if record_emergency_unit(instance.emergency_request_id):
+            emergency_request = EmergencyRequest.objects.get(pk=instance.emergency_request_id)
+            rollups.add_request_fulfilled(emergency_request)
+            publish_on_commit(emergency_request, False)
+    elif was_completed and instance.status != 'completed':
+        release_emergency_unit(instance.emergency_request_id)
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=EmergencyResponse)
+def uncount_deleted_response(sender, instance, **kwargs):
+    if instance._saved_status == 'completed':
+        release_emergency_unit(instance.emergency_request_id)
+
+
+@receiver(post_save, sender=Donation)
+def track_completed_donation(sender, instance, created, **kwargs):
+    """Count a donation in eligibility and rollups when it is completed, and take it back when it stops being so."""
+    was_completed = not created and instance._saved_status == 'completed'
+    if instance.status == 'completed' and not was_completed:
+        record_completed_donation(instance)
+        rollups.add_donation(instance)
+        donor_index.reload_user(instance.user_id)
+    elif was_completed and instance.status != 'completed':
+        release_completed_donation(instance)
+        rollups.remove_donation(instance)
+        donor_index.reload_user(instance.user_id)
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=Donation)
+def release_deleted_donation(sender, instance, **kwargs):
+    if instance._saved_status == 'completed':
+        release_completed_donation(instance)
+        rollups.remove_donation(instance)
+        donor_index.reload_user(instance.user_id)
@@ -1,3 +1,1105 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import AsyncRequestFactory
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import ClaimsRefreshToken
+from users.revocation import revoked_tokens
+from users.models import CustomUser
+from .admin import DonationAdmin
+from .async_views import (
+    AsyncDonationCenterListView,
+    AsyncDonationDetailView,
+    AsyncDonationListView,
+    AsyncEmergencyFeedView,
+    AsyncEmergencyRequestDetailView,
+)
+from .cache import LocMemLRUBackend, donation_center_cache
+from .checks import check_notification_transport
+from .counters import record_donation, record_emergency_unit, refresh_eligibility
+from .events import InProcessBroker, emergency_event
+from .expiry import ExpirySweeper, expire_requests
+from .importers import _iter_json_array, import_centers
+from .matching import (
+    BLOOD_TYPES,
+    DonorIndex,
+    can_donate,
+    compatible_donor_types,
+    donor_index,
+    eligible_donors,
+    match_donors,
+    normalize_city,
+)
+from .notifications import Deduplicator, LocMemTransport, NotificationDispatcher, TokenBucket
+from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse, SupplyRollup
+from .query_planning import plan_queryset, related_paths
+from .rollups import week_start
+from .serializers import DonationSerializer, EmergencyResponseSerializer
+from .views import (
+    DonationCenterListView,
+    DonationDetailView,
+    DonationListCreateView,
+    EmergencyRequestDetailView,
+    EmergencyRequestListCreateView,
+    EmergencyRequestMatchView,
+    ExportView,
+    SupplyRollupListView,
+    emergency_stream,
+)
+
+
+def create_user(email, blood_type='A+', **extra_fields):
+    return CustomUser.objects.create(email=email, full_name=email.split('@')[0], blood_type=blood_type, **extra_fields)
+
+
+def create_emergency(requester, blood_type='A+', city='İstanbul', **extra_fields):
+    extra_fields.setdefault('expires_at', timezone.now() + timedelta(days=1))
+    extra_fields.setdefault('patient_name', 'Hasta')
+    return EmergencyRequest.objects.create(
+        requester=requester, blood_type=blood_type, hospital='Hastane',
+        city=city, phone_number='0', **extra_fields
+    )
+
+
+class CompatibilityTests(SimpleTestCase):
+    """Tests for the ABO/Rh compatibility masks."""
+
+    def test_universal_donor_and_recipient(self):
+        self.assertTrue(all(can_donate('O-', recipient) for recipient in BLOOD_TYPES))
+        self.assertEqual(compatible_donor_types('AB+'), list(BLOOD_TYPES))
+
+    def test_rh_negative_recipient_rejects_rh_positive(self):
+        self.assertEqual(compatible_donor_types('A-'), ['O-', 'A-'])
+        self.assertEqual(compatible_donor_types('B+'), ['O-', 'O+', 'B-', 'B+'])
+
+    def test_city_normalization(self):
+        self.assertEqual(normalize_city(' İstanbul'), normalize_city('istanbul'))
+        self.assertEqual(normalize_city('Diyarbakır'), normalize_city('DIYARBAKIR'))
+
+
+class DonorIndexTests(SimpleTestCase):
+    """Tests for ranking in the in-memory donor index."""
+
+    def setUp(self):
+        self.index = DonorIndex()
+        self.today = date(2025, 6, 1)
+
+    def test_ranks_exact_type_before_universal_then_by_distance(self):
+        self.index.add(1, 'O-', 'Ankara', 39.93, 32.86, None)
+        self.index.add(2, 'A+', 'Ankara', 39.80, 32.70, None)
+        self.index.add(3, 'A+', 'Ankara', 39.92, 32.85, None)
+        self.index.add(4, 'B+', 'Ankara', 39.93, 32.85, None)
+        self.index.add(5, 'A+', 'İzmir', 38.42, 27.14, None)
+        matches = self.index.match('A+', 'ankara', origin=(39.93, 32.85), on=self.today)
+        self.assertEqual([match.donor_id for match in matches], [3, 2, 1])
+
+    def test_skips_donors_inside_the_donation_interval(self):
+        self.index.add(1, 'A+', 'Ankara', None, None, self.today - timedelta(days=30))
+        self.index.add(2, 'A+', 'Ankara', None, None, self.today - timedelta(days=120))
+        matches = self.index.match('A+', 'Ankara', on=self.today)
+        self.assertEqual([match.donor_id for match in matches], [2])
+
+    def test_radius_and_limit(self):
+        for donor_id in range(10):
+            self.index.add(donor_id, 'A+', 'Ankara', 39.93 + donor_id * 0.1, 32.85, None)
+        matches = self.index.match('A+', 'Ankara', origin=(39.93, 32.85), radius_km=50, limit=3, on=self.today)
+        self.assertEqual([match.donor_id for match in matches], [0, 1, 2])
+        self.assertEqual(len(self.index.match('A+', 'Ankara', origin=(39.93, 32.85), radius_km=50)), 5)
+
+    def test_moving_a_donor_between_buckets(self):
+        self.index.add(1, 'A+', 'Ankara', None, None, None)
+        self.index.add(1, 'A+', 'İzmir', None, None, None)
+        self.assertEqual(self.index.match('A+', 'Ankara', on=self.today), [])
+        self.assertEqual(len(self.index.match('A+', 'İzmir', on=self.today)), 1)
+
+
+class DonorMatchingTests(TestCase):
+    """Tests for matching donors to stored emergency requests."""
+
+    def setUp(self):
+        donor_index.reset()
+        self.requester = create_user('requester@example.com', city='İstanbul', latitude=41.0, longitude=29.0)
+        self.near = create_user('near@example.com', city='Istanbul', latitude=41.01, longitude=29.01)
+        self.far = create_user('far@example.com', blood_type='O+', city='İstanbul', latitude=41.2, longitude=28.7)
+        create_user('incompatible@example.com', blood_type='B+', city='İstanbul')
+        create_user('inactive@example.com', city='İstanbul', is_donor=False)
+        self.emergency = create_emergency(self.requester)
+        # The rows are uncommitted, so load on this thread rather than in the background.
+        donor_index.load()
+
+    def test_match_excludes_requester_and_ineligible(self):
+        matches = match_donors(self.emergency)
+        self.assertEqual([match.donor_id for match in matches], [self.near.pk, self.far.pk])
+
+    def test_match_falls_back_to_the_database_until_the_index_is_loaded(self):
+        donor_index.reset()
+        with mock.patch.object(donor_index, 'refresh') as refresh:
+            matches = match_donors(self.emergency)
+            self.assertEqual([match.donor_id for match in matches], [self.near.pk, self.far.pk])
+            matches = match_donors(self.emergency, radius_km=10)
+            self.assertEqual([match.donor_id for match in matches], [self.near.pk])
+        refresh.assert_called()
+        self.assertFalse(donor_index.ready)
+
+    def test_stale_index_is_served_while_reloading(self):
+        stale = donor_index.get()
+        with mock.patch.object(donor_index, 'refresh') as refresh, override_settings(DONOR_INDEX_MAX_AGE=-1):
+            self.assertIs(donor_index.get(), stale)
+        refresh.assert_called_once_with()
+
+    def test_changes_made_during_a_load_are_replayed_after_the_swap(self):
+        donor_index.reset()
+        add = DonorIndex.add
+
+        def add_then_update(index, donor_id, *args):
+            add(index, donor_id, *args)
+            if donor_id == self.near.pk and self.near.last_donation_date is None:
+                # The row was read before this save, so the new index starts out stale.
+                self.near.last_donation_date = date.today()
+                self.near.save()
+
+        with mock.patch.object(DonorIndex, 'add', add_then_update):
+            donor_index.load()
+        self.assertEqual([match.donor_id for match in match_donors(self.emergency)], [self.far.pk])
+
+    def test_index_follows_profile_changes(self):
+        match_donors(self.emergency)
+        self.near.last_donation_date = date.today()
+        self.near.save()
+        self.assertEqual([match.donor_id for match in match_donors(self.emergency)], [self.far.pk])
+
+    def test_match_view_is_limited_to_requester_or_staff(self):
+        view = EmergencyRequestMatchView.as_view()
+        factory = APIRequestFactory()
+
+        request = factory.get('/', {'radius': 10})
+        force_authenticate(request, user=self.requester)
+        response = view(request, pk=self.emergency.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([donor['id'] for donor in response.data], [self.near.pk])
+
+        request = factory.get('/')
+        force_authenticate(request, user=self.near)
+        self.assertEqual(view(request, pk=self.emergency.pk).status_code, 404)
+
+    def test_match_view_hides_contact_details_and_validates_limit(self):
+        view = EmergencyRequestMatchView.as_view()
+        factory = APIRequestFactory()
+
+        request = factory.get('/', {'latitude': 41.0, 'longitude': 29.0, 'radius': 50})
+        force_authenticate(request, user=self.requester)
+        response = view(request, pk=self.emergency.pk)
+        self.assertEqual(
+            set(response.data[0]), {'id', 'blood_type', 'city', 'district', 'compatibility_rank', 'distance'}
+        )
+        self.assertEqual(response.data[0]['distance'], 1)
+
+        for limit in (0, -5):
+            request = factory.get('/', {'limit': limit})
+            force_authenticate(request, user=self.requester)
+            self.assertEqual(view(request, pk=self.emergency.pk).status_code, 400)
+
+
+class EmergencyFeedPaginationTests(TestCase):
+    """Tests for keyset pagination of the emergency feed."""
+
+    def setUp(self):
+        self.user = create_user('feed@example.com')
+        for number in range(25):
+            create_emergency(self.user, urgency_level=number % 3 + 1, patient_name=f'Hasta {number}')
+        # Ties on created_at must still be broken by id.
+        EmergencyRequest.objects.filter(urgency_level=2).update(created_at=timezone.now())
+        self.factory = APIRequestFactory()
+        self.view = EmergencyRequestListCreateView.as_view()
+
+    def get(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_pages_walk_the_feed_in_order_without_offset_or_count(self):
+        expected = list(EmergencyRequest.objects.order_by('-urgency_level', '-created_at', 'id').values_list('id', flat=True))
+        seen = []
+        url = '/emergency/?page_size=7'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 1)
+            sql = queries[0]['sql'].upper()
+            self.assertNotIn('OFFSET', sql)
+            self.assertNotIn('COUNT(', sql)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_feed_items_do_not_embed_the_requester(self):
+        item = self.get('/emergency/').data['results'][0]
+        self.assertEqual(item['requester'], self.user.pk)
+        self.assertNotIn('requester_detail', item)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get('/emergency/?cursor=bm90LWpzb24').status_code, 404)
+
+
+class QueryBudgetTests(TestCase):
+    """Every donations endpoint must stay within a fixed query budget."""
+
+    # Budgets include the COUNT(*) of page-number pagination where it applies.
+    LIST_BUDGETS = {
+        DonationListCreateView: 2,
+        DonationCenterListView: 2,
+        EmergencyRequestListCreateView: 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('budget@example.com')
+        for number in range(12):
+            center = DonationCenter.objects.create(
+                name=f'Merkez {number}', address='-', city='Ankara', district='Çankaya', phone='0'
+            )
+            Donation.objects.create(user=cls.user, donation_center=center, date=date(2025, 1, number + 1))
+            emergency = create_emergency(create_user(f'requester{number}@example.com'))
+            EmergencyResponse.objects.create(donor=cls.user, emergency_request=emergency)
+
+    def request(self, view, **kwargs):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = view.as_view()(request, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        response.render()
+        return response
+
+    def test_list_endpoints(self):
+        for view, budget in self.LIST_BUDGETS.items():
+            with self.subTest(view=view.__name__), self.assertNumQueries(budget):
+                self.request(view)
+
+    def test_detail_endpoints(self):
+        donation = Donation.objects.first()
+        emergency = create_emergency(self.user)
+        for view, pk in ((DonationDetailView, donation.pk), (EmergencyRequestDetailView, emergency.pk)):
+            with self.subTest(view=view.__name__), self.assertNumQueries(1):
+                self.request(view, pk=pk)
+
+    def test_claims_user_is_loaded_once_on_create(self):
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        request = APIRequestFactory().post('/', {
+            'patient_name': 'Hasta', 'blood_type': 'A+', 'hospital': 'Hastane', 'city': 'Ankara',
+            'phone_number': '0', 'expires_at': (timezone.now() + timedelta(days=1)).isoformat(),
+        }, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with mock.patch('donations.signals.notifications_enabled', return_value=False), \
+                CaptureQueriesContext(connection) as queries:
+            response = EmergencyRequestListCreateView.as_view()(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['requester_detail']['email'], 'budget@example.com')
+        user_reads = [query for query in queries if query['sql'].startswith('SELECT') and 'users_customuser' in query['sql']]
+        self.assertEqual(len(user_reads), 1)
+
+    def test_nested_response_serializer_is_planned(self):
+        self.assertEqual(related_paths(EmergencyResponseSerializer), (('donor', 'emergency_request__requester'), ()))
+        with self.assertNumQueries(1):
+            queryset = plan_queryset(EmergencyResponse.objects.all(), EmergencyResponseSerializer)
+            data = EmergencyResponseSerializer(queryset, many=True).data
+        self.assertEqual(len(data), 12)
+
+
+class AsyncViewTests(TestCase):
+    """The async read views return what their sync counterparts return, with the same queries."""
+
+    PAIRS = (
+        (DonationListCreateView, AsyncDonationListView, '/?page=2&page_size=5'),
+        (DonationCenterListView, AsyncDonationCenterListView, '/?page_size=5'),
+        (EmergencyRequestListCreateView, AsyncEmergencyFeedView, '/?page_size=5'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('async@example.com')
+        for number in range(12):
+            center = DonationCenter.objects.create(
+                name=f'Merkez {number}', address='-', city='Ankara', district='Çankaya', phone='0'
+            )
+            Donation.objects.create(user=cls.user, donation_center=center, date=date(2025, 1, number + 1))
+            create_emergency(cls.user, urgency_level=number % 3 + 1)
+        cls.token = str(ClaimsRefreshToken.for_user(cls.user).access_token)
+
+    def setUp(self):
+        donation_center_cache.invalidate()
+        # Keep the periodic revocation sync out of the counted queries
+        revoked_tokens.sync()
+
+    def sync_get(self, view, url, **kwargs):
+        request = APIRequestFactory().get(url, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return view.as_view()(request, **kwargs).render()
+
+    def async_get(self, view, url, token=None, **kwargs):
+        request = AsyncRequestFactory().get(url, headers={'Authorization': f'Bearer {token or self.token}'})
+        # async_to_sync keeps the async ORM on this thread, inside the test transaction
+        return async_to_sync(view.as_view())(request, **kwargs)
+
+    def test_lists_match_sync_views(self):
+        for sync_view, async_view, url in self.PAIRS:
+            with self.subTest(view=async_view.__name__):
+                expected = self.sync_get(sync_view, url)
+                with CaptureQueriesContext(connection) as queries:
+                    donation_center_cache.invalidate()
+                    response = self.async_get(async_view, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                # The user comes from the token's claims, so only the view's own budget
+                self.assertEqual(len(queries), QueryBudgetTests.LIST_BUDGETS[sync_view])
+
+    def test_details_match_sync_views(self):
+        donation = Donation.objects.first()
+        emergency = EmergencyRequest.objects.first()
+        for sync_view, async_view, pk in ((DonationDetailView, AsyncDonationDetailView, donation.pk),
+                                         (EmergencyRequestDetailView, AsyncEmergencyRequestDetailView, emergency.pk)):
+            with self.subTest(view=async_view.__name__):
+                response = self.async_get(async_view, '/', pk=pk)
+                self.assertEqual(response.content, self.sync_get(sync_view, '/', pk=pk).content)
+
+    def test_other_users_rows_and_bad_pages_are_not_found(self):
+        other = create_user('other@example.com')
+        token = str(AccessToken.for_user(other))
+        donation = Donation.objects.first()
+        self.assertEqual(self.async_get(AsyncDonationDetailView, '/', token=token, pk=donation.pk).status_code, 404)
+        self.assertEqual(self.async_get(AsyncDonationListView, '/?page=9').status_code, 404)
+        self.assertEqual(self.async_get(AsyncEmergencyFeedView, '/?cursor=bm90LWpzb24').status_code, 404)
+
+    def test_authentication_is_required(self):
+        response = async_to_sync(AsyncEmergencyFeedView.as_view())(AsyncRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertEqual(self.async_get(AsyncEmergencyFeedView, '/', token='garbage').status_code, 401)
+
+    def test_center_list_supports_conditional_requests(self):
+        response = self.async_get(AsyncDonationCenterListView, '/')
+        request = AsyncRequestFactory().get('/', headers={'Authorization': f'Bearer {self.token}',
+                                                          'If-None-Match': response['ETag']})
+        self.assertEqual(async_to_sync(AsyncDonationCenterListView.as_view())(request).status_code, 304)
+
+
+class EmergencyEventTests(TestCase):
+    """Tests for publishing emergency requests to streaming subscribers."""
+
+    def test_broker_filters_by_city_and_blood_type(self):
+        async def scenario():
+            broker = InProcessBroker()
+            a_negative = broker.subscribe(city='Istanbul', blood_type='A-')
+            b_positive = broker.subscribe(city='İstanbul', blood_type='B+')
+            ankara = broker.subscribe(city='Ankara')
+            event = {'event': 'created', 'city': 'İstanbul', 'blood_type': 'A+', 'request': {'id': 1}}
+            # Events are published from request threads, not the subscribers' loop.
+            publisher = threading.Thread(target=broker.publish, args=(event,))
+            publisher.start()
+            publisher.join()
+            self.assertEqual(await a_negative.get(timeout=1), event)
+            for subscription in (b_positive, ankara):
+                with self.assertRaises(asyncio.TimeoutError):
+                    await subscription.get(timeout=0.05)
+
+        asyncio.run(scenario())
+
+    def test_saving_a_request_publishes_after_commit(self):
+        broker, dispatcher = mock.Mock(), mock.Mock()
+        with mock.patch('donations.signals.get_broker', return_value=broker), \
+                mock.patch('donations.signals.get_dispatcher', return_value=dispatcher), \
+                mock.patch('donations.signals.notifications_enabled', return_value=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                emergency = create_emergency(create_user('publisher@example.com'), blood_type='O-')
+        dispatcher.notify.assert_called_once_with(emergency)
+        event = broker.publish.call_args.args[0]
+        self.assertEqual(event['event'], 'created')
+        self.assertEqual(event['request']['id'], emergency.pk)
+        self.assertEqual(event['blood_type'], 'O-')
+
+    def test_broker_outage_does_not_fail_the_save(self):
+        broker = mock.Mock()
+        broker.publish.side_effect = ConnectionError('broker down')
+        with mock.patch('donations.signals.get_broker', return_value=broker), \
+                self.assertLogs('donations.signals', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                emergency = create_emergency(create_user('outage@example.com'))
+        self.assertTrue(EmergencyRequest.objects.filter(pk=emergency.pk).exists())
+
+
+class EmergencyStreamTests(TransactionTestCase):
+    """The stream authenticates on a worker thread, so rows must be committed."""
+
+    def test_stream_delivers_matching_events(self):
+        donor = create_user('listener@example.com', blood_type='O-', city='Ankara')
+        emergency = create_emergency(donor, city='Ankara')
+        # A claims token: the city is not in the claims and must be loaded before streaming
+        token = str(ClaimsRefreshToken.for_user(donor).access_token)
+        event = emergency_event(emergency, created=True)
+
+        async def scenario():
+            broker = InProcessBroker()
+            with mock.patch('donations.views.get_broker', return_value=broker):
+                response = await emergency_stream(AsyncRequestFactory().get('/', headers={'Authorization': f'Bearer {token}'}))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = response.streaming_content
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            broker.publish(event)
+            message = (await anext(stream)).decode()
+            await stream.aclose()
+            return message
+
+        message = asyncio.run(scenario())
+        self.assertTrue(message.startswith(f'event: created\nid: {emergency.pk}\n'))
+
+    def test_stream_requires_authentication(self):
+        response = asyncio.run(emergency_stream(AsyncRequestFactory().get('/')))
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_ignores_query_string_tokens(self):
+        token = str(AccessToken.for_user(create_user('query@example.com')))
+        response = asyncio.run(emergency_stream(AsyncRequestFactory().get('/', {'token': token})))
+        self.assertEqual(response.status_code, 401)
+
+
+class DonationCenterCacheTests(TestCase):
+    """Tests for the cached, conditional donation center list."""
+
+    def setUp(self):
+        donation_center_cache.invalidate()
+        self.user = create_user('centers@example.com')
+        self.center = DonationCenter.objects.create(
+            name='Kızılay', address='-', city='Ankara', district='Çankaya', phone='0'
+        )
+
+    def get(self, **headers):
+        request = APIRequestFactory().get('/centers/', **headers)
+        force_authenticate(request, user=self.user)
+        return DonationCenterListView.as_view()(request)
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_requests_get_304(self):
+        first = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_saving_a_center_invalidates(self):
+        first = self.get()
+        self.center.name = 'Kızılay Çankaya'
+        self.center.save()
+        second = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['results'][0]['name'], 'Kızılay Çankaya')
+
+    def test_lru_backend_evicts_oldest(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+
+    def test_lru_backend_entries_expire(self):
+        now = [100.0]
+        backend = LocMemLRUBackend(timeout=60, clock=lambda: now[0])
+        backend.set('page', 1)
+        now[0] += 59
+        self.assertEqual(backend.get('page'), 1)
+        now[0] += 1
+        self.assertIsNone(backend.get('page'))
+
+
+class CounterTests(TestCase):
+    """Tests for the atomic donation and emergency fulfilment counters."""
+
+    def setUp(self):
+        self.user = create_user('counter@example.com', donation_count=3, last_donation_date=date(2025, 3, 1))
+        self.center = DonationCenter.objects.create(
+            name='Kızılay', address='-', city='Ankara', district='Çankaya', phone='0'
+        )
+
+    def create_donation(self, user, day):
+        request = APIRequestFactory().post('/')
+        request.user = user
+        serializer = DonationSerializer(
+            data={'donation_center': self.center.pk, 'date': day.isoformat()}, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_stale_instances_do_not_lose_increments(self):
+        first = CustomUser.objects.get(pk=self.user.pk)
+        second = CustomUser.objects.get(pk=self.user.pk)
+        self.create_donation(first, date(2025, 6, 1))
+        self.create_donation(second, date(2025, 5, 1))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.donation_count, 5)
+        # Bookings are still pending and must not move eligibility
+        self.assertEqual(self.user.last_donation_date, date(2025, 3, 1))
+        self.assertEqual(second.donation_count, 5)
+
+    def test_completed_responses_fulfil_request(self):
+        emergency = create_emergency(create_user('requester@example.com'), units_needed=2)
+        donors = [create_user(f'donor{number}@example.com') for number in range(3)]
+        responses = [EmergencyResponse.objects.create(donor=donor, emergency_request=emergency) for donor in donors]
+
+        responses[0].status = 'completed'
+        responses[0].save()
+        responses[0].save()
+        emergency.refresh_from_db()
+        self.assertEqual((emergency.units_received, emergency.status), (1, 'active'))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = EmergencyResponse.objects.get(pk=responses[1].pk)
+            response.status = 'completed'
+            response.save()
+        emergency.refresh_from_db()
+        self.assertEqual((emergency.units_received, emergency.status), (2, 'fulfilled'))
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertFalse(record_emergency_unit(emergency.pk))
+
+    def test_withdrawn_completions_are_taken_back(self):
+        emergency = create_emergency(create_user('requester@example.com'), units_needed=3)
+        response = EmergencyResponse.objects.create(
+            donor=create_user('donor@example.com'), emergency_request=emergency, status='completed'
+        )
+        for status in ('cancelled', 'completed', 'cancelled', 'completed'):
+            response.status = status
+            response.save()
+            emergency.refresh_from_db()
+            self.assertEqual(emergency.units_received, 1 if status == 'completed' else 0)
+
+        EmergencyResponse.objects.get(pk=response.pk).delete()
+        emergency.refresh_from_db()
+        self.assertEqual(emergency.units_received, 0)
+
+    def test_reconcile_counters(self):
+        Donation.objects.create(user=self.user, donation_center=self.center, date=date(2025, 4, 1))
+        Donation.objects.create(user=self.user, donation_center=self.center, date=date(2025, 2, 1),
+                                status='completed')
+        emergency = create_emergency(self.user, units_needed=1)
+        EmergencyResponse.objects.create(donor=create_user('donor@example.com'), emergency_request=emergency)
+        EmergencyResponse.objects.filter(emergency_request=emergency).update(status='completed')
+
+        call_command('reconcile_counters', stdout=open(os.devnull, 'w'))
+
+        self.user.refresh_from_db()
+        emergency.refresh_from_db()
+        self.assertEqual((self.user.donation_count, self.user.last_donation_date), (2, date(2025, 2, 1)))
+        self.assertEqual((emergency.units_received, emergency.status), (1, 'fulfilled'))
+        self.assertEqual(
+            SupplyRollup.objects.get(period='day', period_start=timezone.localdate(emergency.fulfilled_at))
+            .requests_fulfilled,
+            1,
+        )
+
+
+class ConcurrentCounterTests(TransactionTestCase):
+    """Parallel writers must not lose increments."""
+
+    def test_parallel_donations(self):
+        user = create_user('parallel@example.com')
+        center = DonationCenter.objects.create(name='Merkez', address='-', city='Ankara', district='-', phone='0')
+        workers, per_worker = 4, 5
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def donate():
+            try:
+                barrier.wait()
+                for number in range(per_worker):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                donation = Donation.objects.create(
+                                    user=user, donation_center=center, date=date(2025, 1, number + 1),
+                                    status='completed',
+                                )
+                                record_donation(donation)
+                            break
+                        except OperationalError:
+                            # The shared in-memory test database rejects concurrent
+                            # writers instead of waiting on a busy timeout.
+                            time.sleep(0.001)
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=donate) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        user.refresh_from_db()
+        self.assertEqual(user.donation_count, workers * per_worker)
+        self.assertEqual(user.last_donation_date, date(2025, 1, per_worker))
+
+
+class ExpiryTests(TestCase):
+    """Tests for expiring overdue emergency requests."""
+
+    def setUp(self):
+        self.user = create_user('expiry@example.com')
+        now = timezone.now()
+        self.overdue = create_emergency(self.user, expires_at=now - timedelta(minutes=1))
+        self.current = create_emergency(self.user, expires_at=now + timedelta(hours=1))
+        self.closed = create_emergency(self.user, expires_at=now - timedelta(days=1), status='closed')
+
+    def statuses(self):
+        return dict(EmergencyRequest.objects.values_list('pk', 'status'))
+
+    def test_feed_hides_overdue_requests_before_the_sweep(self):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = EmergencyRequestListCreateView.as_view()(request)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.current.pk])
+
+    def test_sweep_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(expire_requests(), 1)
+        self.assertEqual(self.statuses(), {
+            self.overdue.pk: 'expired', self.current.pk: 'active', self.closed.pk: 'closed',
+        })
+        self.assertEqual(expire_requests(), 0)
+
+    def test_sweeper_thread(self):
+        sweeper = ExpirySweeper(interval=60)
+        self.assertEqual(sweeper.sweep(), 1)
+        sweeper.start()
+        sweeper.stop(timeout=1)
+        self.assertFalse(sweeper._thread.is_alive())
+
+
+class IndexPlanTests(TestCase):
+    """The hot list queries must be answered from an index on a large table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = CustomUser.objects.bulk_create(
+            CustomUser(email=f'seed{number}@example.com', full_name='Seed', blood_type=BLOOD_TYPES[number % 8],
+                       city=f'Şehir {number % 40}', city_key=normalize_city(f'Şehir {number % 40}'),
+                       is_donor=number % 3 != 0)
+            for number in range(2000)
+        )
+        cls.user = users[0]
+        centers = DonationCenter.objects.bulk_create(
+            DonationCenter(name=f'Merkez {number}', address='-', city='Ankara', district='-', phone='0',
+                           is_active=number % 4 != 0)
+            for number in range(200)
+        )
+        Donation.objects.bulk_create(
+            Donation(user=users[number % 2000], donation_center=centers[number % 200],
+                     date=date(2020, 1, 1) + timedelta(days=number % 1500))
+            for number in range(6000)
+        )
+        now = timezone.now()
+        statuses = ['active', 'fulfilled', 'expired', 'closed', 'expired']
+        requests = EmergencyRequest.objects.bulk_create(
+            EmergencyRequest(requester=users[number % 2000], patient_name='Hasta', blood_type=BLOOD_TYPES[number % 8],
+                             hospital='Hastane', city='Ankara', phone_number='0', urgency_level=number % 3 + 1,
+                             status=statuses[number % 5], expires_at=now + timedelta(hours=number % 48 - 24))
+            for number in range(4000)
+        )
+        EmergencyResponse.objects.bulk_create(
+            EmergencyResponse(donor=users[number % 2000], emergency_request=requests[number % 4000],
+                              status='completed' if number % 4 == 0 else 'pending')
+            for number in range(6000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def list_queryset(self, view_class):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.user
+        view = view_class(request=request, args=(), kwargs={}, format_kwarg=None)
+        queryset = view.filter_queryset(view.get_queryset())
+        ordering = getattr(view.paginator, 'ordering', None)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+    def test_list_views(self):
+        for view, index_name in (
+            (DonationListCreateView, 'donation_user_date_idx'),
+            (DonationCenterListView, 'center_active_name_idx'),
+            (EmergencyRequestListCreateView, 'emergency_active_feed_idx'),
+        ):
+            with self.subTest(view=view.__name__):
+                self.assertUsesIndex(self.list_queryset(view), index_name)
+
+    def test_lookups(self):
+        self.assertUsesIndex(
+            EmergencyResponse.objects.filter(donor=self.user, emergency_request_id=1).order_by(),
+            'response_donor_request_idx',
+        )
+        self.assertUsesIndex(
+            CustomUser.objects.filter(blood_type__in=['A+', 'O-'], city='Şehir 3', is_donor=True),
+            'user_donor_lookup_idx',
+        )
+        self.assertUsesIndex(eligible_donors('A+', city='Şehir 3'), 'user_eligible_donor_idx')
+
+
+def fake_geocoder(address, district, city):
+    return (39.92, 32.85) if city == 'Ankara' else None
+
+
+class DonationCenterImportTests(TestCase):
+    """Tests for the streaming donation center import."""
+
+    CSV = (
+        'code,name,address,city,district,phone,lat,lng,active\n'
+        'TR1,Kızılay Çankaya,Adres 1,Ankara,Çankaya,0312,39.9,32.8,evet\n'
+        'TR2,Kızılay Kadıköy,Adres 2,İstanbul,Kadıköy,0216,40.9,29.0,\n'
+        'TR3,Kızılay Keçiören,Adres 3,Ankara,Keçiören,0312,,,\n'
+        'TR4,Kızılay Bornova,Adres 4,İzmir,Bornova,0232,,,\n'
+        ',Kodsuz,Adres 5,Ankara,Çankaya,0312,39.9,32.8,\n'
+        'TR5,Hatalı,Adres 6,Ankara,Çankaya,0312,139.9,32.8,\n'
+    )
+
+    def write(self, content, suffix):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_csv_import_skips_invalid_rows_and_missing_coordinates(self):
+        report = import_centers(self.write(self.CSV, '.csv'), batch_size=2)
+        self.assertEqual((report.read, report.imported, report.invalid, report.missing_coordinates), (6, 2, 2, 2))
+        self.assertEqual(sorted(DonationCenter.objects.values_list('registry_code', flat=True)), ['TR1', 'TR2'])
+
+    @override_settings(DONATION_CENTER_GEOCODER='donations.tests.fake_geocoder')
+    def test_geocoder_fills_missing_coordinates(self):
+        report = import_centers(self.write(self.CSV, '.csv'))
+        self.assertEqual((report.imported, report.geocoded, report.missing_coordinates), (3, 1, 1))
+        center = DonationCenter.objects.get(registry_code='TR3')
+        self.assertEqual((center.latitude, center.longitude), (39.92, 32.85))
+
+    def test_reimport_updates_in_place(self):
+        path = self.write(self.CSV, '.csv')
+        import_centers(path)
+        rows = [{'code': 'TR1', 'name': 'Kızılay Ankara', 'address': 'Yeni', 'city': 'Ankara',
+                 'district': 'Çankaya', 'phone': '0312', 'lat': 39.9, 'lng': 32.8, 'active': 'pasif'}]
+        report = import_centers(self.write('\n'.join(json.dumps(row) for row in rows), '.jsonl'))
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(DonationCenter.objects.count(), 2)
+        center = DonationCenter.objects.get(registry_code='TR1')
+        self.assertEqual((center.name, center.is_active), ('Kızılay Ankara', False))
+
+    def test_json_items_that_are_not_objects_are_invalid(self):
+        rows = [{'code': 'TR9', 'name': 'Merkez', 'address': '-', 'city': 'Ankara', 'district': '-',
+                 'phone': '0', 'lat': 39.9, 'lng': 32.8}, ['TR2'], 'TR3', 4, None]
+        report = import_centers(self.write(json.dumps(rows), '.json'))
+        self.assertEqual((report.read, report.imported, report.invalid), (5, 1, 4))
+        self.assertEqual(report.errors[0], (2, {'__all__': ['Expected an object.']}))
+
+    def test_json_array_is_streamed_across_chunks(self):
+        rows = [{'code': f'TR{number}', 'name': 'Merkez ]', 'nested': {'a': [1, 2]}} for number in range(20)]
+        parsed = list(_iter_json_array(io.StringIO(json.dumps(rows, indent=1)), chunk_size=7))
+        self.assertEqual(parsed, rows)
+        self.assertEqual(list(_iter_json_array(io.StringIO(' [ ] '))), [])
+
+
+class ExportTests(TestCase):
+    """Tests for the streaming CSV/NDJSON exports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff@example.com', is_staff=True)
+        ankara = DonationCenter.objects.create(name='Ankara', address='-', city='Ankara', district='-', phone='0')
+        izmir = DonationCenter.objects.create(name='İzmir', address='-', city='İzmir', district='-', phone='0')
+        for day in range(1, 6):
+            Donation.objects.create(user=cls.staff, donation_center=ankara, date=date(2025, 1, day))
+        Donation.objects.create(user=cls.staff, donation_center=izmir, date=date(2025, 1, 3))
+
+    def export(self, resource, export_format, user=None, **params):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=user or self.staff)
+        return ExportView.as_view()(request, resource=resource, export_format=export_format)
+
+    def test_csv_with_filters_in_one_query(self):
+        response = self.export('donations', 'csv', **{'from': '2025-01-02', 'to': '2025-01-04', 'city': 'ankara'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['date'] for row in rows], ['2025-01-02', '2025-01-03', '2025-01-04'])
+        self.assertEqual(rows[0]['donor_email'], 'staff@example.com')
+
+    def test_city_filter_folds_turkish_letters(self):
+        for city in ('izmir', 'IZMIR', ' İzmir '):
+            content = b''.join(self.export('donations', 'csv', city=city).streaming_content).decode('utf-8')
+            self.assertEqual([row['city'] for row in csv.DictReader(io.StringIO(content))], ['İzmir'])
+
+    def test_ndjson(self):
+        emergency = create_emergency(self.staff, city='İzmir')
+        EmergencyResponse.objects.create(donor=self.staff, emergency_request=emergency)
+        response = self.export('emergency-responses', 'ndjson')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['city'], 'İzmir')
+
+    def test_errors(self):
+        self.assertEqual(self.export('donations', 'csv', user=create_user('donor@example.com')).status_code, 403)
+        self.assertEqual(self.export('users', 'csv').status_code, 404)
+        self.assertEqual(self.export('donations', 'xml').status_code, 404)
+        self.assertEqual(self.export('donations', 'csv', **{'from': '2025-13-01'}).status_code, 400)
+
+    def test_admin_action(self):
+        model_admin = DonationAdmin(Donation, admin.site)
+        request = APIRequestFactory().get('/')
+        request.user = self.staff
+        action = model_admin.get_actions(request)['export_csv'][0]
+        response = action(model_admin, None, Donation.objects.filter(donation_center__city='İzmir'))
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+
+class SupplyRollupTests(TestCase):
+    """Tests for the incremental and backfilled supply rollups."""
+
+    def setUp(self):
+        self.donor = create_user('rollup@example.com', blood_type='O-')
+        self.center = DonationCenter.objects.create(name='Merkez', address='-', city='İstanbul', district='-', phone='0')
+
+    def rollups(self):
+        return {
+            (row.period, row.period_start, row.blood_type, row.city): (
+                row.donations, row.units_donated_ml, row.requests_opened, row.requests_fulfilled,
+                row.fulfillment_minutes,
+            )
+            for row in SupplyRollup.objects.all()
+        }
+
+    def fulfil(self, emergency, minutes):
+        EmergencyRequest.objects.filter(pk=emergency.pk).update(
+            created_at=timezone.now() - timedelta(minutes=minutes)
+        )
+        response = EmergencyResponse.objects.create(donor=self.donor, emergency_request=emergency)
+        response.status = 'completed'
+        response.save()
+
+    def test_incremental_matches_backfill(self):
+        Donation.objects.create(user=self.donor, donation_center=self.center, date=date(2025, 3, 3), status='completed')
+        booked = Donation.objects.create(user=self.donor, donation_center=self.center, date=date(2025, 3, 5),
+                                         quantity=500)
+        withdrawn = Donation.objects.create(user=self.donor, donation_center=self.center, date=date(2025, 3, 4),
+                                            status='completed')
+        booked.status = 'completed'
+        booked.save()
+        withdrawn.status = 'cancelled'
+        withdrawn.save()
+        # Pending bookings count nowhere
+        Donation.objects.create(user=self.donor, donation_center=self.center, date=date(2025, 3, 6))
+        Donation.objects.get(pk=Donation.objects.create(
+            user=self.donor, donation_center=self.center, date=date(2025, 3, 6), status='completed'
+        ).pk).delete()
+        for minutes in (30, 90, 60):
+            self.fulfil(create_emergency(self.donor, blood_type='O-', city='istanbul'), minutes)
+
+        incremental = self.rollups()
+        today = timezone.localdate()
+        self.assertEqual(incremental[('week', date(2025, 3, 3), 'O-', 'istanbul')], (2, 950, 0, 0, []))
+        self.assertEqual(incremental[('day', today, 'O-', 'istanbul')], (0, 0, 3, 3, [30.0, 60.0, 90.0]))
+
+        SupplyRollup.objects.all().delete()
+        call_command('backfill_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_new_request_is_one_upsert(self):
+        create_emergency(self.donor, blood_type='O-')
+        with self.assertNumQueries(2):
+            # The emergency INSERT and one rollup upsert for both periods
+            create_emergency(self.donor, blood_type='O-')
+        self.assertEqual(
+            sorted(SupplyRollup.objects.values_list('period', 'requests_opened')), [('day', 2), ('week', 2)]
+        )
+
+    def test_stats_endpoint(self):
+        Donation.objects.create(user=self.donor, donation_center=self.center, date=date(2025, 3, 3), status='completed')
+        self.fulfil(create_emergency(self.donor, blood_type='O-', city='İstanbul'), 45)
+        request = APIRequestFactory().get('/', {'period': 'week', 'from': '2025-01-01', 'city': 'ISTANBUL'})
+        force_authenticate(request, user=self.donor)
+        with self.assertNumQueries(1):
+            response = SupplyRollupListView.as_view()(request)
+        self.assertEqual([(row['period_start'], row['donations'], row['median_minutes_to_fulfill'])
+                          for row in response.data],
+                         [('2025-03-03', 1, None), (str(week_start(timezone.localdate())), 0, 45.0)])
+
+
+class EligibilityTests(TestCase):
+    """Tests for the materialized eligible_from date and the eligible donor query."""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.recent = create_user('recent@example.com', city='Ankara', latitude=39.93, longitude=32.85,
+                                  last_donation_date=self.today - timedelta(days=30))
+        self.rested = create_user('rested@example.com', blood_type='O-', city='Ankara', latitude=39.95,
+                                  longitude=32.85, last_donation_date=self.today - timedelta(days=100))
+        self.never = create_user('never@example.com', city='Ankara', latitude=41.0, longitude=29.0)
+        create_user('elsewhere@example.com', city='İzmir')
+
+    def test_save_and_donations_keep_eligible_from(self):
+        self.assertEqual(self.recent.eligible_from, self.today + timedelta(days=60))
+        self.assertEqual(self.never.eligible_from, date.min)
+
+        self.never.last_donation_date = self.today
+        self.never.save(update_fields=['last_donation_date'])
+        self.never.refresh_from_db()
+        self.assertEqual(self.never.eligible_from, self.today + timedelta(days=90))
+
+        center = DonationCenter.objects.create(name='Merkez', address='-', city='Ankara', district='-', phone='0')
+        Donation.objects.create(user=self.rested, donation_center=center, date=self.today, status='completed')
+        self.rested.refresh_from_db()
+        self.assertEqual(self.rested.eligible_from, self.today + timedelta(days=90))
+
+    def test_only_completed_donations_move_eligibility(self):
+        center = DonationCenter.objects.create(name='Merkez', address='-', city='Ankara', district='-', phone='0')
+        Donation.objects.create(user=self.rested, donation_center=center, date=self.today - timedelta(days=100),
+                                status='completed')
+        booking = Donation.objects.create(user=self.rested, donation_center=center,
+                                          date=self.today + timedelta(days=7))
+        self.assertIn(self.rested, eligible_donors('O-', city='Ankara'))
+
+        booking.status = 'completed'
+        booking.save()
+        self.assertNotIn(self.rested, eligible_donors('O-', city='Ankara'))
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.rested.refresh_from_db()
+        self.assertEqual(self.rested.last_donation_date, self.today - timedelta(days=100))
+        self.assertIn(self.rested, eligible_donors('O-', city='Ankara'))
+
+    def test_eligible_donors_by_city_and_radius(self):
+        self.assertEqual(set(eligible_donors('A+', city='Ankara')), {self.rested, self.never})
+        self.assertEqual(list(eligible_donors('A+', city='Ankara', origin=(39.93, 32.85), radius_km=10)),
+                         [self.rested])
+        self.assertEqual(list(eligible_donors('O-', city='Ankara')), [self.rested])
+        self.assertEqual(set(eligible_donors('A+', city=' ANKARA ')), {self.rested, self.never})
+        self.assertEqual(list(eligible_donors('A+', city='izmir')), [CustomUser.objects.get(city='İzmir')])
+
+    def test_refresh_after_the_interval_changes(self):
+        self.assertEqual(refresh_eligibility(), 0)
+        with override_settings(DONATION_MIN_INTERVAL_DAYS=20):
+            with self.assertNumQueries(1):
+                self.assertEqual(refresh_eligibility(), 2)
+            self.assertEqual(refresh_eligibility(), 0)
+            self.rested.refresh_from_db()
+            self.assertEqual(self.rested.eligible_from, self.rested.last_donation_date + timedelta(days=20))
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT eligible_from FROM users_customuser WHERE id = %s', [self.rested.pk])
+                self.assertEqual(str(cursor.fetchone()[0]), str(self.rested.eligible_from))
+            self.assertEqual(set(eligible_donors('A+', city='Ankara')), {self.recent, self.rested, self.never})
+
+            CustomUser.objects.filter(pk=self.never.pk).update(eligible_from=self.today)
+            self.assertEqual(refresh_eligibility(), 1)
+            self.never.refresh_from_db()
+            self.assertEqual(self.never.eligible_from, date.min)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_paces_to_the_rate(self):
+        now, slept = [0.0], []
+        bucket = TokenBucket(rate=100, capacity=50, clock=lambda: now[0], sleep=slept.append)
+        self.assertEqual(bucket.acquire(50), 0)
+        self.assertAlmostEqual(bucket.acquire(100), 1.0)
+        now[0] = 1.5
+        self.assertEqual(bucket.acquire(50), 0)
+        self.assertEqual(slept, [1.0])
+
+
+class NotificationDispatchTests(TransactionTestCase):
+    """Alerts are resolved and sent on background threads, so rows must be committed."""
+
+    def setUp(self):
+        cache.clear()
+        donor_index.reset()
+        self.requester = create_user('alert-requester@example.com', city='Ankara')
+        self.donors = [create_user(f'alert{number}@example.com', blood_type='O-', city='Ankara') for number in range(5)]
+        create_user('alert-b@example.com', blood_type='B+', city='Ankara')
+        create_user('alert-izmir@example.com', blood_type='O-', city='İzmir')
+        self.transport = LocMemTransport()
+        self.dispatcher = NotificationDispatcher(self.transport, batch_size=2, workers=2)
+        self.addCleanup(self.dispatcher.shutdown)
+
+    def test_fan_out_is_batched_and_deduplicated(self):
+        with mock.patch('donations.signals.notifications_enabled', return_value=False):
+            emergency = create_emergency(self.requester, blood_type='A+', city='Ankara')
+        self.assertEqual(self.dispatcher.notify(emergency).result(timeout=5), 5)
+        self.assertEqual({n.donor_id for n in self.transport.outbox}, {donor.pk for donor in self.donors})
+        self.assertIn('A+', self.transport.outbox[0].title)
+
+        self.assertEqual(self.dispatcher.notify(emergency).result(timeout=5), 0)
+        metrics = self.dispatcher.metrics.snapshot()
+        self.assertEqual((metrics['fanouts'], metrics['batches'], metrics['sent'], metrics['deduplicated']),
+                         (2, 3, 5, 5))
+
+    def test_transport_failures_are_counted(self):
+        self.transport.send = mock.Mock(side_effect=ConnectionError)
+        with mock.patch('donations.signals.notifications_enabled', return_value=False):
+            emergency = create_emergency(self.requester, blood_type='O-', city='Ankara')
+        with self.assertLogs('donations.notifications', 'ERROR'):
+            self.assertEqual(self.dispatcher.notify(emergency).result(timeout=5), 0)
+        self.assertEqual(self.dispatcher.metrics.snapshot()['failed'], 5)
+
+        # Failed batches are not marked as alerted, so the next fan-out retries them
+        del self.transport.send
+        self.assertEqual(self.dispatcher.notify(emergency).result(timeout=5), 5)
+
+    def test_deduplicator(self):
+        dedup = Deduplicator()
+        self.assertEqual(dedup.claim(1, [1, 2]), [1, 2])
+        self.assertEqual(dedup.claim(1, [2, 3]), [3])
+        self.assertEqual(dedup.claim(2, [2]), [2])
+        dedup.release(1, [3])
+        self.assertEqual(dedup.claim(1, [1, 3]), [3])
+
+    def test_deduplicator_claims_a_batch_in_constant_round_trips(self):
+        backend = mock.Mock(wraps=cache)
+        with mock.patch('donations.notifications.caches', {'default': backend}):
+            self.assertEqual(len(Deduplicator().claim(3, range(5000))), 5000)
+        # Lock, read, write, unlock
+        self.assertEqual([call[0] for call in backend.method_calls], ['add', 'get', 'set', 'delete'])
+
+    def test_enabled_notifications_need_a_shared_dedup_cache(self):
+        config = {'ENABLED': True, 'BACKEND': 'donations.notifications.EmailTransport',
+                  'DEDUP': {'alias': 'notifications'}}
+        with override_settings(EMERGENCY_NOTIFICATIONS=config):
+            self.assertEqual([error.id for error in check_notification_transport(None)], ['donations.E002'])
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/x'}
+        with override_settings(EMERGENCY_NOTIFICATIONS=config, CACHES={**settings.CACHES, 'notifications': shared}):
+            self.assertEqual(check_notification_transport(None), [])
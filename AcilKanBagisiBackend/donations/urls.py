@@ -1,16 +1,37 @@
 ﻿from django.urls import path
+from .async_views import (
+    AsyncDonationCenterListView,
+    AsyncDonationDetailView,
+    AsyncDonationListView,
+    AsyncEmergencyFeedView,
+    AsyncEmergencyRequestDetailView,
+)
 from .views import (
     DonationListCreateView,
     DonationDetailView,
     EmergencyRequestListCreateView,
     EmergencyRequestDetailView,
+    EmergencyRequestMatchView,
     DonationCenterListView,
+    ExportView,
+    SupplyRollupListView,
+    emergency_stream,
 )
 
 urlpatterns = [
     path('', DonationListCreateView.as_view(), name='donation-list-create'),
-    path('<str:pk>/', DonationDetailView.as_view(), name='donation-detail'),
+    path('stats/', SupplyRollupListView.as_view(), name='supply-stats'),
+    path('exports/<str:resource>.<str:export_format>', ExportView.as_view(), name='export'),
     path('emergency/', EmergencyRequestListCreateView.as_view(), name='emergency-list-create'),
+    path('emergency/stream/', emergency_stream, name='emergency-stream'),
     path('emergency/<str:pk>/', EmergencyRequestDetailView.as_view(), name='emergency-detail'),
+    path('emergency/<str:pk>/matches/', EmergencyRequestMatchView.as_view(), name='emergency-matches'),
     path('centers/', DonationCenterListView.as_view(), name='donation-center-list'),
+    # Native async read endpoints for ASGI deployments
+    path('async/', AsyncDonationListView.as_view(), name='async-donation-list'),
+    path('async/centers/', AsyncDonationCenterListView.as_view(), name='async-donation-center-list'),
+    path('async/emergency/', AsyncEmergencyFeedView.as_view(), name='async-emergency-feed'),
+    path('async/emergency/<str:pk>/', AsyncEmergencyRequestDetailView.as_view(), name='async-emergency-detail'),
+    path('async/<str:pk>/', AsyncDonationDetailView.as_view(), name='async-donation-detail'),
+    path('<str:pk>/', DonationDetailView.as_view(), name='donation-detail'),
 ]
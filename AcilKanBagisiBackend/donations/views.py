@@ -1,14 +1,53 @@
-﻿from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse
+﻿import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from api.db import ReplicaReadMixin
+from users.authentication import load_deferred
+from users.models import CustomUser
+from users.serializers import DonorSummarySerializer
+from .cache import CachedListMixin, donation_center_cache
+from .events import format_sse, get_broker
+from .exports import CONTENT_TYPES, EXPORTS, export_response, filter_export
+from .matching import match_donors, normalize_city
+from .models import Donation, DonationCenter, EmergencyRequest, EmergencyResponse, SupplyRollup
+from .pagination import EmergencyFeedPagination
+from .query_planning import PlannedQuerysetMixin
 from .serializers import (
     DonationSerializer, 
     DonationCenterSerializer, 
     EmergencyRequestSerializer,
-    EmergencyResponseSerializer
+    EmergencyRequestListSerializer,
+    EmergencyResponseSerializer,
+    SupplyRollupSerializer,
 )
 
-class DonationListCreateView(generics.ListCreateAPIView):
+def get_date_param(request, name):
+    """Parse an optional ``YYYY-MM-DD`` query parameter."""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'A valid YYYY-MM-DD date is required.'})
+    return parsed
+
+class DonationListCreateView(ReplicaReadMixin, PlannedQuerysetMixin, generics.ListCreateAPIView):
     """API view to create a new donation or list all donations."""
     
     serializer_class = DonationSerializer
@@ -22,7 +61,7 @@ class DonationListCreateView(generics.ListCreateAPIView):
         context = super().get_serializer_context()
         return context
 
-class DonationDetailView(generics.RetrieveUpdateDestroyAPIView):
+class DonationDetailView(PlannedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """API view to retrieve, update or delete a donation."""
     
     serializer_class = DonationSerializer
@@ -32,28 +71,36 @@ class DonationDetailView(generics.RetrieveUpdateDestroyAPIView):
         """Return only donations for the current user."""
         return Donation.objects.filter(user=self.request.user)
 
-class DonationCenterListView(generics.ListAPIView):
+class DonationCenterListView(ReplicaReadMixin, CachedListMixin, PlannedQuerysetMixin, generics.ListAPIView):
     """API view to list all donation centers."""
     
     queryset = DonationCenter.objects.filter(is_active=True)
     serializer_class = DonationCenterSerializer
     permission_classes = [IsAuthenticated]
+    response_cache = donation_center_cache
 
-class EmergencyRequestListCreateView(generics.ListCreateAPIView):
+class EmergencyRequestListCreateView(ReplicaReadMixin, PlannedQuerysetMixin, generics.ListCreateAPIView):
     """API view to create a new emergency request or list active emergency requests."""
     
     serializer_class = EmergencyRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = EmergencyFeedPagination
+    
+    def get_serializer_class(self):
+        """Use the compact representation for the feed."""
+        if self.request.method == 'GET':
+            return EmergencyRequestListSerializer
+        return EmergencyRequestSerializer
     
     def get_queryset(self):
-        """Return active emergency requests."""
-        return EmergencyRequest.objects.filter(status='active')
+        """Return active emergency requests that have not expired yet."""
+        return EmergencyRequest.objects.filter(status='active', expires_at__gt=timezone.now())
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
         return context
 
-class EmergencyRequestDetailView(generics.RetrieveUpdateAPIView):
+class EmergencyRequestDetailView(PlannedQuerysetMixin, generics.RetrieveUpdateAPIView):
     """API view to retrieve or update an emergency request."""
     
     serializer_class = EmergencyRequestSerializer
@@ -62,3 +109,163 @@ class EmergencyRequestDetailView(generics.RetrieveUpdateAPIView):
     def get_queryset(self):
         """Return only emergency requests created by the current user."""
         return EmergencyRequest.objects.filter(requester=self.request.user)
+
+class EmergencyRequestMatchView(generics.GenericAPIView):
+    """
+    API view to rank compatible, eligible donors for an emergency request.
+
+    Donors are listed without contact details or coordinates, and distances
+    are rounded to whole kilometres. Donors are reached through the
+    emergency notifications (donations.notifications), not from this list.
+    """
+    
+    MAX_LIMIT = 500
+    
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        """Staff can match any request; other users only their own."""
+        queryset = EmergencyRequest.objects.select_related('requester')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(requester=self.request.user)
+    
+    def get_number_param(self, name, cast=float):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            raise ValidationError({name: 'A valid number is required.'})
+    
+    def get(self, request, *args, **kwargs):
+        emergency_request = self.get_object()
+        latitude = self.get_number_param('latitude')
+        longitude = self.get_number_param('longitude')
+        origin = (latitude, longitude) if latitude is not None and longitude is not None else None
+        limit = self.get_number_param('limit', cast=int)
+        if limit is not None and limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1.'})
+        
+        matches = match_donors(
+            emergency_request,
+            origin=origin,
+            radius_km=self.get_number_param('radius'),
+            limit=50 if limit is None else min(limit, self.MAX_LIMIT),
+        )
+        donors = CustomUser.objects.only(*DonorSummarySerializer.Meta.fields).in_bulk(
+            [match.donor_id for match in matches]
+        )
+        
+        results = []
+        for match in matches:
+            donor = donors.get(match.donor_id)
+            if donor is None:
+                continue
+            data = DonorSummarySerializer(donor).data
+            data['compatibility_rank'] = match.compatibility_rank
+            data['distance'] = None if match.distance is None else round(match.distance)
+            results.append(data)
+        return Response(results)
+
+class SupplyRollupListView(generics.ListAPIView):
+    """API view to list daily or weekly donation and emergency request totals."""
+    
+    serializer_class = SupplyRollupSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    # Periods returned when no start date is given
+    DEFAULT_SPAN = {'day': timedelta(days=30), 'week': timedelta(weeks=12)}
+    
+    def get_queryset(self):
+        """Return rollups for one period type, filtered by date range, blood type and city."""
+        params = self.request.query_params
+        period = params.get('period', 'day')
+        if period not in self.DEFAULT_SPAN:
+            raise ValidationError({'period': 'Expected "day" or "week".'})
+        date_to = get_date_param(self.request, 'to') or timezone.localdate()
+        date_from = get_date_param(self.request, 'from') or date_to - self.DEFAULT_SPAN[period]
+        
+        queryset = SupplyRollup.objects.filter(period=period, period_start__range=(date_from, date_to))
+        if params.get('blood_type'):
+            queryset = queryset.filter(blood_type=params['blood_type'])
+        if params.get('city'):
+            queryset = queryset.filter(city=normalize_city(params['city']))
+        return queryset
+
+class ExportView(APIView):
+    """API view to stream donations, emergency requests or responses as CSV or NDJSON (staff only)."""
+    
+    permission_classes = [IsAdminUser]
+    
+    def perform_content_negotiation(self, request, force=False):
+        # The export format comes from the URL, not the Accept header
+        return super().perform_content_negotiation(request, force=True)
+    
+    def get(self, request, resource, export_format):
+        spec = EXPORTS.get(resource)
+        if spec is None or export_format not in CONTENT_TYPES:
+            raise Http404
+        queryset = filter_export(
+            spec.model.objects.all(),
+            spec,
+            date_from=get_date_param(request, 'from'),
+            date_to=get_date_param(request, 'to'),
+            city=request.query_params.get('city'),
+        )
+        return export_response(queryset, spec, export_format, resource)
+
+def _stream_user(request):
+    """
+    Authenticate a stream request with the configured authentication classes.
+
+    Only the Authorization header is accepted. A token in the query string
+    would end up in proxy and access logs.
+    """
+    authenticators = [authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        user = Request(request, authenticators=authenticators).user
+    except APIException:
+        return None
+    if not user.is_authenticated:
+        return None
+    # A claims-built user; the stream reads its profile from async code
+    return load_deferred(user)
+
+async def emergency_stream(request):
+    """
+    Server-Sent Events stream of emergency requests for a donor.
+
+    Events are filtered by ``city`` and by requests the donor's ``blood_type``
+    can give to; both default to the authenticated user's profile. Clients
+    send the access token in the Authorization header. Serve under ASGI so
+    each open stream costs a coroutine instead of a worker.
+    """
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    
+    subscription = get_broker().subscribe(
+        city=request.GET.get('city', user.city),
+        blood_type=request.GET.get('blood_type', user.blood_type),
+    )
+    heartbeat = getattr(settings, 'EMERGENCY_STREAM_HEARTBEAT', 15)
+    
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event)
+        finally:
+            subscription.close()
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -6,6 +6,8 @@ class UsersConfig(AppConfig):
     name = 'users'
     
     def ready(self):
+        from . import checks, signals  # noqa: F401
+        
         # MongoDB bağlantısını sağla
         if hasattr(settings, 'connect_to_mongodb'):
             settings.connect_to_mongodb()
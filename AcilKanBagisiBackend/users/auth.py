@@ -0,0 +1,128 @@
+"""Login throttling and password-hashing offload.
+
+Password hashing is deliberately expensive, so floods are rejected by
+cache-backed throttles before ``authenticate`` runs: one per client IP and
+one per account. On the ASGI path, ``authenticate`` runs on a bounded
+thread pool (hashlib's PBKDF2, argon2-cffi and bcrypt all release the
+GIL). The event loop stays free, and once the pool's queue is full further
+logins are shed with a 503 instead of piling up.
+
+Rehash-on-login needs no code here. ``ModelBackend`` saves the password
+again whenever the stored hash does not use the first entry of
+``PASSWORD_HASHERS`` (see ``PASSWORD_HASHER_STRATEGY`` in settings).
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .authentication import ClaimsRefreshToken
+
+
+class SettingsRateMixin:
+    """Read the rate from ``DEFAULT_THROTTLE_RATES`` per request; a missing scope disables the throttle."""
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+
+class AuthRateThrottle(SettingsRateMixin, SimpleRateThrottle):
+    """Limits login and registration attempts per client IP."""
+
+    scope = 'auth_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountThrottle(SettingsRateMixin, SimpleRateThrottle):
+    """Limits login attempts per account, whichever IPs they come from."""
+
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email:
+            return None
+        ident = hashlib.sha256(str(email).strip().lower().encode('utf-8')).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+def token_payload(user, message):
+    refresh = ClaimsRefreshToken.for_user(user)
+    return {
+        'message': message,
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'full_name': user.full_name,
+            'blood_type': user.blood_type
+        },
+        'access': str(refresh.access_token),
+        'refresh': str(refresh)
+    }
+
+
+class PoolBusy(Exception):
+    """Raised when the hashing pool already has ``max_pending`` jobs."""
+
+
+class HashingPool:
+    """Bounded thread pool for password checks issued from async views."""
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='login-hash')
+
+    def _call(self, func, args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` on the pool; raises ``PoolBusy`` when the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy
+        try:
+            future = self._executor.submit(self._call, func, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the pool configured by ``LOGIN_HASHING``."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = getattr(settings, 'LOGIN_HASHING', {})
+                _pool = HashingPool(workers=config.get('WORKERS'), max_pending=config.get('MAX_PENDING'))
+    return _pool
+
+
+def authenticate_and_issue(request, email, password):
+    """Authenticate and build the token payload; ``None`` for bad credentials."""
+    user = authenticate(request, username=email, password=password)
+    if user is None:
+        return None
+    return token_payload(user, 'Giriş başarılı.')
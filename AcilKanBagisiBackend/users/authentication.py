@@ -0,0 +1,179 @@
+"""Stateless JWT authentication backed by a per-process user cache.
+
+Tokens issued at login and registration (``ClaimsRefreshToken``) carry the
+user's blood type, staff flags and ``is_active`` next to ``user_id``. When
+a request's token carries them, and says the user is active, the user is
+built from the signed claims with no query. Any other field is loaded from
+the database on first access; ``load_deferred`` reads them all at once
+before a full user is serialized. Claims are
+trusted for ``CLAIMS_MAX_AGE`` seconds after issue, and only if the user
+has not changed in this process since then. Other tokens go through a TTL
+cache of user rows, so each process reads a given user at most once per
+``TTL`` seconds.
+
+Access tokens revoked at logout are rejected through ``revoked_tokens``,
+a set lookup that needs no query between syncs.
+
+Saving or deleting a user (profile edits, deactivation, password changes)
+invalidates both paths in this process straight away. Other processes see
+the change within ``max(TTL, CLAIMS_MAX_AGE)`` seconds. Bulk ``update()``
+calls send no signals, so only the TTL covers them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revoked_tokens
+
+CLAIM_FIELDS = ('blood_type', 'is_staff', 'is_superuser', 'is_active')
+CLAIMS_ISSUED_AT = 'claims_iat'
+
+
+def cache_settings():
+    return {'TTL': 60, 'CLAIMS_MAX_AGE': 300, 'MAX_SIZE': 10000, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token carrying ``CLAIM_FIELDS`` and the time they were read.
+
+    The claims are copied into every access token derived from it. That
+    includes tokens minted on refresh, which is why their age is kept
+    separately from ``iat``.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for field in CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        token[CLAIMS_ISSUED_AT] = time.time()
+        return token
+
+
+def build_user(db, values):
+    """Build a user from ``values`` without a query; fields left out are deferred."""
+    model = get_user_model()
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(db, names, [values[name] for name in names])
+
+
+def load_deferred(user):
+    """Load every field a claims-built ``user`` left deferred in one query, e.g. before serializing it."""
+    deferred = user.get_deferred_fields()
+    if deferred:
+        user.refresh_from_db(fields=deferred)
+    return user
+
+
+class UserCache:
+    """Thread-safe TTL cache of user rows, plus the time each user last changed."""
+
+    def __init__(self):
+        self._rows = OrderedDict()
+        self._changed = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return a private copy of the cached user, or ``None``."""
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is None:
+                return None
+            expires, db, values = entry
+            if expires <= time.monotonic():
+                del self._rows[user_id]
+                return None
+            self._rows.move_to_end(user_id)
+        return build_user(db, values)
+
+    def put(self, user, loaded_at):
+        """Cache ``user`` unless it changed after ``loaded_at`` (a ``time.time()`` taken before the read)."""
+        config = cache_settings()
+        if config['TTL'] <= 0:
+            return
+        values = {
+            field.attname: user.__dict__[field.attname]
+            for field in user._meta.concrete_fields if field.attname in user.__dict__
+        }
+        with self._lock:
+            if self._changed.get(user.pk, float('-inf')) >= loaded_at:
+                return
+            self._rows[user.pk] = (time.monotonic() + config['TTL'], user._state.db, values)
+            self._rows.move_to_end(user.pk)
+            while len(self._rows) > config['MAX_SIZE']:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, user_id):
+        config = cache_settings()
+        now = time.time()
+        with self._lock:
+            self._rows.pop(user_id, None)
+            self._changed[user_id] = now
+            if len(self._changed) > config['MAX_SIZE']:
+                # Claims older than CLAIMS_MAX_AGE are never trusted, so older marks are moot
+                horizon = now - config['CLAIMS_MAX_AGE']
+                self._changed = {pk: changed for pk, changed in self._changed.items() if changed > horizon}
+
+    def trusts_claims(self, user_id, issued_at):
+        """True if claims read at ``issued_at`` are recent and the user has not changed since."""
+        if issued_at is None or time.time() - issued_at > cache_settings()['CLAIMS_MAX_AGE']:
+            return False
+        return self._changed.get(user_id, float('-inf')) < issued_at
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._changed.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that answers from token claims or ``user_cache`` before the database."""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revoked_tokens.is_revoked(validated_token):
+            raise InvalidToken('Token is revoked', code='token_revoked')
+        return validated_token
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            loaded_at = time.time()
+            user = super().get_user(validated_token)
+            user_cache.put(user, loaded_at)
+        return user
+
+    def get_cached_user(self, validated_token):
+        """The user from the cache or the token's claims; ``None`` when the database must be read."""
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            # Needs the current password hash
+            return None
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken('Token contained no recognizable user identification') from e
+        # Tokens carry the id as a string; the cache is keyed like ``user.pk``
+        user_id = self.user_model._meta.get_field(jwt_settings.USER_ID_FIELD).to_python(user_id)
+
+        user = user_cache.get(user_id)
+        # Claims saying the user is inactive go to the database, which rejects them
+        if user is None and all(field in validated_token for field in CLAIM_FIELDS) and (
+            validated_token['is_active'] is True
+            and user_cache.trusts_claims(user_id, validated_token.get(CLAIMS_ISSUED_AT))
+        ):
+            values = {field: validated_token[field] for field in CLAIM_FIELDS}
+            values[jwt_settings.USER_ID_FIELD] = user_id
+            user = build_user(router.db_for_read(self.user_model), values)
+        return user
@@ -0,0 +1,19 @@
+from django.contrib.auth.hashers import get_hasher
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_password_hasher(app_configs, **kwargs):
+    """The preferred hasher must be usable, or every registration and rehash fails."""
+    hasher = get_hasher('default')
+    if getattr(hasher, 'library', None) is None:
+        return []
+    try:
+        hasher._load_library()
+    except ValueError as error:
+        return [Error(
+            f'The preferred password hasher {hasher.algorithm!r} cannot be loaded: {error}',
+            hint='Install its library or change PASSWORD_HASHER_STRATEGY.',
+            id='users.E001',
+        )]
+    return []
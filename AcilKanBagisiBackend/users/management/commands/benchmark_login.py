@@ -0,0 +1,65 @@
+import asyncio
+import os
+import time
+
+from django.contrib.auth.hashers import check_password, get_hashers, make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from users.auth import AuthRateThrottle, HashingPool
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure password checks per second per core for each installed hasher, the aggregate rate '
+        'through the login hashing pool, and the cost of rejecting a throttled login.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Password checks per measurement.')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+
+    def handle(self, *args, **options):
+        logins = options['logins']
+        self.stdout.write(f'{os.cpu_count()} CPU cores')
+        self.stdout.write(f"{'hasher':<16} {'workers':>7} {'logins/s':>9} {'per core':>9}")
+        for hasher in get_hashers():
+            try:
+                encoded = make_password(PASSWORD, hasher=hasher.algorithm)
+            except ValueError:
+                self.stdout.write(f'{hasher.algorithm:<16} not installed')
+                continue
+            for workers in options['workers']:
+                rate = self.pool_rate(encoded, logins, workers)
+                self.stdout.write(
+                    f'{hasher.algorithm:<16} {workers:>7} {rate:>9.1f} {rate / min(workers, os.cpu_count() or 1):>9.1f}'
+                )
+        self.stdout.write(f'Throttled login rejected in {self.rejection_cost() * 1e6:.1f}us')
+
+    def pool_rate(self, encoded, logins, workers):
+        pool = HashingPool(workers=workers, max_pending=logins)
+
+        async def burst():
+            await asyncio.gather(*(pool.run(check_password, PASSWORD, encoded) for _ in range(logins)))
+
+        started = time.perf_counter()
+        asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+        pool.shutdown()
+        return logins / elapsed
+
+    def rejection_cost(self, attempts=1000):
+        request = Request(RequestFactory().post('/api/users/login/', REMOTE_ADDR='203.0.113.9'))
+        throttle = AuthRateThrottle()
+        while throttle.allow_request(request, None):
+            pass
+        started = time.perf_counter()
+        for _ in range(attempts):
+            AuthRateThrottle().allow_request(request, None)
+        elapsed = time.perf_counter() - started
+        cache.delete(throttle.key)
+        return elapsed / attempts
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['blood_type', 'city', 'is_donor'], name='user_donor_lookup_idx'),
+        ),
+    ]
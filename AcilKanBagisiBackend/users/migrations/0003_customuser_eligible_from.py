@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_eligible_from(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    interval = datetime.timedelta(days=getattr(settings, 'DONATION_MIN_INTERVAL_DAYS', 90))
+    dates = CustomUser.objects.filter(last_donation_date__isnull=False).values_list('last_donation_date', flat=True)
+    for last_donation_date in set(dates):
+        CustomUser.objects.filter(last_donation_date=last_donation_date).update(
+            eligible_from=last_donation_date + interval
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_index_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='eligible_from',
+            field=models.DateField(default=datetime.date(1, 1, 1), editable=False),
+        ),
+        migrations.RunPython(populate_eligible_from, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_donor', True)), fields=['blood_type', 'city', 'eligible_from'], name='user_eligible_donor_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import unicodedata
+from django.db import migrations, models
+
+
+def normalize_city(city):
+    if not city:
+        return ''
+    city = unicodedata.normalize('NFKD', city.strip())
+    city = ''.join(char for char in city if not unicodedata.combining(char))
+    return city.replace('ı', 'i').lower()
+
+
+def populate_city_key(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    cities = CustomUser.objects.exclude(city__isnull=True).exclude(city='').values_list('city', flat=True)
+    for city in set(cities):
+        CustomUser.objects.filter(city=city).update(city_key=normalize_city(city))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_eligible_donor_idx',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='city_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_city_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_donor', True)), fields=['blood_type', 'city_key', 'eligible_from'], name='user_eligible_donor_idx'),
+        ),
+    ]
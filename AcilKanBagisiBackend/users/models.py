@@ -1,7 +1,31 @@
-﻿from django.db import models
-from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-import pymongo
+﻿import unicodedata
+from datetime import date, timedelta
+
 from django.conf import settings
+from django.db import models
+from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from .mongo_mirror import mirror_user
+
+
+def donation_interval():
+    return timedelta(days=getattr(settings, 'DONATION_MIN_INTERVAL_DAYS', 90))
+
+
+def eligible_from(last_donation_date):
+    """First date on which a donor may donate again."""
+    if last_donation_date is None:
+        return date.min
+    return last_donation_date + donation_interval()
+
+
+def normalize_city(city):
+    """Fold case and diacritics so that 'İstanbul', 'Istanbul' and 'istanbul' match."""
+    if not city:
+        return ''
+    city = unicodedata.normalize('NFKD', city.strip())
+    city = ''.join(char for char in city if not unicodedata.combining(char))
+    return city.replace('ı', 'i').lower()
+
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -12,30 +36,8 @@ class CustomUserManager(BaseUserManager):
         user.set_password(password)
         user.save()
         
-        # MongoDB'ye de kaydet
-        try:
-            # MongoDB bağlantısı
-            client = pymongo.MongoClient(settings.MONGODB_URI)
-            db = client[settings.MONGODB_DB_NAME]
-            users_collection = db["users"]
-            
-            # Kullanıcı verilerini hazırla
-            user_data = {
-                "email": email,
-                "full_name": extra_fields.get('full_name', ''),
-                "blood_type": extra_fields.get('blood_type', ''),
-                "phone_number": extra_fields.get('phone_number', ''),
-                "city": extra_fields.get('city', ''),
-                "district": extra_fields.get('district', ''),
-                "address": extra_fields.get('address', ''),
-                "is_active": True
-            }
-            
-            # MongoDB'ye kaydet
-            result = users_collection.insert_one(user_data)
-            print(f"MongoDB'ye kullanıcı kaydedildi: {result.inserted_id}")
-        except Exception as e:
-            print(f"MongoDB kayıt hatası: {e}")
+        # MongoDB'ye arka planda, toplu olarak yansıt
+        mirror_user(user)
             
         return user
 
@@ -68,10 +70,14 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     address = models.CharField(max_length=255, null=True, blank=True)
     city = models.CharField(max_length=100, null=True, blank=True)
     district = models.CharField(max_length=100, null=True, blank=True)
+    # normalize_city(city); kept in save() so donor queries match 'İstanbul' and 'istanbul' alike
+    city_key = models.CharField(max_length=100, blank=True, default='', editable=False)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     donation_count = models.IntegerField(default=0)
     last_donation_date = models.DateField(null=True, blank=True)
+    # last_donation_date + DONATION_MIN_INTERVAL_DAYS; kept in save() and by refresh_eligibility
+    eligible_from = models.DateField(default=date.min, editable=False)
     is_donor = models.BooleanField(default=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -83,5 +89,39 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     
     objects = CustomUserManager()
     
+    class Meta:
+        indexes = [
+            # Bağışçı arama: kan grubu + şehir
+            models.Index(fields=['blood_type', 'city', 'is_donor'], name='user_donor_lookup_idx'),
+            # Şu an bağış yapabilecek bağışçılar: tek bir indeks aralık taraması
+            models.Index(fields=['blood_type', 'city_key', 'eligible_from'],
+                         condition=models.Q(is_donor=True, is_active=True), name='user_eligible_donor_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.eligible_from = eligible_from(self.last_donation_date)
+        self.city_key = normalize_city(self.city)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = {'last_donation_date': 'eligible_from', 'city': 'city_key'}
+            kwargs['update_fields'] = {*update_fields, *(derived[name] for name in derived if name in update_fields)}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.email
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked refresh token, kept until the token would have expired anyway.
+
+    Only a 64-bit hash of the ``jti`` is stored; ``users.revocation`` keeps
+    an in-memory copy and answers revocation checks from it.
+    """
+
+    key = models.BigIntegerField(primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.key & (2 ** 64 - 1):016x}'
@@ -0,0 +1,240 @@
+"""Background mirroring of user documents to MongoDB.
+
+Registration only puts a document on an in-memory queue. A worker thread
+drains the queue in batches and upserts them through one shared, pooled
+``MongoClient``. Batches that still fail after retrying are appended to a
+local JSON-lines backlog and replayed once MongoDB is reachable again. The
+queue is bounded; when it is full, new documents go straight to the backlog.
+Replay moves the backlog file aside and writes it without holding the lock
+that ``enqueue`` needs, and skips documents older than the stored copy.
+
+Mirroring is off unless ``MONGO_MIRROR_ENABLED`` is set.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import pymongo
+from django.conf import settings
+from django.db import transaction
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide MongoClient; pymongo pools connections internally."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = pymongo.MongoClient(
+                    settings.MONGODB_URI,
+                    maxPoolSize=getattr(settings, 'MONGO_MAX_POOL_SIZE', 10),
+                    serverSelectionTimeoutMS=getattr(settings, 'MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+                )
+    return _client
+
+
+def get_users_collection():
+    return get_client()[settings.MONGODB_DB_NAME]['users']
+
+
+def user_document(user):
+    return {
+        'email': user.email,
+        'full_name': user.full_name or '',
+        'blood_type': user.blood_type or '',
+        'phone_number': user.phone_number or '',
+        'city': user.city or '',
+        'district': user.district or '',
+        'address': user.address or '',
+        'is_active': user.is_active,
+        # Lets a replayed backlog skip documents a newer write has superseded
+        'mirrored_at': time.time(),
+    }
+
+
+class MongoMirror:
+    """Queue-backed writer that upserts documents by ``key`` in batches."""
+
+    def __init__(self, collection_factory=get_users_collection, backlog_path=None, key='email',
+                 batch_size=100, flush_interval=1.0, max_retries=3, retry_backoff=0.5, max_queue=10000):
+        self.collection_factory = collection_factory
+        self.backlog_path = backlog_path
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._backlog_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def enqueue(self, document):
+        try:
+            self.queue.put_nowait(document)
+        except queue.Full:
+            # MongoDB is not keeping up; keep the document without holding memory
+            self.append_backlog([document])
+        self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='mongo-mirror', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self.replay_backlog()
+        while not self._stopping.is_set():
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                written = self.write(batch)
+            except Exception:
+                logger.exception('Unexpected MongoDB mirror error')
+                written = False
+            try:
+                if written:
+                    self.replay_backlog()
+                else:
+                    self.append_backlog(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def write(self, documents):
+        """Upsert ``documents`` with retries; return False if every attempt failed."""
+        operations = [
+            pymongo.UpdateOne({self.key: document[self.key]}, {'$set': document}, upsert=True)
+            for document in documents
+        ]
+        for attempt in range(self.max_retries):
+            try:
+                self.collection_factory().bulk_write(operations, ordered=False)
+                return True
+            except PyMongoError as error:
+                logger.warning('MongoDB mirror write failed (attempt %s): %s', attempt + 1, error)
+                if attempt + 1 < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+    def append_backlog(self, documents):
+        if not self.backlog_path:
+            logger.error('Dropping %s mirrored documents: no backlog configured', len(documents))
+            return
+        with self._backlog_lock, open(self.backlog_path, 'a', encoding='utf-8') as backlog:
+            for document in documents:
+                backlog.write(json.dumps(document, ensure_ascii=False) + '\n')
+
+    def replay_backlog(self):
+        """
+        Write the stored backlog. Documents that could not be written go back
+        to the backlog; returns False if any did.
+        """
+        if not self.backlog_path:
+            return True
+        replaying = f'{self.backlog_path}.replaying'
+        with self._replay_lock:
+            # Only the rename happens under the lock that enqueue() takes
+            with self._backlog_lock:
+                # A replay that died midway leaves its file behind; finish that one first
+                if not os.path.exists(replaying):
+                    try:
+                        os.replace(self.backlog_path, replaying)
+                    except FileNotFoundError:
+                        return True
+            with open(replaying, encoding='utf-8') as backlog:
+                documents = self.newer_than_stored([json.loads(line) for line in backlog if line.strip()])
+            for start in range(0, len(documents), self.batch_size):
+                if not self.write(documents[start:start + self.batch_size]):
+                    self.append_backlog(documents[start:])
+                    os.remove(replaying)
+                    return False
+            os.remove(replaying)
+        return True
+
+    def newer_than_stored(self, documents):
+        """The latest backlog document per key, dropping those older than the copy already in MongoDB."""
+        latest = {}
+        for document in documents:
+            current = latest.get(document[self.key])
+            if current is None or document.get('mirrored_at', 0) >= current.get('mirrored_at', 0):
+                latest[document[self.key]] = document
+        if not latest:
+            return []
+        try:
+            stored = {
+                row[self.key]: row.get('mirrored_at', 0)
+                for row in self.collection_factory().find(
+                    {self.key: {'$in': list(latest)}}, {self.key: 1, 'mirrored_at': 1}
+                )
+            }
+        except PyMongoError:
+            # write() will fail and keep them in the backlog anyway
+            return list(latest.values())
+        return [
+            document for key, document in latest.items()
+            if key not in stored or document.get('mirrored_at', 0) >= stored[key]
+        ]
+
+    def flush(self, timeout=None):
+        """Block until queued documents are written or moved to the backlog."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        """Stop the worker and persist anything still queued."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        pending = []
+        while True:
+            try:
+                pending.append(self.queue.get_nowait())
+                self.queue.task_done()
+            except queue.Empty:
+                break
+        if pending:
+            self.append_backlog(pending)
+
+
+mirror = MongoMirror(
+    backlog_path=getattr(settings, 'MONGO_MIRROR_BACKLOG_PATH', None),
+    batch_size=getattr(settings, 'MONGO_MIRROR_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'MONGO_MIRROR_FLUSH_INTERVAL', 1.0),
+    max_retries=getattr(settings, 'MONGO_MIRROR_MAX_RETRIES', 3),
+    max_queue=getattr(settings, 'MONGO_MIRROR_MAX_QUEUE', 10000),
+)
+atexit.register(mirror.stop)
+
+
+def mirror_user(user):
+    """Queue the user's document once the surrounding transaction commits."""
+    if getattr(settings, 'MONGO_MIRROR_ENABLED', False):
+        transaction.on_commit(lambda: mirror.enqueue(user_document(user)))
@@ -0,0 +1,115 @@
+"""Revocation store for refresh tokens and the access tokens revoked with them at logout.
+
+A revoked token is recorded as a 64-bit hash of its ``jti`` in the
+``RevokedToken`` table. Each process mirrors that table in memory: one set
+of hashes per expiry bucket (``BUCKET_SECONDS`` wide, a day by default).
+``is_revoked`` is a hash and a set lookup. Every ``SYNC_SECONDS`` it first
+pulls rows revoked since the last sync in one indexed query.
+
+Once every token in a bucket has expired, that bucket is dropped from
+memory and its rows are deleted, so the store never outgrows the refresh
+lifetime. ``revoke`` is a single INSERT on the primary key. A second
+revocation of the same token fails on the key, which makes rotation
+single-use across processes even before the other processes have synced.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.db import untracked_writes
+
+from .models import RevokedToken
+
+
+def revocation_settings():
+    return {'SYNC_SECONDS': 5, 'BUCKET_SECONDS': 86400, **getattr(settings, 'TOKEN_REVOCATION', {})}
+
+
+def token_key(jti):
+    """Signed 64-bit hash of a ``jti``, the primary key of ``RevokedToken``."""
+    return int.from_bytes(hashlib.blake2b(str(jti).encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+class RevocationStore:
+    """In-memory mirror of ``RevokedToken``, sharded by expiry bucket."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._purged_bucket = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _bucket(self, expires):
+        return int(expires) // revocation_settings()['BUCKET_SECONDS']
+
+    def _add(self, key, expires):
+        with self._lock:
+            self._buckets.setdefault(self._bucket(expires), set()).add(key)
+
+    def sync_due(self):
+        return time.monotonic() >= self._next_sync
+
+    def is_revoked(self, token):
+        """True if ``token`` has been revoked; no query unless a sync is due."""
+        if self.sync_due():
+            self.sync()
+        return token_key(token[jwt_settings.JTI_CLAIM]) in self._buckets.get(self._bucket(token['exp']), ())
+
+    def revoke(self, token):
+        """Revoke ``token``; returns False if it was already revoked."""
+        key, expires = token_key(token[jwt_settings.JTI_CLAIM]), token['exp']
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(key=key, expires_at=datetime.fromtimestamp(expires, dt_timezone.utc))
+        except IntegrityError:
+            self._add(key, expires)
+            return False
+        # A rolled back revocation must not linger in memory
+        transaction.on_commit(lambda: self._add(key, expires))
+        return True
+
+    def sync(self):
+        """Pull revocations made since the last sync, then drop and purge expired buckets."""
+        if not self._sync_lock.acquire(blocking=False):
+            # Another thread is syncing; answer from memory meanwhile
+            return
+        try:
+            config = revocation_settings()
+            started = datetime.now(dt_timezone.utc)
+            rows = RevokedToken.objects.filter(expires_at__gt=started)
+            if self._synced_at is not None:
+                # Overlap the previous sync so rows committed late are not missed
+                rows = rows.filter(revoked_at__gte=self._synced_at - timedelta(seconds=config['SYNC_SECONDS']))
+            for key, expires_at in rows.values_list('key', 'expires_at').iterator():
+                self._add(key, expires_at.timestamp())
+
+            current = self._bucket(started.timestamp())
+            with self._lock:
+                for bucket in [bucket for bucket in self._buckets if bucket < current]:
+                    del self._buckets[bucket]
+            if self._purged_bucket != current:
+                # Housekeeping, not the request's own write: keep its reads on the replica
+                with untracked_writes():
+                    RevokedToken.objects.filter(expires_at__lte=started).delete()
+                self._purged_bucket = current
+            self._synced_at = started
+            self._next_sync = time.monotonic() + config['SYNC_SECONDS']
+        finally:
+            self._sync_lock.release()
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._purged_bucket = None
+
+
+revoked_tokens = RevocationStore()
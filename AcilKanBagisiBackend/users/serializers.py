@@ -2,6 +2,13 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsRefreshToken
+from .revocation import revoked_tokens
 
 User = get_user_model()
 
@@ -11,9 +18,17 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'full_name', 'blood_type', 'phone_number', 
-                  'address', 'city', 'district', 'last_donation_date', 
+                  'address', 'city', 'district', 'last_donation_date', 'eligible_from',
                   'donation_count', 'latitude', 'longitude', 'date_joined')
-        read_only_fields = ('id', 'date_joined', 'donation_count', 'last_donation_date')
+        read_only_fields = ('id', 'date_joined', 'donation_count', 'last_donation_date', 'eligible_from')
+
+class DonorSummarySerializer(serializers.ModelSerializer):
+    """Donor representation without contact details or coordinates, for match results."""
+
+    class Meta:
+        model = User
+        fields = ('id', 'blood_type', 'city', 'district')
+        read_only_fields = fields
 
 class RegisterSerializer(serializers.ModelSerializer):
     """Serializer for user registration."""
@@ -51,3 +66,49 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ('full_name', 'phone_number', 'address', 'city', 
                   'district', 'blood_type', 'latitude', 'longitude')
+
+class TokenRotateSerializer(TokenRefreshSerializer):
+    """Refresh serializer that rejects revoked tokens and revokes the token it rotates."""
+
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revoked_tokens.is_revoked(refresh):
+            raise InvalidToken('Token is revoked', code='token_revoked')
+        data = super().validate(attrs)
+        if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+            # The insert fails if another request rotated this token first
+            if not revoked_tokens.revoke(refresh):
+                raise InvalidToken('Token is revoked', code='token_revoked')
+        return data
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """
+    Revokes a refresh token, e.g. at logout, together with the caller's access
+    token: ``access`` in the body, or else the request's Authorization header.
+    """
+
+    refresh = serializers.CharField()
+    access = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        refresh = ClaimsRefreshToken(attrs['refresh'])
+        revoked_tokens.revoke(refresh)
+        raw_access = attrs.get('access') or self.header_token()
+        if raw_access:
+            try:
+                access = AccessToken(raw_access)
+            except TokenError:
+                # Expired or invalid; there is nothing left to revoke
+                return {}
+            if access.get(jwt_settings.USER_ID_CLAIM) == refresh.get(jwt_settings.USER_ID_CLAIM):
+                revoked_tokens.revoke(access)
+        return {}
+
+    def header_token(self):
+        request = self.context.get('request')
+        parts = request.headers.get('Authorization', '').split() if request is not None else []
+        if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+            return parts[1]
+        return None
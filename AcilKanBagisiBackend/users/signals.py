@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Stop trusting cached rows and token claims for a user that was saved or deleted."""
+    user_id = instance.pk
+    user_cache.invalidate(user_id)
+    # Again after commit, in case another thread re-read the old row in between
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
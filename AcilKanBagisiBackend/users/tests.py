@@ -1,3 +1,395 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from pymongo.errors import AutoReconnect
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.logs import fingerprint
+from .models import CustomUser, RevokedToken
+from .auth import HashingPool
+from .authentication import CLAIMS_ISSUED_AT, ClaimsJWTAuthentication, ClaimsRefreshToken, user_cache
+from .revocation import RevocationStore, revoked_tokens, token_key
+from .mongo_mirror import MongoMirror, mirror
+from .views import login_user, login_user_async, logout_user, refresh_token
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+class FlakyCollection:
+    """
+    Stands in for a MongoDB collection on top of mongomock and fails the
+    first ``failures`` bulk writes. mongomock cannot consume the write models
+    of recent pymongo releases, so upserts are replayed one by one.
+    """
+
+    def __init__(self, collection, failures=0):
+        self.collection = collection
+        self.failures = failures
+        self.calls = 0
+
+    def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect('connection refused')
+        for operation in operations:
+            self.collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+@unittest.skipUnless(mongomock, 'mongomock is not installed')
+class MongoMirrorTests(TestCase):
+    """Tests for the batched MongoDB mirror writer."""
+
+    def setUp(self):
+        self.collection = mongomock.MongoClient().acilkan.users
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backlog_path = os.path.join(directory.name, 'backlog.jsonl')
+
+    def make_mirror(self, collection, **kwargs):
+        kwargs.setdefault('retry_backoff', 0)
+        instance = MongoMirror(collection_factory=lambda: collection, backlog_path=self.backlog_path,
+                               flush_interval=0.05, **kwargs)
+        self.addCleanup(instance.stop)
+        return instance
+
+    def test_documents_are_upserted_in_batches(self):
+        flaky = FlakyCollection(self.collection)
+        instance = self.make_mirror(flaky, batch_size=50)
+        for number in range(100):
+            instance.queue.put({'email': f'user{number}@example.com', 'city': 'Ankara'})
+        instance.enqueue({'email': 'user0@example.com', 'city': 'İzmir'})
+        self.assertTrue(instance.flush(timeout=5))
+
+        self.assertEqual(self.collection.count_documents({}), 100)
+        self.assertEqual(self.collection.find_one({'email': 'user0@example.com'})['city'], 'İzmir')
+        self.assertLessEqual(flaky.calls, 4)
+
+    def test_transient_failures_are_retried(self):
+        instance = self.make_mirror(FlakyCollection(self.collection, failures=2), max_retries=3)
+        with self.assertLogs('users.mongo_mirror', 'WARNING'):
+            instance.enqueue({'email': 'retry@example.com'})
+            self.assertTrue(instance.flush(timeout=5))
+        self.assertEqual(self.collection.count_documents({'email': 'retry@example.com'}), 1)
+
+    def test_failed_batches_go_to_backlog_and_are_replayed(self):
+        offline = self.make_mirror(FlakyCollection(self.collection, failures=100), max_retries=2)
+        with self.assertLogs('users.mongo_mirror', 'WARNING'):
+            offline.enqueue({'email': 'offline@example.com'})
+            self.assertTrue(offline.flush(timeout=5))
+        offline.stop()
+        self.assertEqual(self.collection.count_documents({}), 0)
+        with open(self.backlog_path, encoding='utf-8') as backlog:
+            self.assertIn('offline@example.com', backlog.read())
+
+        online = self.make_mirror(FlakyCollection(self.collection))
+        self.assertTrue(online.replay_backlog())
+        self.assertEqual(self.collection.count_documents({'email': 'offline@example.com'}), 1)
+        self.assertFalse(os.path.exists(self.backlog_path))
+
+    def test_replay_skips_documents_older_than_the_stored_copy(self):
+        instance = self.make_mirror(FlakyCollection(self.collection))
+        instance.append_backlog([{'email': 'stale@example.com', 'city': 'Ankara', 'mirrored_at': 1.0},
+                                 {'email': 'old@example.com', 'city': 'Bursa', 'mirrored_at': 1.0},
+                                 {'email': 'old@example.com', 'city': 'Konya', 'mirrored_at': 2.0}])
+        self.assertTrue(instance.write([{'email': 'stale@example.com', 'city': 'İzmir', 'mirrored_at': 5.0}]))
+        self.assertTrue(instance.replay_backlog())
+        self.assertEqual(self.collection.find_one({'email': 'stale@example.com'})['city'], 'İzmir')
+        self.assertEqual(self.collection.find_one({'email': 'old@example.com'})['city'], 'Konya')
+
+    def test_enqueue_does_not_wait_for_a_replay(self):
+        instance = self.make_mirror(FlakyCollection(self.collection), max_queue=1)
+        instance.append_backlog([{'email': 'backlog@example.com'}])
+        writing, release = threading.Event(), threading.Event()
+
+        def slow_write(documents):
+            writing.set()
+            release.wait(5)
+            return True
+
+        with mock.patch.object(instance, 'write', side_effect=slow_write):
+            replay = threading.Thread(target=instance.replay_backlog)
+            replay.start()
+            self.assertTrue(writing.wait(5))
+            instance.queue.put({'email': 'queued@example.com'})
+            started = time.monotonic()
+            with mock.patch.object(instance, 'start'):
+                # The queue is full, so this appends to the backlog while the replay writes
+                instance.enqueue({'email': 'spilled@example.com'})
+            self.assertLess(time.monotonic() - started, 1)
+            release.set()
+            replay.join(5)
+        with open(self.backlog_path, encoding='utf-8') as backlog:
+            self.assertIn('spilled@example.com', backlog.read())
+
+    def test_full_queue_spills_to_backlog(self):
+        instance = self.make_mirror(FlakyCollection(self.collection), max_queue=2)
+        instance.queue.put({'email': 'first@example.com'})
+        instance.queue.put({'email': 'second@example.com'})
+        # Keep the worker from replaying the backlog before it is read
+        with mock.patch.object(instance, 'start'):
+            instance.enqueue({'email': 'spilled@example.com'})
+        with open(self.backlog_path, encoding='utf-8') as backlog:
+            self.assertIn('spilled@example.com', backlog.read())
+        instance.start()
+        self.assertTrue(instance.flush(timeout=5))
+        # The first successful batch replays the backlog
+        self.assertEqual(self.collection.count_documents({}), 3)
+        self.assertFalse(os.path.exists(self.backlog_path))
+
+
+class CreateUserMirrorTests(TestCase):
+    """Registration must not wait for MongoDB."""
+
+    def test_mirror_is_off_in_tests(self):
+        with mock.patch.object(mirror, 'enqueue') as enqueue, self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user(email='quiet@example.com', password='x', full_name='Q', blood_type='O+')
+        enqueue.assert_not_called()
+
+    @override_settings(MONGO_MIRROR_ENABLED=True)
+    def test_create_user_queues_document_after_commit(self):
+        with mock.patch.object(mirror, 'enqueue') as enqueue:
+            with self.captureOnCommitCallbacks() as callbacks:
+                CustomUser.objects.create_user(email='new@example.com', password='x', full_name='New', blood_type='O+')
+            enqueue.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(enqueue.call_args.args[0]['email'], 'new@example.com')
+
+
+class AuthLoggingTests(TestCase):
+    """Auth views log through ``logging`` instead of printing request data."""
+
+    def test_login_logs_without_printing(self):
+        CustomUser.objects.create_user(email='log@example.com', password='right', full_name='Log', blood_type='A+')
+        request = APIRequestFactory().post('/login/', {'email': 'log@example.com', 'password': 'wrong'}, format='json')
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                self.assertLogs('users.views', 'DEBUG') as logs:
+            response = login_user(request)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual([record.levelname for record in logs.records], ['DEBUG', 'WARNING'])
+        self.assertEqual(logs.records[1].email_hash, fingerprint('log@example.com'))
+        self.assertNotIn('log@example.com', str([vars(record) for record in logs.records[1:]]))
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REST_FRAMEWORK={
+    'NUM_PROXIES': 0,
+    'DEFAULT_THROTTLE_RATES': {'auth_ip': '3/min', 'login_account': '2/min'},
+})
+class LoginThrottleTests(TestCase):
+    """Login floods are rejected before any password hashing."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = APIRequestFactory()
+
+    def login(self, email, address='198.51.100.1', **extra):
+        request = self.factory.post('/login/', {'email': email, 'password': 'x'}, format='json', REMOTE_ADDR=address,
+                                    **extra)
+        return login_user(request)
+
+    def test_account_and_ip_limits(self):
+        with mock.patch('users.views.authenticate_and_issue', return_value=None) as check:
+            statuses = [self.login('a@example.com', f'198.51.100.{number}').status_code for number in range(10, 13)]
+            statuses += [self.login(f'{name}@example.com').status_code for name in 'bcde']
+        self.assertEqual(statuses, [401, 401, 429, 401, 401, 401, 429])
+        self.assertEqual(check.call_count, 5)
+
+    def test_spoofed_forwarded_for_does_not_reset_the_ip_limit(self):
+        with mock.patch('users.views.authenticate_and_issue', return_value=None):
+            statuses = [self.login(f'{name}@example.com', HTTP_X_FORWARDED_FOR=f'203.0.113.{number}').status_code
+                        for number, name in enumerate('abcd')]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+    def test_forwarded_for_is_trusted_behind_configured_proxies(self):
+        with override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1, 'DEFAULT_THROTTLE_RATES': {'auth_ip': '1/min'}}), \
+                mock.patch('users.views.authenticate_and_issue', return_value=None):
+            statuses = [self.login(f'{name}@example.com', HTTP_X_FORWARDED_FOR=f'203.0.113.9, 192.0.2.{number}')
+                        .status_code for number, name in enumerate('ab')]
+        self.assertEqual(statuses, [401, 401])
+
+    def test_async_login_throttles_and_sheds_load(self):
+        payload = {'user': {'id': 1}}
+        request = lambda: RequestFactory().post(  # noqa: E731
+            '/login/async/', {'email': 'a@example.com', 'password': 'x'}, content_type='application/json',
+        )
+        busy = HashingPool(workers=1, max_pending=1)
+        self.addCleanup(busy.shutdown)
+        with mock.patch('users.views.authenticate_and_issue', return_value=payload):
+            self.assertEqual(asyncio.run(login_user_async(request())).status_code, 200)
+            busy._slots.acquire()
+            with mock.patch('users.views.get_hashing_pool', return_value=busy):
+                response = asyncio.run(login_user_async(request()))
+            self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+            self.assertEqual(asyncio.run(login_user_async(request())).status_code, 429)
+
+    def test_login_rejects_a_body_that_is_not_an_object(self):
+        for number, body in enumerate(('[]', '"x"', '1')):
+            request = RequestFactory().post('/login/async/', body, content_type='application/json',
+                                            REMOTE_ADDR=f'198.51.100.{number}')
+            response = asyncio.run(login_user_async(request))
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(json.loads(response.content), {'error': 'E-posta ve şifre zorunludur.'})
+            request = self.factory.post('/login/', body, content_type='application/json',
+                                        REMOTE_ADDR=f'198.51.100.{number + 50}')
+            self.assertEqual(login_user(request).status_code, 400, body)
+
+
+class RehashOnLoginTests(TestCase):
+    """Switching the preferred hasher upgrades stored hashes at the next login."""
+
+    def test_old_hash_is_upgraded(self):
+        with override_settings(PASSWORD_HASHERS=FAST_HASHERS):
+            user = CustomUser.objects.create_user(email='old@example.com', password='pw', full_name='Old', blood_type='A+')
+        cache.clear()
+        hashers = ['django.contrib.auth.hashers.ScryptPasswordHasher'] + FAST_HASHERS
+        with override_settings(PASSWORD_HASHERS=hashers):
+            request = APIRequestFactory().post('/login/', {'email': 'old@example.com', 'password': 'pw'}, format='json')
+            self.assertEqual(login_user(request).status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ClaimsAuthenticationTests(TestCase):
+    """Signed claims and the user cache keep the user query off authenticated requests."""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='claims@example.com', password='pw', full_name='Claims', blood_type='B-', is_staff=True,
+        )
+        request = APIRequestFactory().post('/login/', {'email': 'claims@example.com', 'password': 'pw'}, format='json')
+        self.access = AccessToken(login_user(request).data['access'])
+        self.authentication = ClaimsJWTAuthentication()
+
+    def test_login_token_needs_no_query(self):
+        with self.assertNumQueries(0):
+            user = self.authentication.get_user(self.access)
+        self.assertEqual((user.pk, user.blood_type, user.is_staff, user.is_active), (self.user.pk, 'B-', True, True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.full_name, 'Claims')
+
+    def test_profile_change_stops_trusting_claims(self):
+        self.user.blood_type = 'A+'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authentication.get_user(self.access).blood_type, 'A+')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authentication.get_user(self.access).blood_type, 'A+')
+
+    def test_deactivation_rejects_existing_tokens(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.access)
+
+    def test_claims_of_inactive_users_are_not_trusted(self):
+        self.assertIs(self.access['is_active'], True)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.access['is_active'] = False
+        with self.assertNumQueries(1), self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.access)
+
+    def test_old_claims_and_plain_tokens_use_the_cache(self):
+        self.access[CLAIMS_ISSUED_AT] -= 3600
+        for token in (self.access, AccessToken.for_user(self.user)):
+            user_cache.clear()
+            with self.assertNumQueries(1):
+                self.authentication.get_user(token)
+            with self.assertNumQueries(0):
+                user = self.authentication.get_user(token)
+            self.assertEqual(user.full_name, 'Claims')
+
+    @override_settings(JWT_USER_CACHE={'TTL': 0})
+    def test_zero_ttl_disables_the_cache(self):
+        token = AccessToken.for_user(self.user)
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.authentication.get_user(token)
+
+
+@override_settings(TOKEN_REVOCATION={'SYNC_SECONDS': 60, 'BUCKET_SECONDS': 86400})
+class TokenRevocationTests(TestCase):
+    """Rotated and logged-out refresh tokens are revoked; checks are answered from memory."""
+
+    def setUp(self):
+        cache.clear()
+        revoked_tokens.reset()
+        self.user = CustomUser.objects.create_user(email='rotate@example.com', password='pw', full_name='R', blood_type='A+')
+        self.refresh = str(ClaimsRefreshToken.for_user(self.user))
+
+    def post(self, view, refresh):
+        return view(APIRequestFactory().post('/', {'refresh': refresh}, format='json'))
+
+    def test_rotated_token_cannot_be_reused(self):
+        response = self.post(refresh_token, self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.post(refresh_token, self.refresh).status_code, 401)
+        self.assertEqual(self.post(refresh_token, response.data['refresh']).status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_second_rotation_fails_on_the_key_before_any_sync(self):
+        other_process = RevocationStore()
+        other_process.sync()
+        token = ClaimsRefreshToken(self.refresh)
+        self.assertTrue(revoked_tokens.revoke(token))
+        self.assertFalse(other_process.is_revoked(token))
+        self.assertFalse(other_process.revoke(token))
+        self.assertTrue(other_process.is_revoked(token))
+
+    def test_checks_need_no_query_between_syncs(self):
+        self.assertEqual(self.post(logout_user, self.refresh).status_code, 200)
+        revoked, fresh = ClaimsRefreshToken(self.refresh), ClaimsRefreshToken.for_user(self.user)
+        revoked_tokens.sync()
+        with self.assertNumQueries(0):
+            self.assertTrue(revoked_tokens.is_revoked(revoked))
+            self.assertFalse(revoked_tokens.is_revoked(fresh))
+
+    def test_logout_revokes_the_access_token(self):
+        access = str(ClaimsRefreshToken(self.refresh).access_token)
+        other = str(ClaimsRefreshToken.for_user(self.user).access_token)
+        authentication = ClaimsJWTAuthentication()
+        request = APIRequestFactory().post('/', {'refresh': self.refresh}, format='json',
+                                           HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(logout_user(request).status_code, 200)
+        revoked_tokens.sync()
+        with self.assertNumQueries(0):
+            with self.assertRaises(InvalidToken):
+                authentication.get_validated_token(access.encode())
+            authentication.get_validated_token(other.encode())
+
+    def test_expired_buckets_are_dropped_and_purged(self):
+        expired = ClaimsRefreshToken.for_user(self.user)
+        expired['exp'] -= 100 * 86400
+        revoked_tokens.revoke(expired)
+        live = ClaimsRefreshToken(self.refresh)
+        revoked_tokens.revoke(live)
+        store = RevocationStore()
+        store._add(token_key(expired['jti']), expired['exp'])
+        store.sync()
+        self.assertEqual(list(RevokedToken.objects.values_list('key', flat=True)), [token_key(live['jti'])])
+        self.assertEqual(len(store._buckets), 1)
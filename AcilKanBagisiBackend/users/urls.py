@@ -4,5 +4,8 @@ from . import views
 urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
+    path('login/async/', views.login_user_async, name='login-async'),
+    path('token/refresh/', views.refresh_token, name='token-refresh'),
+    path('logout/', views.logout_user, name='logout'),
     path('test/', views.test_connection, name='test_connection'),
 ]